@@ -0,0 +1,88 @@
+# Backbone of a puzzle: the visible (cell, state) literals that hold in
+# every solution. Used for hints and for checking partially filled boards.
+#
+# Starting from one model, the incremental Search is asked for a model
+# falsifying at least one remaining candidate literal. If there is none,
+# every candidate is backbone. Otherwise the new model rules out every
+# candidate it falsifies (filtering). Each model is also "rotated": a True
+# variable that is never the only True literal of a clause can be flipped
+# to False without breaking the model, so it is not backbone either. Every
+# solve removes at least one candidate, so at most one solve per candidate
+# literal is needed, and a single one when the solution is unique.
+
+import copy
+import numpy as np
+
+
+def model_array(search, num_vars) -> np.ndarray:
+    """
+    Returns the current assignment of the first `num_vars` variables as a boolean array.
+    """
+    return np.array(search.value[0:2*num_vars:2], dtype=np.int8) == 1
+
+
+def rotatable_vars(store, model) -> np.ndarray:
+    """
+    Returns a boolean array marking the True variables of `model` that could
+    be set to False without falsifying any clause of `store`.
+    """
+    lits, starts = store.lits, store.starts
+    critical = np.zeros(len(model), dtype=bool)
+    if len(lits):
+        true_lits = np.where(lits > 0, model[np.abs(lits)-1], ~model[np.abs(lits)-1])
+        counts = np.add.reduceat(true_lits.astype(np.int32), starts[:-1])
+        single = np.repeat(counts == 1, np.diff(starts))
+        # the only True literal of a clause cannot be flipped
+        critical[np.abs(lits[true_lits & single & (lits > 0)])-1] = True
+    return model & ~critical
+
+
+def compute_backbone(solver) -> list[int] | None:
+    """
+    Returns the sorted list of visible state variables of `solver` that are True
+    in every solution, or None if there is no solution.
+    """
+    search = solver.make_search()
+    if not search.solve():
+        return None
+    visible = solver.visible_vars()
+    # variables constrained by propagators may not be rotated, as their
+    # constraints are not among the stored clauses
+    fixed = np.zeros(solver.num_vars, dtype=bool)
+    for propagator in solver.propagators():
+        fixed[propagator.propagator_vars()] = True
+    model = model_array(search, solver.num_vars)
+    candidates = visible[model[visible]]
+    while True:
+        candidates = candidates[~(rotatable_vars(solver.clauses, model) & ~fixed)[candidates]]
+        if not len(candidates):
+            return []
+        # the selector switches on the clause asking for some candidate to be False
+        selector = search.new_var()
+        search.backtrack(0)
+        search.add_clause([2*selector+1] + (2*candidates+1).tolist())
+        found = search.solve([2*selector])
+        if found:
+            model = model_array(search, solver.num_vars)
+        search.backtrack(0)
+        search.add_clause([2*selector+1]) # retire the clause for good
+        if not found:
+            return sorted(candidates.tolist())
+        candidates = candidates[model[candidates]]
+
+
+def backbone_board(solver):
+    """
+    Returns a copy of the solver's board holding only the cells forced in every
+    solution, with every other cell empty, or None if there is no solution.
+    """
+    backbone = compute_backbone(solver)
+    if backbone is None:
+        return None
+    data = [[None]*solver.width for _ in range(solver.height)]
+    for var in backbone:
+        row_idx, col_idx, state_num = solver.get_idx_and_state(var)
+        data[row_idx][col_idx] = solver.states[state_num]
+    board = copy.copy(solver.board)
+    board.data = data
+    return board
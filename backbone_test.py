@@ -0,0 +1,49 @@
+"""
+Checks the backbone against the cells shared by every enumerated solution.
+"""
+from backbone import backbone_board
+from puzzle_formats import parse_sudoku_line, format_sudoku
+from sat_solver import CNFSolver
+from exact_cover import make_solver, ExactCoverSolver
+
+def forced_by_enumeration(line):
+    board, rule = parse_sudoku_line(line)
+    solver = CNFSolver(board, [rule])
+    grids = [format_sudoku(solver.layout.to_board(sol, board))
+             for sol in solver.solve(max_sols=10_000, quiet=True) if sol is not None]
+    return "".join(cell if all(grid[idx] == cell for grid in grids) else "."
+                   for idx, cell in enumerate(grids[0]))
+
+def test_backbone():
+    for line in ["."*16, "12..............", "1...........3..4", "1..2..3.........."[:16]]:
+        board, rule = parse_sudoku_line(line)
+        overlay = backbone_board(CNFSolver(board, [rule]))
+        assert format_sudoku(overlay) == forced_by_enumeration(line)
+
+def test_unique_puzzle_is_all_backbone():
+    line = "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61"
+    board, rule = parse_sudoku_line(line)
+    overlay = backbone_board(CNFSolver(board, [rule]))
+    assert format_sudoku(overlay).startswith("918745632")
+    assert "." not in format_sudoku(overlay)
+
+def test_no_solution():
+    board, rule = parse_sudoku_line("11" + "."*14)
+    assert backbone_board(CNFSolver(board, [rule])) is None
+
+def test_exact_cover_solver():
+    # Sudoku goes to the exact cover solver, whose make_search is still a CDCL search
+    for line in ["1...........3..4", "11" + "."*14]:
+        board, rule = parse_sudoku_line(line)
+        solver = make_solver(board, [rule])
+        assert isinstance(solver, ExactCoverSolver)
+        overlay = backbone_board(solver)
+        expected = backbone_board(CNFSolver(board, [rule]))
+        assert (overlay is None and expected is None) or format_sudoku(overlay) == format_sudoku(expected)
+
+if __name__ == "__main__":
+    test_backbone()
+    test_unique_puzzle_is_all_backbone()
+    test_no_solution()
+    test_exact_cover_solver()
+    print("All backbone tests passed")
@@ -1,21 +1,70 @@
 # class for representing game state
 
+from functools import cached_property
 from typing import Optional, List, Tuple
+import numpy as np
 
 BoardData = list[list[str | int | None]]
 
+
+def frozen(arr: np.ndarray) -> np.ndarray:
+    """
+    Marks a NumPy array as read-only and returns it, so that cached
+    index tables can be shared safely between rules and board copies.
+    """
+    arr.flags.writeable = False
+    return arr
+
+
+class BoardRow(list):
+    """
+    One row of `Board.data`. Assigning to an entry sets the cell on the board.
+    """
+
+    def __init__(self, board: "Board", row_idx: int, cells: list):
+        super().__init__(cells)
+        self.board = board
+        self.row_idx = row_idx
+
+    def __setitem__(self, col, state):
+        if isinstance(col, slice):
+            for col_idx, cell in zip(range(*col.indices(len(self))), state, strict=True):
+                self.board.set_cell(self.row_idx, col_idx, cell)
+        else:
+            self.board.set_cell(self.row_idx, col % len(self), state)
+
+
+class BoardRows(list):
+    """
+    The rows of `Board.data`. Assigning a whole row sets each of its cells.
+    """
+
+    def __init__(self, board: "Board", rows: list):
+        super().__init__(rows)
+        self.board = board
+
+    def __setitem__(self, row, cells):
+        if isinstance(row, slice):
+            for row_idx, row_cells in zip(range(*row.indices(len(self))), cells, strict=True):
+                self[row_idx] = row_cells
+        else:
+            self[row][:] = cells
+
+
 class Board():
 
-    def __init__(self, data: BoardData, 
-                 visible_states: Optional[List[str]] = None, 
+    def __init__(self, data: BoardData,
+                 visible_states: Optional[List[str]] = None,
                  constraints: Optional[dict] = None):
         """
         Creates a board. Data is a 2D nested list where
         each sublist is a row, and each entry in a sublist is either
         a string representing initial state or None. Assumes data has
         at least size 1x1 and is rectangular.
+
+        Internally the cells are stored in `self.grid`, a NumPy array of
+        integer codes indexing into `self.symbols` (-1 for an empty cell).
         """
-        self.data = data
         self.height = len(data)
         self.width = len(data[0])
         if visible_states is None:
@@ -24,13 +73,71 @@ class Board():
         if constraints is None:
             constraints = {}
         self.constraints = constraints
+        self._view = None
+        self.data = data
+
+    @property
+    def data(self) -> BoardData:
+        """
+        The board as a 2D nested list of states (or None). The list is built
+        from the grid once and cached; assigning into it, as in
+        `board.data[row][col] = state`, writes through to the grid.
+        """
+        if self._view is None:
+            lookup = self.symbols + [None] # code -1 maps to None
+            self._view = BoardRows(self, [BoardRow(self, row_idx, [lookup[code] for code in row])
+                                          for row_idx, row in enumerate(self.grid.tolist())])
+        return self._view
+
+    @data.setter
+    def data(self, data: BoardData) -> None:
+        symbols = list(self.visible_states)
+        codes = {state: idx for idx, state in enumerate(symbols)}
+        grid = np.full((self.height, self.width), -1, dtype=np.int32)
+        for row_idx, row in enumerate(data):
+            for col_idx, cell in enumerate(row):
+                if cell is None:
+                    continue
+                if cell not in codes:
+                    codes[cell] = len(symbols)
+                    symbols.append(cell)
+                grid[row_idx, col_idx] = codes[cell]
+        self.symbols = symbols
+        self.grid = grid
+        if self._view is not None:
+            # refill the view in place, so references to it stay current
+            lookup = symbols + [None]
+            for view_row, row in zip(self._view, grid.tolist()):
+                list.__setitem__(view_row, slice(None), [lookup[code] for code in row])
+
+    def set_cell(self, row_idx, col_idx, state) -> None:
+        """
+        Sets the state (or None) of one cell, adding the state to
+        `self.symbols` if it is new.
+        """
+        if state is None:
+            code = -1
+        elif state in self.symbols:
+            code = self.symbols.index(state)
+        else:
+            code = len(self.symbols)
+            self.symbols.append(state)
+        self.grid[row_idx, col_idx] = code
+        if self._view is not None:
+            list.__setitem__(self._view[row_idx], col_idx, state)
+
+    def __getstate__(self):
+        # copies rebuild their own view, so writes to it reach their own grid
+        state = self.__dict__.copy()
+        state["_view"] = None
+        return state
 
     def __repr__(self):
         return "\n".join(str(row) for row in self.data)
 
     def add_state_to_board(self, row_idx, col_idx, state_name):
         if state_name in self.visible_states:
-            self.data[row_idx][col_idx] = state_name
+            self.set_cell(row_idx, col_idx, state_name)
 
     def find_all_distinct_states(self):
         out = []
@@ -38,6 +145,7 @@ class Board():
             for cell in row:
                 if cell is not None and cell not in out:
                     out.append(cell)
+        return out
 
     def check_cell_in_bounds(self, row, col):
         """
@@ -51,20 +159,120 @@ class Board():
         Returns a list of (row, col) tuples for every single
         cell in the board.
         """
-        return [(row, col) for row in range(self.height) for col in range(self.width)]
+        return list(self._cell_tuples)
 
     def get_adjacencies(self, row, col):
         """
         Returns a list of (row_idx, col_idx) tuples that are adjacent to (row, col).
         Adjacent tuples must be within bounds.
         """
+        if self.check_cell_in_bounds(row, col):
+            return list(self._adjacency_tuples[row*self.width + col])
         to_add = [(row+1, col), (row-1, col), (row, col+1), (row, col-1)]
-        out = []
-        for coords in to_add:
-            if self.check_cell_in_bounds(*coords): 
-                out.append(coords)
-        return out
-        
+        return [coords for coords in to_add if self.check_cell_in_bounds(*coords)]
+
+    def coords_to_ids(self, coords) -> np.ndarray:
+        """
+        Converts a list of (row, col) tuples into an array of cell ids.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        return coords[:, 0]*self.width + coords[:, 1]
+
+    # cached index tables. Cells are numbered row-major, so the cell id of
+    # (row, col) is row*width + col, matching the solver's variable layout.
+
+    @property
+    def num_cells(self) -> int:
+        return self.height*self.width
+
+    @cached_property
+    def cell_ids(self) -> np.ndarray:
+        """
+        A (height, width) array holding the id of every cell.
+        """
+        return frozen(np.arange(self.num_cells).reshape(self.height, self.width))
+
+    @cached_property
+    def cell_coords(self) -> np.ndarray:
+        """
+        A (num_cells, 2) array of the (row, col) of every cell id.
+        """
+        ids = np.arange(self.num_cells)
+        return frozen(np.stack([ids // self.width, ids % self.width], axis=1))
+
+    @cached_property
+    def neighbours(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        4-neighbour adjacency in CSR form, as (indptr, indices). The neighbours
+        of cell i are indices[indptr[i]:indptr[i+1]], ordered down, up, right, left.
+        """
+        rows, cols = self.cell_coords[:, 0], self.cell_coords[:, 1]
+        offsets = ((1, 0), (-1, 0), (0, 1), (0, -1))
+        cand_rows = rows[:, None] + np.array([d_row for d_row, _ in offsets])
+        cand_cols = cols[:, None] + np.array([d_col for _, d_col in offsets])
+        valid = ((0 <= cand_rows) & (cand_rows < self.height) &
+                 (0 <= cand_cols) & (cand_cols < self.width))
+        indices = (cand_rows*self.width + cand_cols)[valid]
+        indptr = np.concatenate([[0], np.cumsum(valid.sum(axis=1))])
+        return frozen(indptr), frozen(indices)
+
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """
+        A (num_edges, 2) array of directed (cell, neighbour) pairs, with each
+        adjacent pair appearing once in each direction.
+        """
+        indptr, indices = self.neighbours
+        sources = np.repeat(np.arange(self.num_cells), np.diff(indptr))
+        return frozen(np.stack([sources, indices], axis=1))
+
+    @cached_property
+    def windows_2x2(self) -> np.ndarray:
+        """
+        A (num_windows, 4) array of the cell ids in every 2x2 square,
+        ordered top-left, bottom-left, top-right, bottom-right.
+        """
+        ids = self.cell_ids
+        corners = [ids[:-1, :-1], ids[1:, :-1], ids[:-1, 1:], ids[1:, 1:]]
+        return frozen(np.stack([corner.ravel() for corner in corners], axis=1))
+
+    def rect_regions(self, reg_height: int, reg_width: int) -> np.ndarray:
+        """
+        Returns a (num_regions, reg_height*reg_width) array of cell ids, where
+        each row is one rectangle of a tiling of the board, in row-major order.
+        Rows of the board are rect_regions(1, width), columns rect_regions(height, 1).
+        """
+        key = (reg_height, reg_width)
+        cache = self.__dict__.setdefault("_rect_regions", {})
+        if key not in cache:
+            assert self.height % reg_height == 0 and self.width % reg_width == 0
+            tiles = self.cell_ids.reshape(self.height // reg_height, reg_height,
+                                          self.width // reg_width, reg_width)
+            cache[key] = frozen(tiles.transpose(0, 2, 1, 3).reshape(-1, reg_height*reg_width))
+        return cache[key]
+
+    def rect_region_of_cell(self, reg_height: int, reg_width: int) -> np.ndarray:
+        """
+        Returns a (num_cells,) array giving the index of the rectangle from
+        `rect_regions` that each cell belongs to.
+        """
+        regions = self.rect_regions(reg_height, reg_width)
+        out = np.empty(self.num_cells, dtype=np.int64)
+        out[regions.ravel()] = np.repeat(np.arange(len(regions)), regions.shape[1])
+        return frozen(out)
+
+    @cached_property
+    def _cell_tuples(self) -> tuple[tuple[int, int], ...]:
+        return tuple(map(tuple, self.cell_coords.tolist()))
+
+    @cached_property
+    def _adjacency_tuples(self) -> tuple[tuple[tuple[int, int], ...], ...]:
+        indptr, indices = self.neighbours
+        coords = self._cell_tuples
+        indices = indices.tolist()
+        return tuple(tuple(coords[adj] for adj in indices[start:end])
+                     for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist()))
+
     @staticmethod
     def gen_empty_board(height: int, width: int) -> BoardData:
         return [[None for _ in range(width)] for _ in range(height)]
@@ -0,0 +1,90 @@
+"""
+Checks the Board class: that `Board.data` is cached and writes through to
+the grid, that copies of a board keep their own view of it, and that the
+cached index tables agree with the per-cell methods they replace.
+"""
+import copy
+import numpy as np
+
+from boards import Board
+from puzzle_formats import parse_sudoku_line
+from sat_solver import CNFSolver
+
+def test_data_writes_through():
+    board = Board([["1", None], [None, "2"]], ["1", "2"])
+    assert board.data is board.data
+    board.data[0][1] = "2"
+    assert board.grid.tolist() == [[0, 1], [-1, 1]]
+    board.data[1][0] = "x" # a state that is not visible gets its own code
+    assert board.symbols == ["1", "2", "x"] and board.grid[1, 0] == 2
+    board.data[1] = [None, "1"]
+    board.data[0][-1] = None
+    assert board.grid.tolist() == [[0, -1], [-1, 0]]
+    assert board.data == [["1", None], [None, "1"]]
+    board.add_state_to_board(0, 1, "2")
+    assert board.data[0] == ["1", "2"]
+    view = board.data
+    board.data = [["2", "2"], ["2", "2"]]
+    assert view == [["2", "2"], ["2", "2"]] and board.grid.tolist() == [[1, 1], [1, 1]]
+    view[0][0] = "1"
+    assert board.grid[0, 0] == 0
+
+def test_copies():
+    board = Board([["1", None], [None, "2"]], ["1", "2"])
+    view = board.data
+    other = copy.copy(board)
+    other.data = [[None, None], [None, None]]
+    assert board.data is view and board.data == [["1", None], [None, "2"]]
+    other.data[0][0] = "2"
+    assert other.data[0][0] == "2" and board.data[0][0] == "1"
+    deep = copy.deepcopy(board)
+    deep.data[0][0] = "2"
+    assert board.data[0][0] == "1" and board.grid[0, 0] == 0
+
+def test_index_tables():
+    board = Board(Board.gen_empty_board(3, 4))
+    cells = [(row, col) for row in range(3) for col in range(4)]
+    assert board.get_all_cells() == cells
+    assert board.cell_coords.tolist() == [list(cell) for cell in cells]
+    assert board.cell_ids[2, 1] == 9 and board.coords_to_ids([(2, 1), (0, 3)]).tolist() == [9, 3]
+    indptr, indices = board.neighbours
+    edges = set()
+    for cell, (row, col) in enumerate(cells):
+        expected = [(row+1, col), (row-1, col), (row, col+1), (row, col-1)]
+        expected = [adj for adj in expected if board.check_cell_in_bounds(*adj)]
+        assert board.get_adjacencies(row, col) == expected
+        assert [cells[adj] for adj in indices[indptr[cell]:indptr[cell+1]]] == expected
+        edges.update((cell, board.coords_to_ids([adj])[0]) for adj in expected)
+    assert len(board.edges) == len(edges) == 34 and set(map(tuple, board.edges.tolist())) == edges
+    assert board.windows_2x2.tolist()[:2] == [[0, 4, 1, 5], [1, 5, 2, 6]] and len(board.windows_2x2) == 6
+    # the tables are shared, so they must not be writable
+    try:
+        board.edges[0, 0] = 1
+        assert False
+    except ValueError:
+        pass
+
+def test_rect_regions():
+    board = Board(Board.gen_empty_board(4, 4))
+    assert board.rect_regions(1, 4).tolist() == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]]
+    assert board.rect_regions(4, 1)[1].tolist() == [1, 5, 9, 13]
+    assert board.rect_regions(2, 2).tolist() == [[0, 1, 4, 5], [2, 3, 6, 7], [8, 9, 12, 13], [10, 11, 14, 15]]
+    assert board.rect_regions(2, 2) is board.rect_regions(2, 2)
+    assert board.rect_region_of_cell(2, 2).tolist() == [0, 0, 1, 1]*2 + [2, 2, 3, 3]*2
+
+def test_state_ints():
+    board, rule = parse_sudoku_line("."*16)
+    solver = CNFSolver(board, [rule])
+    ids = board.cell_ids
+    for state in ("1", "4"):
+        expected = [[solver.gen_state_int(row, col, state) for col in range(4)] for row in range(4)]
+        assert solver.gen_state_ints(ids, state).tolist() == expected
+    assert np.array_equal(solver.gen_state_ints([3, 7], state_num=2), [3*4+2, 7*4+2])
+
+if __name__ == "__main__":
+    test_data_writes_through()
+    test_copies()
+    test_index_tables()
+    test_rect_regions()
+    test_state_ints()
+    print("All board tests passed")
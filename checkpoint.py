@@ -0,0 +1,105 @@
+# Checkpoints of long running enumerations, so that a search lost with
+# its process (for example a preempted batch job) can be resumed.
+#
+# A checkpoint file uses the container of formula_io, with its own magic.
+# The header holds what identifies the formula and the solve, the search
+# counters and whether the enumeration is complete; the arrays hold the
+# solutions found so far (as the bytes of their PackedSolutions) and the
+# state of the search:
+#   - for a CDCL `Search`, the clauses blocking the solutions found, the
+#     learned clauses, the literals fixed at level 0 and the branching
+#     heuristic (activities and phases). A resumed search starts from
+#     level 0 with all of them, like after a restart, so it never finds a
+#     solution twice and keeps everything it learned;
+#   - for an `ExactCoverSearch`, the path through the search tree: the
+#     candidates of every level and which of them is being tried, so the
+#     resumed search picks up at the next candidate.
+# Files are written to a temporary name and renamed into place, so a
+# process killed in the middle of a write leaves the last checkpoint intact.
+
+import os
+import time
+
+import numpy as np
+
+import formula_io
+
+MAGIC = b"TLCK"
+
+
+def ragged_arrays(lists) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns a list of lists of integers (such as clauses of internal
+    literals) as one flat array and the offsets of the lists in it.
+    """
+    starts = np.zeros(len(lists)+1, dtype=np.int64)
+    np.cumsum([len(items) for items in lists], out=starts[1:])
+    flat = np.fromiter((item for items in lists for item in items), dtype=np.int64, count=int(starts[-1]))
+    return flat, starts
+
+
+def ragged_lists(flat, starts) -> list[list[int]]:
+    """
+    Inverse of `ragged_arrays`.
+    """
+    flat, bounds = flat.tolist(), starts.tolist()
+    return [flat[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class Checkpointer():
+    """
+    Writes the state of one enumeration to a file, at most every `interval` seconds.
+    """
+
+    def __init__(self, path, interval=60.0, identity=None) -> None:
+        """
+        Args:
+            path: checkpoint file, read by `load` and replaced by every save
+            interval: seconds between two checkpoints written by `tick`
+            identity: JSON-serializable description of the formula and the
+                solve options; a checkpoint written with another identity is
+                refused by `load`
+        """
+        self.path = path
+        self.interval = interval
+        self.identity = identity
+        self.solutions = [] # PackedSolutions found so far, shared with the solve
+        self.last_save = time.monotonic()
+        self.saves = 0
+
+    def tick(self, search) -> None:
+        """
+        Called by a search at every decision: saves it if the interval has passed.
+        """
+        if time.monotonic() - self.last_save >= self.interval:
+            self.save(search)
+
+    def save(self, search, complete=False) -> None:
+        """
+        Writes the solutions so far and the state of `search`. `complete` marks
+        an enumeration that has found every solution.
+        """
+        state, arrays = search.checkpoint_state()
+        nbytes = len(self.solutions[0].bits) if self.solutions else 0
+        arrays["solutions"] = np.frombuffer(b"".join(sol.bits for sol in self.solutions),
+                                            dtype=np.uint8).reshape(len(self.solutions), nbytes)
+        metadata = {"identity": self.identity, "search": state, "complete": complete}
+        temp_path = f"{self.path}.tmp"
+        formula_io.write_formula(temp_path, metadata, arrays, magic=MAGIC)
+        os.replace(temp_path, self.path)
+        self.last_save = time.monotonic()
+        self.saves += 1
+
+    def load(self):
+        """
+        Returns (metadata, arrays) of the checkpoint file, with the arrays
+        copied out of the file, or None if there is no checkpoint yet.
+        Raises ValueError if the checkpoint belongs to another formula or solve.
+        """
+        if not os.path.exists(self.path):
+            return None
+        metadata, arrays = formula_io.read_formula(self.path, magic=MAGIC)
+        if metadata["identity"] != self.identity:
+            raise ValueError(f"the checkpoint {self.path} was written for another formula "
+                             f"or other solve options")
+        return metadata, {name: np.array(arr) for name, arr in arrays.items()}
@@ -0,0 +1,63 @@
+"""
+Checks that an enumeration interrupted any number of times and resumed from
+its checkpoint finds every solution exactly once, with both search engines.
+"""
+import os
+import tempfile
+
+from puzzle_formats import parse_sudoku_line
+from sat_solver import CNFSolver, Unknown
+from exact_cover import make_solver
+
+def solve_with_checkpoint(make, line, path, **solve_args):
+    board, rule = parse_sudoku_line(line)
+    solver = make(board, [rule])
+    results = [sol for sol in solver.solve(quiet=True, checkpoint=path, **solve_args)
+               if sol is not None]
+    return solver, results
+
+def test_interrupted_enumeration():
+    for make in (CNFSolver, make_solver):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "empty.ckpt")
+            runs = 0
+            while True:
+                runs += 1
+                solver, results = solve_with_checkpoint(make, "."*16, path, max_sols=1000,
+                                                        max_decisions=100, checkpoint_interval=0.0)
+                if not results or not isinstance(results[-1], Unknown):
+                    break
+            assert runs > 2 and len(results) == len(set(results)) == 288
+            assert solver.stats["decisions"] > 100
+            # a complete enumeration is not searched again
+            solver, again = solve_with_checkpoint(make, "."*16, path, max_sols=1000, max_decisions=0)
+            assert again == results
+
+def test_raising_max_sols():
+    for make in (CNFSolver, make_solver):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "empty.ckpt")
+            found = []
+            for max_sols in (5, 10, 100, 1000):
+                _, found = solve_with_checkpoint(make, "."*16, path, max_sols=max_sols)
+                assert len(found) == len(set(found)) == min(max_sols, 288)
+
+def test_other_formula_is_refused():
+    # another size, then the same size with other givens
+    for make in (CNFSolver, make_solver):
+        for other in ("."*81, "2..." + "."*12):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "empty.ckpt")
+                solve_with_checkpoint(make, "1..." + "."*12, path, max_sols=3)
+                try:
+                    solve_with_checkpoint(make, other, path, max_sols=3)
+                except ValueError:
+                    pass
+                else:
+                    assert False, "a checkpoint of another formula was accepted"
+
+if __name__ == "__main__":
+    test_interrupted_enumeration()
+    test_raising_max_sols()
+    test_other_formula_is_refused()
+    print("All checkpoint tests passed")
@@ -0,0 +1,331 @@
+# Flat storage for the clauses of a CNF formula.
+# Clauses are kept back to back in a single literal arena, with a
+# second array of offsets marking where each clause starts. Literals
+# use the DIMACS convention: var+1 if the variable must be True,
+# -(var+1) if it must be False, and 0 only ever appears as padding.
+# Every clause also has a canonical form: its literals sorted by variable
+# (a True literal before a False one), without repeats. A hash index from
+# canonical form to clause id lets the store drop duplicate clauses, and
+# tautologies (clauses holding both x and not x) are dropped too. Clauses
+# keep the literal order the rules gave them, which the search relies on
+# when picking the literals to watch.
+
+from array import array
+import numpy as np
+
+
+def to_literal(var: int, literal: bool) -> int:
+    """
+    Returns the signed integer literal of a (var, literal) pair.
+    """
+    return var+1 if literal else -(var+1)
+
+
+def from_literal(lit: int) -> tuple[int, bool]:
+    """
+    Returns the (var, literal) pair of a signed integer literal.
+    """
+    return abs(lit)-1, lit > 0
+
+
+def to_literals(vars, literal: bool) -> np.ndarray:
+    """
+    Vectorized version of `to_literal` over an array of variables.
+    """
+    vars = np.asarray(vars, dtype=np.int64)
+    return vars+1 if literal else -(vars+1)
+
+
+def canonical_clause(lits) -> tuple[int, ...] | None:
+    """
+    Returns the canonical form of a clause: its distinct literals sorted by
+    variable, a True literal before a False one. Returns None for a tautology.
+    """
+    clause = sorted(set(lits), key=lambda lit: (abs(lit), lit < 0))
+    for first, second in zip(clause, clause[1:]):
+        if first == -second:
+            return None
+    return tuple(clause)
+
+
+def clause_key(clause) -> bytes:
+    """
+    Returns the hash index key of a canonical clause.
+    """
+    return array("i", clause).tobytes() # the bytes of an int32 array
+
+
+class ClauseStore():
+    """
+    Append-only clause storage. Clause i is lits[starts[i]:starts[i+1]].
+    The occurrence index (which clauses each literal appears in) is built
+    from the arena on demand and cached until more clauses are appended.
+    With `dedup`, clauses are canonicalized and duplicates and tautologies
+    are counted in `duplicates` and `tautologies` instead of being stored.
+    """
+
+    def __init__(self, capacity: int = 1024, dedup: bool = True) -> None:
+        self._lits = np.empty(capacity, dtype=np.int32)
+        self._starts = np.zeros(capacity+1, dtype=np.int64)
+        self.num_lits = 0
+        self.num_clauses = 0
+        self._occurrences = None
+        self.dedup = dedup
+        self._index = {} # canonical clause -> clause id, rebuilt lazily if None
+        self.duplicates = 0
+        self.tautologies = 0
+
+    def __len__(self) -> int:
+        return self.num_clauses
+
+    @classmethod
+    def from_arrays(cls, lits, starts, occurrences=None) -> "ClauseStore":
+        """
+        Wraps existing arena and offset arrays (for instance read-only views of a
+        memory mapped file) without copying them. The arrays are only copied if
+        more clauses are appended later.
+        """
+        store = cls.__new__(cls)
+        store._lits = lits
+        store._starts = starts
+        store.num_lits = len(lits)
+        store.num_clauses = len(starts)-1
+        store._occurrences = occurrences
+        store.dedup = True
+        store._index = None
+        store.duplicates = 0
+        store.tautologies = 0
+        return store
+
+    def index(self) -> dict[bytes, int]:
+        """
+        Returns the hash index from canonical clause (see `clause_key`) to clause id.
+        """
+        if self._index is None:
+            self._index = {}
+            for idx in range(self.num_clauses):
+                self._index.setdefault(clause_key(canonical_clause(self.clause(idx))), idx)
+        return self._index
+
+    @property
+    def lits(self) -> np.ndarray:
+        """
+        The literal arena, as a view of every literal stored so far.
+        """
+        return self._lits[:self.num_lits]
+
+    @property
+    def starts(self) -> np.ndarray:
+        """
+        The clause offsets into the arena, of length num_clauses+1.
+        """
+        return self._starts[:self.num_clauses+1]
+
+    def _reserve(self, extra_lits: int, extra_clauses: int) -> None:
+        if self.num_lits + extra_lits > len(self._lits):
+            new_size = max(2*len(self._lits), self.num_lits + extra_lits)
+            self._lits = np.concatenate([self._lits[:self.num_lits],
+                                         np.empty(new_size - self.num_lits, dtype=np.int32)])
+        if self.num_clauses + extra_clauses + 1 > len(self._starts):
+            new_size = max(2*len(self._starts), self.num_clauses + extra_clauses + 1)
+            self._starts = np.concatenate([self._starts[:self.num_clauses+1],
+                                           np.empty(new_size - self.num_clauses - 1, dtype=np.int64)])
+
+    def add_clause(self, lits) -> int | None:
+        """
+        Appends a single clause given as a sequence of signed literals.
+        Returns the id of the new clause, the id of the identical clause already
+        stored, or None if the clause is a tautology.
+        """
+        if self.dedup:
+            clause = canonical_clause(lits)
+            if clause is None:
+                self.tautologies += 1
+                return None
+            index = self.index()
+            key = clause_key(clause)
+            if key in index:
+                self.duplicates += 1
+                return index[key]
+            index[key] = self.num_clauses
+            lits = list(dict.fromkeys(lits)) # drop repeats, keep the order
+        num = len(lits)
+        self._reserve(num, 1)
+        self._lits[self.num_lits:self.num_lits+num] = lits
+        self.num_lits += num
+        self.num_clauses += 1
+        self._starts[self.num_clauses] = self.num_lits
+        self._occurrences = None
+        return self.num_clauses-1
+
+    def add_clauses_bulk(self, block) -> range:
+        """
+        Appends many clauses at once. `block` is a 2-D integer array with one
+        clause per row; rows shorter than the array width are padded with 0.
+        Returns the range of ids of the new clauses.
+        """
+        block = np.asarray(block, dtype=np.int32)
+        if block.ndim != 2:
+            raise ValueError(f"expected a 2-D array of literals, got shape {block.shape}")
+        if self.dedup:
+            block = self._canonical_block(block)
+        mask = block != 0
+        flat = block[mask] # row-major, so each clause stays contiguous
+        ends = self.num_lits + np.cumsum(mask.sum(axis=1))
+        self._reserve(len(flat), len(block))
+        self._lits[self.num_lits:self.num_lits+len(flat)] = flat
+        first_id = self.num_clauses
+        self._starts[first_id+1:first_id+1+len(block)] = ends
+        self.num_lits += len(flat)
+        self.num_clauses += len(block)
+        self._occurrences = None
+        return range(first_id, self.num_clauses)
+
+    def merge_arenas(self, arenas) -> list[tuple[range, int]]:
+        """
+        Appends the clauses of several arenas, in order. Each arena is a
+        (lits, starts) pair of arrays whose clauses have no repeated literals
+        and no tautologies, such as those of a ClauseStore with `dedup`.
+        With `dedup`, a clause identical to one already stored or to one of an
+        earlier arena is dropped, as if the clauses had been added one by one,
+        but the duplicates are found with a single sort over all the arenas.
+        Returns (range of ids of the new clauses, number of clauses dropped)
+        for every arena.
+        """
+        arenas = [(np.asarray(lits, dtype=np.int32), np.asarray(starts, dtype=np.int64))
+                  for lits, starts in arenas]
+        # the clauses stored so far take part in the sort as arena -1
+        parts = [(self.lits, self.starts)] + arenas
+        lits = np.concatenate([part_lits[starts[0]:starts[-1]] for part_lits, starts in parts])
+        lengths = np.concatenate([np.diff(starts) for _, starts in parts])
+        firsts = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=firsts[1:])
+        keep = np.ones(len(lengths), dtype=bool)
+        if self.dedup:
+            codes = 2*np.abs(lits.astype(np.int64)) + (lits < 0)
+            base = int(codes.max())+1 if len(codes) else 1
+            for length in np.unique(lengths).tolist():
+                rows = np.flatnonzero(lengths == length)
+                if length == 0:
+                    keep[rows[1:]] = False
+                    continue
+                canonical = np.sort(codes[firsts[rows][:, None] + np.arange(length)], axis=1)
+                if base**length < 2**63: # pack the clause into one integer, faster to sort
+                    keys = canonical @ base**np.arange(length-1, -1, -1, dtype=np.int64)
+                else:
+                    keys = np.ascontiguousarray(canonical).view(np.dtype((np.void, 8*length))).ravel()
+                _, first_rows = np.unique(keys, return_index=True) # earliest of every clause
+                repeated = np.ones(len(rows), dtype=bool)
+                repeated[first_rows] = False
+                keep[rows[repeated]] = False
+        clause_counts = [len(starts)-1 for _, starts in parts]
+        bounds = np.zeros(len(parts)+1, dtype=np.int64)
+        np.cumsum(clause_counts, out=bounds[1:])
+        new_keep, new_lengths = keep[bounds[1]:], lengths[bounds[1]:]
+        kept_lits = lits[self.num_lits:][np.repeat(new_keep, new_lengths)]
+        kept_lengths = new_lengths[new_keep]
+        self._reserve(len(kept_lits), len(kept_lengths))
+        self._lits[self.num_lits:self.num_lits+len(kept_lits)] = kept_lits
+        first_id = self.num_clauses
+        self._starts[first_id+1:first_id+1+len(kept_lengths)] = self.num_lits + np.cumsum(kept_lengths)
+        self.num_lits += len(kept_lits)
+        self.num_clauses += len(kept_lengths)
+        self._occurrences = None
+        if self.dedup:
+            self._index = None # rebuilt from the arena when next needed
+        out = []
+        for idx in range(1, len(parts)):
+            kept = int(keep[bounds[idx]:bounds[idx+1]].sum())
+            out.append((range(first_id, first_id + kept), clause_counts[idx] - kept))
+            first_id += kept
+            self.duplicates += clause_counts[idx] - kept
+        return out
+
+    def _canonical_block(self, block: np.ndarray) -> np.ndarray:
+        """
+        Returns the rows of a block of clauses that are neither tautologies
+        nor already stored (or repeated in the block), with repeated literals
+        replaced by padding.
+        """
+        codes = 2*np.abs(block) + (block < 0) # padding gets code 0 and sorts first
+        order = np.argsort(codes, axis=1, kind="stable")
+        ordered = np.take_along_axis(block, order, axis=1)
+        codes = np.take_along_axis(codes, order, axis=1)
+        # repeated literals become padding, and a literal followed by its
+        # negation makes a tautology
+        repeated = np.zeros(block.shape, dtype=bool)
+        repeated[:, 1:] = (codes[:, 1:] == codes[:, :-1]) & (codes[:, 1:] > 0)
+        tautology = ((codes[:, 1:] == codes[:, :-1]+1) & (codes[:, :-1] % 2 == 0)
+                     & (codes[:, :-1] > 0)).any(axis=1)
+        self.tautologies += int(tautology.sum())
+        if repeated.any():
+            ordered[repeated] = 0
+            codes[repeated] = 0
+            resort = np.argsort(codes, axis=1, kind="stable")
+            ordered = np.take_along_axis(ordered, resort, axis=1)
+            original = np.zeros(block.shape, dtype=bool)
+            np.put_along_axis(original, order, repeated, axis=1)
+            block = np.where(original, 0, block)
+        # rows with the same number of literals share a key width, and their
+        # canonical literals are the last columns of `ordered`
+        lengths = (ordered != 0).sum(axis=1)
+        keys = [None]*len(block)
+        for length in np.unique(lengths).tolist():
+            rows = np.flatnonzero(lengths == length)
+            tail = np.ascontiguousarray(ordered[rows, ordered.shape[1]-length:])
+            row_keys = tail.view(np.dtype((np.void, 4*length))).ravel().tolist()
+            for row_idx, key in zip(rows.tolist(), row_keys):
+                keys[row_idx] = key
+        index = self.index()
+        keep = []
+        next_id = self.num_clauses
+        for row_idx, key in enumerate(keys):
+            if tautology[row_idx]:
+                continue
+            if key in index:
+                self.duplicates += 1
+                continue
+            index[key] = next_id
+            next_id += 1
+            keep.append(row_idx)
+        return block[keep]
+
+    def clause(self, idx: int) -> tuple[int, ...]:
+        """
+        Returns clause `idx` as a tuple of signed literals.
+        """
+        return tuple(self._lits[self._starts[idx]:self._starts[idx+1]].tolist())
+
+    def clause_dict(self, idx: int) -> dict[int, bool]:
+        """
+        Returns clause `idx` as a {var: literal} dictionary.
+        """
+        return dict(from_literal(lit) for lit in self.clause(idx))
+
+    def clause_lengths(self) -> np.ndarray:
+        return np.diff(self.starts)
+
+    def max_var(self) -> int:
+        """
+        Returns the largest variable used by any clause, or -1 if there are none.
+        """
+        if self.num_lits == 0:
+            return -1
+        return int(np.abs(self.lits).max()) - 1
+
+    def occurrences(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the occurrence index in CSR form, as (indptr, clause_ids).
+        Literal codes are 2*var for a True literal and 2*var+1 for a False one,
+        and the clauses containing code c are clause_ids[indptr[c]:indptr[c+1]].
+        """
+        if self._occurrences is None:
+            lits = self.lits.astype(np.int64)
+            codes = 2*(np.abs(lits)-1) + (lits < 0)
+            owners = np.repeat(np.arange(self.num_clauses), self.clause_lengths())
+            order = np.argsort(codes, kind="stable")
+            num_codes = 2*(self.max_var()+1)
+            indptr = np.zeros(num_codes+1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=num_codes), out=indptr[1:])
+            self._occurrences = (indptr, owners[order])
+        return self._occurrences
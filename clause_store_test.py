@@ -0,0 +1,123 @@
+"""
+Checks that the clause store drops duplicate and tautological clauses,
+one at a time, in bulk and when merging the arenas built by worker
+processes, and that the search still sees the clauses in the order the
+rules gave them.
+"""
+import itertools
+import random
+import numpy as np
+
+from clause_store import ClauseStore, canonical_clause
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+from sudoku import AtMostOneInRegion
+from boards import Board
+
+def test_single_clauses():
+    store = ClauseStore()
+    assert canonical_clause([3, -1, 3]) == (-1, 3)
+    assert canonical_clause([2, -2]) is None
+    assert store.add_clause([3, -1, 3]) == 0
+    assert store.add_clause([-1, 3]) == 0
+    assert store.add_clause([2, -2, 4]) is None
+    assert store.clause(0) == (3, -1)
+    assert (len(store), store.duplicates, store.tautologies) == (1, 1, 1)
+
+def test_bulk_clauses():
+    store = ClauseStore()
+    store.add_clause([4, 5])
+    ids = store.add_clauses_bulk(np.array([[3, -1, 0], [1, -1, 0], [5, 5, 4], [-1, 3, 0], [2, 0, 0]]))
+    assert list(ids) == [1, 2]
+    assert [store.clause(idx) for idx in range(len(store))] == [(4, 5), (3, -1), (2,)]
+    assert (store.duplicates, store.tautologies) == (2, 1)
+    # a store rebuilt from its arrays indexes its clauses again
+    copy = ClauseStore.from_arrays(store.lits, store.starts)
+    assert copy.add_clause([-1, 3]) == 1
+
+def test_bulk_matches_single():
+    # random blocks, appended past the initial capacity, give the same arena
+    # as adding their rows one at a time
+    rng = random.Random(0)
+    for dedup in (False, True):
+        single, bulk = ClauseStore(capacity=4, dedup=dedup), ClauseStore(capacity=4, dedup=dedup)
+        for _ in range(20):
+            block = np.zeros((rng.randint(1, 30), 4), dtype=np.int32)
+            for row in block:
+                length = rng.randint(1, 4)
+                row[:length] = [rng.choice([-1, 1])*rng.randint(1, 6) for _ in range(length)]
+            for row in block:
+                single.add_clause([lit for lit in row if lit != 0])
+            bulk.add_clauses_bulk(block)
+        assert np.array_equal(single.lits, bulk.lits) and np.array_equal(single.starts, bulk.starts)
+        assert (single.duplicates, single.tautologies) == (bulk.duplicates, bulk.tautologies)
+    try:
+        ClauseStore().add_clauses_bulk([1, 2, 3])
+        assert False
+    except ValueError:
+        pass
+
+def test_occurrences():
+    store = ClauseStore()
+    store.add_clauses_bulk([[1, -2, 0], [2, 3, -1], [-3, 0, 0], [3, 1, 0]])
+    indptr, clause_ids = store.occurrences()
+    for var, literal in itertools.product(range(3), (True, False)):
+        code = 2*var + (not literal)
+        expected = [idx for idx in range(len(store)) if store.clause_dict(idx).get(var) == literal]
+        assert clause_ids[indptr[code]:indptr[code+1]].tolist() == expected
+    store.add_clause([-3, -2])
+    assert store.occurrences()[1].tolist() != clause_ids.tolist() # rebuilt after a new clause
+
+def test_rule_bulk_clauses():
+    # a rule emitting its clauses as one block gets them recorded as its own
+    states = ["1", "2", "3", "4"]
+    board = Board(Board.gen_empty_board(4, 4), states)
+    row = [(0, col) for col in range(4)]
+    rule = AtMostOneInRegion(board, states, row)
+    solver = CNFSolver(board, [rule])
+    expected = [{solver.gen_state_int(*first, state): False, solver.gen_state_int(*second, state): False}
+                for state in states for first, second in itertools.combinations(row, 2)]
+    assert len(rule.clause_range) == 24 and list(rule.formula_contribution.values()) == expected
+    assert list(solver.formula.values()) == expected
+    var = solver.gen_state_int(0, 0, "1")
+    assert solver.var_map[var] == {False: {0, 1, 2}}
+
+def test_sudoku_duplicates():
+    board, rule = parse_sudoku_line("."*81)
+    solver = CNFSolver(board, [rule])
+    stats = solver.clause_stats()
+    assert sum(stat["duplicates"] for stat in stats) == solver.clauses.duplicates > 0
+    assert len([sol for sol in solver.solve(max_sols=2, quiet=True) if sol is not None]) == 2
+
+def test_merge_arenas():
+    store = ClauseStore()
+    store.add_clause([4, 5])
+    first, second = ClauseStore(), ClauseStore()
+    for clause in ([3, -1], [5, 4], [2]):
+        first.add_clause(clause)
+    for clause in ([-1, 3], [6, -7, 2], [2, 6, -7]):
+        second.add_clause(clause)
+    merged = store.merge_arenas([(first.lits, first.starts), (second.lits, second.starts)])
+    assert merged == [(range(1, 3), 1), (range(3, 4), 1)]
+    assert [store.clause(idx) for idx in range(len(store))] == [(4, 5), (3, -1), (2,), (6, -7, 2)]
+    assert store.add_clause([-7, 2, 6]) == 3 and store.duplicates == 3
+
+def test_parallel_build():
+    for board, rule in (parse_sudoku_line("."*81), parse_nurikabe_block(["1...", "..3.", "....", "2..."])):
+        sequential = CNFSolver(board, [rule])
+        parallel = CNFSolver(board, [rule], workers=2)
+        assert np.array_equal(sequential.clauses.lits, parallel.clauses.lits)
+        assert np.array_equal(sequential.clauses.starts, parallel.clauses.starts)
+        assert sequential.clause_stats() == parallel.clause_stats()
+        assert sequential.clauses.duplicates == parallel.clauses.duplicates
+
+if __name__ == "__main__":
+    test_single_clauses()
+    test_bulk_clauses()
+    test_bulk_matches_single()
+    test_occurrences()
+    test_rule_bulk_clauses()
+    test_sudoku_duplicates()
+    test_merge_arenas()
+    test_parallel_build()
+    print("All clause store tests passed")
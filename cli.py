@@ -0,0 +1,170 @@
+# Command line entry point for solving puzzles in bulk.
+# Puzzles are streamed from a file or stdin, solved one at a time,
+# and each result is written out as soon as it is found.
+#
+# Usage: python cli.py {sudoku,nurikabe} [input] [--max-sols N] [--timeout S] [--mmap] [--stats]
+#                      [--batch N]
+#
+# Sudoku results are one line per puzzle: the first solution in the line
+# format (or '-' if there is none), a tab, and the number of solutions
+# found, with a trailing '+' if the search stopped at --max-sols, or a
+# trailing '?' if it ran out of --timeout before finishing.
+# Nurikabe results are blocks in the input format, each preceded by a
+# '# puzzle <n>: <count> solution(s)' comment line and followed by a blank line.
+# A puzzle that cannot be parsed, or whose rules cannot be built, is reported in place of its result
+# ('-' and 'error: <message>' for Sudoku, an '# puzzle <n>: error: <message>'
+# comment for Nurikabe), and the stream carries on with the next one.
+
+import argparse
+import itertools
+import sys
+import time
+
+from sat_solver import Unknown
+from exact_cover import make_solver
+from puzzle_formats import RECORDS, PARSERS, FORMATTERS, iter_lines
+from sudoku_batch import propagate_puzzles, SOLVED, OPEN
+
+
+def solve_one(board, rule, max_sols=1, timeout=None):
+    """
+    Solves a single puzzle. Returns (solved_board or None, number of solutions found,
+    Unknown or None). The third item is an `Unknown` if `timeout` ran out.
+    """
+    solver = make_solver(board, [rule])
+    solutions = [sol for sol in solver.solve(max_sols=max_sols, quiet=True, timeout=timeout)
+                 if sol is not None]
+    unknown = None
+    if solutions and isinstance(solutions[-1], Unknown):
+        unknown = solutions.pop()
+    if not solutions:
+        return None, 0, unknown
+    return solver.layout.to_board(solutions[0], board), len(solutions), unknown
+
+
+def solve_batch(puzzles, max_sols=1, timeout=None):
+    """
+    Solves a list of (board, Sudoku rule) puzzles, propagating all the puzzles
+    of each size at once and only searching the ones propagation leaves open.
+    Returns a (solved_board or None, number of solutions, Unknown or None)
+    triple for every puzzle, like `solve_one`.
+    """
+    results = [None]*len(puzzles)
+    by_size = {}
+    for idx, (board, _) in enumerate(puzzles):
+        by_size.setdefault(board.height, []).append(idx)
+    for indices in by_size.values():
+        propagated = propagate_puzzles([puzzles[idx] for idx in indices])
+        for idx, (status, board, rule) in zip(indices, propagated):
+            if status == SOLVED:
+                results[idx] = (board, 1, None)
+            elif status == OPEN:
+                results[idx] = solve_one(board, rule, max_sols, timeout)
+            else:
+                results[idx] = (None, 0, None)
+    return results
+
+
+def solve_stream(puzzle_type, lines, max_sols=1, timeout=None, batch=1):
+    """
+    Yields (index, board, solved_board or None, number of solutions, error) for
+    every puzzle of `puzzle_type` read from `lines`, one puzzle at a time.
+    `error` is None unless the puzzle could not be parsed or its rules built
+    (the ValueError raised), or its search ran out of `timeout` seconds, in
+    which case it is the `Unknown` result.
+    With `batch` above 1, Sudokus are read `batch` at a time and solved with
+    `solve_batch`.
+    """
+    if puzzle_type == "sudoku" and batch > 1:
+        yield from solve_stream_batched(lines, max_sols, timeout, batch)
+        return
+    for idx, record in enumerate(RECORDS[puzzle_type](lines)):
+        try:
+            board, rule = PARSERS[puzzle_type](record)
+        except ValueError as error: # a PuzzleFormatError, or rules that cannot be built
+            yield idx, None, None, 0, error
+            continue
+        try:
+            solved, count, unknown = solve_one(board, rule, max_sols, timeout)
+        except ValueError as error:
+            yield idx, board, None, 0, error
+            continue
+        yield idx, board, solved, count, unknown
+
+
+def solve_stream_batched(lines, max_sols, timeout, batch):
+    records = enumerate(RECORDS["sudoku"](lines))
+    while True:
+        chunk = list(itertools.islice(records, batch))
+        if not chunk:
+            return
+        parsed = {}
+        errors = {}
+        for idx, record in chunk:
+            try:
+                parsed[idx] = PARSERS["sudoku"](record)
+            except ValueError as error:
+                errors[idx] = error
+        results = dict(zip(parsed, solve_batch(list(parsed.values()), max_sols, timeout)))
+        for idx, _ in chunk:
+            if idx in errors:
+                yield idx, None, None, 0, errors[idx]
+            else:
+                yield (idx, parsed[idx][0]) + results[idx]
+
+
+def write_result(out, puzzle_type, idx, board, solved, count, max_sols, error=None) -> None:
+    if error is not None and not isinstance(error, Unknown):
+        if puzzle_type == "sudoku":
+            out.write(f"-\terror: {error}\n")
+        else:
+            out.write(f"# puzzle {idx}: error: {error}\n\n")
+        out.flush()
+        return
+    if isinstance(error, Unknown):
+        count_str = f"{count}?"
+    else:
+        count_str = f"{count}+" if count >= max_sols and max_sols > 1 else str(count)
+    text = FORMATTERS[puzzle_type](solved) if solved is not None else None
+    if puzzle_type == "sudoku":
+        out.write(f"{text if text is not None else '-'}\t{count_str}\n")
+    else:
+        out.write(f"# puzzle {idx}: {count_str} solution(s)\n")
+        out.write(f"{text if text is not None else FORMATTERS[puzzle_type](board)}\n\n")
+    out.flush()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Solve a stream of logic puzzles.")
+    parser.add_argument("puzzle_type", choices=sorted(PARSERS))
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file to read puzzles from, or - for stdin (default)")
+    parser.add_argument("--max-sols", type=int, default=1,
+                        help="number of solutions to look for per puzzle; 2 checks uniqueness")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds to spend on each puzzle before giving up")
+    parser.add_argument("--mmap", action="store_true",
+                        help="memory map the input file instead of reading it through a buffer")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="number of Sudokus to propagate at once before searching the rest")
+    parser.add_argument("--stats", action="store_true",
+                        help="print a throughput summary to stderr at the end")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    num_puzzles = num_solved = 0
+    lines = iter_lines(args.input, use_mmap=args.mmap)
+    results = solve_stream(args.puzzle_type, lines, args.max_sols, args.timeout, args.batch)
+    for idx, board, solved, count, error in results:
+        write_result(sys.stdout, args.puzzle_type, idx, board, solved, count, args.max_sols, error)
+        num_puzzles += 1
+        num_solved += solved is not None
+    if args.stats:
+        elapsed = time.perf_counter() - start
+        rate = num_puzzles/elapsed if elapsed > 0 else 0.0
+        print(f"{num_puzzles} puzzle(s), {num_solved} solved in {elapsed:.3f} seconds "
+              f"({rate:.1f} puzzles/second)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
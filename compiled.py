@@ -0,0 +1,110 @@
+# An immutable, shareable form of a fully built formula.
+# A CNFSolver mixes the formula with the results of its last solve, so one
+# instance cannot serve two solves at once. A CompiledFormula only holds
+# what never changes after the rules have run: the clause arena (read-only
+# arrays), the clauses already converted to search literals (a SharedClauses
+# that every search reads in place), the exclusive groups and the layout
+# used to decode solutions. Everything a search changes (assignment, trail,
+# watches, learned clauses) lives in the Search created for each solve, so
+# creating one does not copy the clauses and any number of solves can run at once
+# against one formula, from threads, or from processes that each load the
+# formula file written by CNFSolver.save (its arrays are memory mapped, so
+# the processes share one copy of the clause arena).
+
+import numpy as np
+
+from boards import frozen
+from search import Search, SharedClauses, Budget, to_internal
+from implications import simplify as simplify_formula
+
+
+def read_only(arr: np.ndarray) -> np.ndarray:
+    """
+    Returns `arr` if it is already read-only (like the memory mapped arrays
+    of a loaded formula), and otherwise a read-only copy of it.
+    """
+    return arr if not arr.flags.writeable else frozen(arr.copy())
+
+
+class CompiledFormula():
+    """
+    The read-only formula of a CNFSolver, shared between concurrent searches.
+    """
+
+    def __init__(self, solver, simplify=False) -> None:
+        """
+        Args:
+            solver: a CNFSolver (built or loaded) whose rules are all clauses
+            simplify: if True, the searches run on the formula simplified by
+                `implications.simplify`, whose statistics are kept in
+                `self.simplification`
+        """
+        if solver.propagators():
+            raise ValueError("formulas with lazy rules cannot be compiled, as their "
+                             "propagators keep per-search state")
+        self.num_vars = solver.num_vars
+        self.numstates = solver.numstates
+        self.height, self.width = solver.height, solver.width
+        self.states = tuple(solver.states)
+        self.board = solver.board
+        self.lits = read_only(solver.clauses.lits)
+        self.starts = read_only(solver.clauses.starts)
+        ilits, bounds = to_internal(self.lits).tolist(), self.starts.tolist()
+        self.exclusive_lookup = tuple(tuple(group) if group is not None else None
+                                      for group in solver.exclusive_lookup_list())
+        self.simplification = None
+        if simplify:
+            (ilits, bounds), self.simplification = simplify_formula(
+                self.num_vars, ilits, bounds, self.numstates, list(self.exclusive_lookup))
+        # converted once; searches only read it
+        self.shared_clauses = SharedClauses(self.num_vars, ilits, bounds)
+        block_vars = solver.block_vars()
+        self.block_vars = frozen(block_vars) if block_vars is not None else None
+        self.layouts = (solver.solution_layout(False), solver.solution_layout(True))
+
+    def new_search(self) -> Search:
+        """
+        Returns a fresh search over the formula, with its own mutable state.
+        """
+        return Search(self.num_vars, self.lits, self.starts, self.numstates,
+                      list(self.exclusive_lookup), internal_clauses=self.shared_clauses)
+
+    def givens(self, board) -> list[int]:
+        """
+        Returns the variables of the visible states filled in on `board`, a board
+        of the same shape, to be passed to `solve` as assumptions. This way one
+        formula built for an empty board can solve every puzzle of its shape.
+        """
+        assert (board.height, board.width) == (self.height, self.width)
+        out = []
+        for cell, state in enumerate(board.symbols[code] if code >= 0 else None
+                                     for code in board.grid.ravel().tolist()):
+            if state is not None and state in self.board.visible_states:
+                out.append(cell*self.numstates + self.states.index(state))
+        return out
+
+    def solve(self, max_sols=1, assumptions=(), visible_only=False, timeout=None,
+              max_decisions=None, max_conflicts=None, cancel=None):
+        """
+        Searches for up to `max_sols` solutions in which every variable of
+        `assumptions` is True. Unlike CNFSolver.solve, nothing is stored on the
+        formula: returns (list of PackedSolution, statistics). When a limit (see
+        CNFSolver.solve) stops the search early, the statistics hold a "stop_reason".
+        """
+        layout = self.layouts[1 if visible_only else 0]
+        search = self.new_search()
+        search.budget = Budget(timeout, max_decisions, max_conflicts, cancel)
+        solutions = [layout.pack(model) for model in
+                     search.enumerate_models(max_sols, self.block_vars, [2*var for var in assumptions])]
+        stats = search.statistics()
+        stats["solutions"] = len(solutions)
+        if search.stop_reason is not None:
+            stats["stop_reason"] = search.stop_reason
+        return solutions, stats
+
+    def to_board(self, solution, board=None):
+        """
+        Returns a copy of `board` (by default the board the formula was built
+        for) with the visible states of a solution filled in.
+        """
+        return solution.layout.to_board(solution, self.board if board is None else board)
@@ -0,0 +1,68 @@
+"""
+Checks that one compiled formula serves many solves at once, from threads,
+with the same results as separate solvers.
+"""
+import os
+import tempfile
+import threading
+
+from puzzle_formats import parse_sudoku_line
+from sat_solver import CNFSolver
+
+puzzles = [
+    "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61",
+    "8......5..1..4.6.87....3.......9..2..5.....4.1..7..9.5......2....64......8..6.1.9",
+    "..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..",
+]
+
+def board_string(board):
+    return "".join(state for row in board.data for state in row)
+
+def sequential_solutions(line, max_sols):
+    board, rule = parse_sudoku_line(line)
+    solver = CNFSolver(board, [rule])
+    results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None]
+    return sorted(board_string(solver.layout.to_board(sol, board)) for sol in results)
+
+def test_threads_share_formula():
+    empty, rule = parse_sudoku_line("."*81)
+    formula = CNFSolver(empty, [rule]).compile()
+    assert not formula.lits.flags.writeable
+    results = {}
+    def work(idx):
+        board, _ = parse_sudoku_line(puzzles[idx % len(puzzles)])
+        solutions, stats = formula.solve(max_sols=2, assumptions=formula.givens(board))
+        assert stats["solutions"] == len(solutions) and "stop_reason" not in stats
+        results[idx] = sorted(board_string(formula.to_board(sol, board)) for sol in solutions)
+    threads = [threading.Thread(target=work, args=(idx,)) for idx in range(3*len(puzzles))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for idx, found in results.items():
+        assert found == sequential_solutions(puzzles[idx % len(puzzles)], 2)
+    assert len(results) == len(threads)
+    # searches read the clauses of the formula instead of copying them
+    first, second = formula.new_search(), formula.new_search()
+    assert first.originals is second.originals is formula.shared_clauses
+    assert first.clauses == [] and first.arena_watches[0] is not second.arena_watches[0]
+
+def test_budget_and_loaded_formula():
+    empty, rule = parse_sudoku_line("."*81)
+    formula = CNFSolver(empty, [rule]).compile()
+    solutions, stats = formula.solve(max_sols=10, max_decisions=5)
+    assert stats["stop_reason"] == "decisions"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sudoku.formula")
+        board, rule = parse_sudoku_line(puzzles[0])
+        CNFSolver(board, [rule]).save(path)
+        loaded = CNFSolver.load(path).compile()
+        assert not loaded.lits.flags.writeable
+        solutions, _ = loaded.solve(max_sols=2)
+        assert [board_string(loaded.to_board(sol)) for sol in solutions] == \
+            sequential_solutions(puzzles[0], 2)
+
+if __name__ == "__main__":
+    test_threads_share_formula()
+    test_budget_and_loaded_formula()
+    print("All compiled formula tests passed")
@@ -0,0 +1,421 @@
+# Knowledge compilation of a formula into a decision diagram (a
+# decision-DNNF), to answer many queries against one fixed formula without
+# searching again: counting solutions that extend some givens, checking
+# whether a cell can take a state, and drawing uniformly random solutions.
+#
+# The compiler works top down, like an exhaustive search: it decides a
+# variable, propagates with a `Search` (clauses and exclusive groups), and
+# splits the constraints left into connected components, which share no
+# unassigned variable and are compiled independently. Every node is one of
+#   TRUE, FALSE,
+#   a literal implied by propagation,
+#   a decision on a variable (one child for True, one for False),
+#   the conjunction of the nodes of independent components.
+# Components are cached by their constraints and unassigned variables, so
+# one that shows up again under other decisions is compiled once, and
+# nodes are hash-consed, so the diagram is a DAG without repeated nodes.
+#
+# The diagram is projected onto the visible variables when the board has
+# visible states: decisions are only made on them, and a component without
+# any left is checked for satisfiability by a search of its own, becoming
+# TRUE or FALSE. Its models are then exactly the distinct solved boards,
+# as in CNFSolver.solve.
+#
+# Queries go once over the nodes in the order they were made (children
+# before parents), so they take time linear in the size of the diagram.
+# Compilation stops at `max_nodes` nodes; `PuzzleQueries` then answers
+# the same queries by search.
+
+import random
+import sys
+
+import numpy as np
+
+from search import Search, to_internal, UNASSIGNED
+
+FALSE, TRUE = 0, 1 # ids of the two constant nodes
+
+
+class DiagramTooLarge(Exception):
+    """
+    Raised by the compiler when the diagram grows past its node limit.
+    """
+
+
+class DecisionDiagram():
+    """
+    A compiled formula. Nodes are tuples: ("false",), ("true",), ("lit", lit),
+    ("dec", var, high, low) and ("and", children), with internal literals
+    and node ids; a node's children always have smaller ids.
+    """
+
+    def __init__(self, nodes, root, projection, layout, board) -> None:
+        """
+        Args:
+            nodes: list of node tuples
+            root: id of the root node
+            projection: the variables the diagram counts models over
+            layout: SolutionLayout used to pack sampled solutions
+            board: the board of the solver, to decode solutions
+        """
+        self.nodes = nodes
+        self.root = root
+        self.projection = projection
+        self.layout = layout
+        self.board = board
+        self.numstates = layout.numstates
+        self.width = layout.width
+        self.in_projection = np.zeros(layout.num_vars, dtype=bool)
+        self.in_projection[projection] = True
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def conditions(self, givens) -> dict[int, bool]:
+        """
+        Returns {var: True} for an iterable of variables that must be True.
+        Raises ValueError for variables the diagram does not count over.
+        """
+        givens = {int(var): True for var in givens}
+        outside = [var for var in givens if not self.in_projection[var]]
+        if outside:
+            raise ValueError(f"variables {outside} are not visible, so the diagram cannot condition on them")
+        return givens
+
+    def counts(self, givens=()) -> list[int]:
+        """
+        Returns, for every node, the number of models of the node that agree
+        with `givens` (variables that must be True).
+        """
+        fixed = self.conditions(givens)
+        out = [0]*len(self.nodes)
+        for idx, node in enumerate(self.nodes):
+            kind = node[0]
+            if kind == "true":
+                out[idx] = 1
+            elif kind == "lit":
+                lit = node[1]
+                out[idx] = 0 if fixed.get(lit >> 1, not lit & 1) != (not lit & 1) else 1
+            elif kind == "dec":
+                var, high, low = node[1:]
+                value = fixed.get(var)
+                out[idx] = (out[high] if value is not False else 0) + (out[low] if value is not True else 0)
+            elif kind == "and":
+                total = 1
+                for child in node[1]:
+                    total *= out[child]
+                    if total == 0:
+                        break
+                out[idx] = total
+        return out
+
+    def count(self, givens=()) -> int:
+        """
+        Returns the number of solutions in which every variable of `givens` is True.
+        """
+        return self.counts(givens)[self.root]
+
+    def can_take(self, row, col, state_num, givens=()) -> bool:
+        """
+        Returns True if the cell at (row, col) has state number `state_num`
+        in at least one solution agreeing with `givens`.
+        """
+        var = (row*self.width + col)*self.numstates + state_num
+        return self.count(list(givens) + [var]) > 0
+
+    def sample(self, givens=(), rng=None):
+        """
+        Returns a solution agreeing with `givens`, drawn uniformly at random
+        among them, as a PackedSolution, or None if there is none.
+        """
+        rng = rng if rng is not None else random.Random()
+        fixed = self.conditions(givens)
+        counts = self.counts(givens)
+        if counts[self.root] == 0:
+            return None
+        true_vars = []
+        stack = [self.root]
+        while stack:
+            node = self.nodes[stack.pop()]
+            kind = node[0]
+            if kind == "lit":
+                if not node[1] & 1:
+                    true_vars.append(node[1] >> 1)
+            elif kind == "and":
+                stack.extend(node[1])
+            elif kind == "dec":
+                var, high, low = node[1:]
+                value = fixed.get(var)
+                if value is None:
+                    high_count = counts[high]
+                    value = rng.randrange(high_count + counts[low]) < high_count
+                if value:
+                    true_vars.append(var)
+                stack.append(high if value else low)
+        return self.layout.pack(true_vars)
+
+    def to_board(self, solution, board=None):
+        return solution.layout.to_board(solution, self.board if board is None else board)
+
+
+class DiagramCompiler():
+    """
+    Compiles the formula of a CNFSolver into a DecisionDiagram.
+    """
+
+    def __init__(self, solver, max_nodes=20_000) -> None:
+        """
+        Args:
+            solver: a CNFSolver whose rules are all clauses
+            max_nodes: the compiler raises DiagramTooLarge past this many nodes
+        """
+        if solver.propagators():
+            raise ValueError("formulas with lazy rules cannot be compiled into a diagram")
+        self.solver = solver
+        self.max_nodes = max_nodes
+        num_vars, numstates = solver.num_vars, solver.numstates
+        lits, starts = solver.clauses.lits, solver.clauses.starts
+        self.search = Search(num_vars, lits, starts, numstates, solver.exclusive_lookup_list())
+        # constraints: the clauses, then an at-most-one group per cell and exclusive group
+        ilits, bounds = to_internal(lits).tolist(), starts.tolist()
+        self.constraints = [ilits[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        self.num_clauses = len(self.constraints)
+        for cell in range(solver.height*solver.width):
+            for group in solver.exclusive_states:
+                self.constraints.append([2*(cell*numstates + state) for state in group])
+        self.occurrences = [[] for _ in range(num_vars)]
+        for idx, constraint in enumerate(self.constraints):
+            for lit in constraint:
+                self.occurrences[lit >> 1].append(idx)
+        self.visible_only = len(solver.visible_vars()) > 0
+        self.projection = solver.visible_vars() if self.visible_only else np.arange(num_vars)
+        self.in_projection = [False]*num_vars
+        for var in self.projection.tolist():
+            self.in_projection[var] = True
+        self.nodes = [("false",), ("true",)]
+        self.unique = {node: idx for idx, node in enumerate(self.nodes)}
+        self.cache = {} # (constraints, variables) of a component -> node id
+
+    def node(self, node) -> int:
+        """
+        Returns the id of a node, adding it if it is new.
+        """
+        idx = self.unique.get(node)
+        if idx is None:
+            if len(self.nodes) >= self.max_nodes:
+                raise DiagramTooLarge(f"the diagram has more than {self.max_nodes} nodes")
+            idx = len(self.nodes)
+            self.nodes.append(node)
+            self.unique[node] = idx
+        return idx
+
+    def conjoin(self, children) -> int:
+        children = sorted(set(children))
+        if FALSE in children:
+            return FALSE
+        children = [child for child in children if child != TRUE]
+        if not children:
+            return TRUE
+        if len(children) == 1:
+            return children[0]
+        return self.node(("and", tuple(children)))
+
+    def active(self, idx) -> bool:
+        """
+        Returns True if a constraint still restricts its unassigned variables.
+        """
+        value = self.search.value
+        constraint = self.constraints[idx]
+        if idx < self.num_clauses: # a clause, unless satisfied
+            return all(value[lit] != 1 for lit in constraint)
+        # an exclusive group, unless a state is chosen or at most one is left
+        if any(value[lit] == 1 for lit in constraint):
+            return False
+        return sum(value[lit] == UNASSIGNED for lit in constraint) >= 2
+
+    def components(self, constraints, variables):
+        """
+        Splits the active constraints among `constraints` into connected
+        components. Returns a list of (constraints, unassigned variables)
+        pairs and the unassigned variables of `variables` left unconstrained.
+        """
+        value = self.search.value
+        active = {idx for idx in constraints if self.active(idx)}
+        seen = set()
+        out = []
+        for start in sorted(active):
+            if start in seen:
+                continue
+            seen.add(start)
+            comp_constraints, comp_vars = [start], set()
+            stack = [start]
+            while stack:
+                idx = stack.pop()
+                for lit in self.constraints[idx]:
+                    var = lit >> 1
+                    if value[lit] != UNASSIGNED or var in comp_vars:
+                        continue
+                    comp_vars.add(var)
+                    for other in self.occurrences[var]:
+                        if other in active and other not in seen:
+                            seen.add(other)
+                            comp_constraints.append(other)
+                            stack.append(other)
+            out.append((tuple(sorted(comp_constraints)), tuple(sorted(comp_vars))))
+        constrained = {var for _, comp_vars in out for var in comp_vars}
+        free = [var for var in variables if value[2*var] == UNASSIGNED and var not in constrained]
+        return out, free
+
+    def compile(self) -> DecisionDiagram:
+        """
+        Returns the diagram of the whole formula. Raises DiagramTooLarge.
+        """
+        search = self.search
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 20_000))
+        try:
+            if not search.ok or search.propagate() is not None:
+                root = FALSE
+            else:
+                root = self.compile_residual(range(len(self.constraints)),
+                                             range(self.solver.num_vars), 0)
+        finally:
+            sys.setrecursionlimit(limit)
+        layout = self.solver.solution_layout(self.visible_only)
+        return DecisionDiagram(self.nodes, root, self.projection, layout, self.solver.board)
+
+    def compile_residual(self, constraints, variables, trail_start) -> int:
+        """
+        Returns the node of what is left of `constraints` and `variables` under
+        the current assignment: the projected literals assigned since trail
+        index `trail_start`, and the components of the constraints left.
+        """
+        children = [self.node(("lit", lit)) for lit in self.search.trail[trail_start:]
+                    if self.in_projection[lit >> 1]]
+        comps, free = self.components(constraints, variables)
+        for var in free:
+            if self.in_projection[var]:
+                children.append(self.node(("dec", var, TRUE, TRUE)))
+        for comp in comps:
+            child = self.compile_component(*comp)
+            if child == FALSE:
+                return FALSE
+            children.append(child)
+        return self.conjoin(children)
+
+    def compile_component(self, constraints, variables) -> int:
+        key = (constraints, variables)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        projected = [var for var in variables if self.in_projection[var]]
+        if not projected:
+            result = TRUE if self.satisfiable(constraints, variables) else FALSE
+        else:
+            occurrences = self.occurrences
+            var = max(projected, key=lambda var: len(occurrences[var]))
+            high = self.branch(2*var, constraints, variables)
+            low = self.branch(2*var+1, constraints, variables)
+            result = FALSE if high == low == FALSE else self.node(("dec", var, high, low))
+        self.cache[key] = result
+        return result
+
+    def branch(self, lit, constraints, variables) -> int:
+        """
+        Returns the node of a component once `lit` is assigned.
+        """
+        search = self.search
+        level = search.decision_level()
+        trail_start = len(search.trail)
+        search.trail_lim.append(trail_start)
+        search.assign(lit, None)
+        try:
+            if search.propagate() is not None:
+                return FALSE
+            return self.compile_residual(constraints, variables, trail_start+1)
+        finally:
+            search.backtrack(level)
+
+    def satisfiable(self, constraints, variables) -> bool:
+        """
+        Checks, with a search of its own, whether a component has a model
+        under the current assignment.
+        """
+        value = self.search.value
+        number = {var: idx for idx, var in enumerate(variables)}
+        ilits, bounds = [], [0]
+        for idx in constraints:
+            free = [lit for lit in self.constraints[idx] if value[lit] == UNASSIGNED]
+            if idx < self.num_clauses:
+                ilits.extend(2*number[lit >> 1] + (lit & 1) for lit in free)
+                bounds.append(len(ilits))
+                continue
+            for pos, first in enumerate(free): # at most one: every pair is not both True
+                for second in free[pos+1:]:
+                    ilits.extend((2*number[first >> 1]+1, 2*number[second >> 1]+1))
+                    bounds.append(len(ilits))
+        search = Search(len(variables), None, None, internal_clauses=(ilits, bounds))
+        return search.solve() is True
+
+
+def compile_diagram(solver, max_nodes=20_000) -> DecisionDiagram | None:
+    """
+    Returns the DecisionDiagram of a solver's formula, or None if it would
+    have more than `max_nodes` nodes.
+    """
+    try:
+        return DiagramCompiler(solver, max_nodes).compile()
+    except DiagramTooLarge:
+        return None
+
+
+class PuzzleQueries():
+    """
+    Answers counting, possible-state and sampling queries about one puzzle,
+    from its decision diagram if it fits in `max_nodes` nodes, and by
+    search otherwise (or when the formula has propagators).
+    """
+
+    def __init__(self, solver, max_nodes=20_000) -> None:
+        self.solver = solver
+        self.diagram = None if solver.propagators() else compile_diagram(solver, max_nodes)
+        self.block_vars = solver.block_vars()
+        self.layout = solver.solution_layout(self.block_vars is not None)
+
+    def models(self, givens, max_models, rng=None):
+        search = self.solver.make_search()
+        if rng is not None and hasattr(search, "shuffle"):
+            search.shuffle(rng)
+        return search.enumerate_models(max_models, self.block_vars, [2*var for var in givens])
+
+    def count(self, givens=(), max_count=10**6) -> int:
+        """
+        Returns the number of solutions in which every variable of `givens` is
+        True. Without a diagram, the solutions are enumerated, up to `max_count`.
+        """
+        if self.diagram is not None:
+            return self.diagram.count(givens)
+        return sum(1 for _ in self.models(givens, max_count))
+
+    def can_take(self, row, col, state_num, givens=()) -> bool:
+        """
+        Returns True if the cell at (row, col) can have state number
+        `state_num` in a solution agreeing with `givens`.
+        """
+        if self.diagram is not None:
+            return self.diagram.can_take(row, col, state_num, givens)
+        var = (row*self.solver.width + col)*self.solver.numstates + state_num
+        return any(True for _ in self.models(list(givens) + [var], 1))
+
+    def sample(self, givens=(), rng=None):
+        """
+        Returns a random solution agreeing with `givens` as a PackedSolution,
+        or None if there is none. Uniform with a diagram; without one, the
+        solution found by a search with a randomized branching order.
+        """
+        rng = rng if rng is not None else random.Random()
+        if self.diagram is not None:
+            return self.diagram.sample(givens, rng)
+        for model in self.models(givens, 1, rng):
+            return self.layout.pack(model)
+        return None
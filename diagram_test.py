@@ -0,0 +1,67 @@
+"""
+Checks that decision diagram queries agree with search: solution counts
+under givens, possible states of a cell and sampled solutions, and that
+formulas too large for the node limit are answered by search instead.
+"""
+import random
+
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+from diagram import compile_diagram, PuzzleQueries
+from nurikabe import Nurikabe
+from verify import verify
+
+def enumerated(board, rule, max_sols=1000):
+    solver = CNFSolver(board, [rule])
+    return [sol for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None]
+
+def test_counts():
+    board, rule = parse_sudoku_line("."*16)
+    solver = CNFSolver(board, [rule])
+    diagram = compile_diagram(solver)
+    assert diagram.count() == 288 == len(enumerated(board, rule))
+    one = solver.gen_state_int(0, 0, "1")
+    two = solver.gen_state_int(0, 1, "2")
+    assert diagram.count([one]) == 72 and diagram.count([one, two]) == 24
+    assert diagram.can_take(0, 1, solver.state_map["2"], [one])
+    assert not diagram.can_take(0, 1, solver.state_map["1"], [one])
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    diagram = compile_diagram(CNFSolver(board, [rule]))
+    assert diagram.count() == len(enumerated(board, rule)) > 1
+
+def test_samples():
+    board, rule = parse_sudoku_line("."*16)
+    solver = CNFSolver(board, [rule])
+    diagram = compile_diagram(solver)
+    rng = random.Random(0)
+    one = solver.gen_state_int(0, 0, "1")
+    seen = set()
+    for _ in range(200):
+        solved = diagram.to_board(diagram.sample([one], rng))
+        assert verify(solved, rule) is None and solved.data[0][0] == "1"
+        seen.add(str(solved.data))
+    assert len(seen) > 50 # 72 solutions have a 1 in the corner
+    board, rule = parse_sudoku_line("11" + "."*14)
+    assert compile_diagram(CNFSolver(board, [rule])).sample() is None
+
+def test_search_fallback():
+    board, rule = parse_sudoku_line("1..." + "."*12)
+    solver = CNFSolver(board, [rule])
+    assert compile_diagram(solver, max_nodes=10) is None
+    queries = PuzzleQueries(solver, max_nodes=10)
+    assert queries.diagram is None and queries.count() == 72
+    assert queries.can_take(0, 1, solver.state_map["2"])
+    assert not queries.can_take(0, 1, solver.state_map["1"])
+    sample = queries.sample(rng=random.Random(1))
+    solved = sample.layout.to_board(sample, board)
+    assert verify(solved, rule) is None and solved.data[0][0] == "1"
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    lazy = Nurikabe(board, rule.empty_state, rule.filled_state, lazy=True)
+    queries = PuzzleQueries(CNFSolver(board, [lazy]))
+    assert queries.diagram is None and queries.count() == len(enumerated(board, rule))
+
+if __name__ == "__main__":
+    test_counts()
+    test_samples()
+    test_search_fallback()
+    print("All decision diagram tests passed")
@@ -0,0 +1,369 @@
+# Exact cover search (Knuth's Algorithm X) for puzzles built only from
+# "exactly one" constraints, such as Sudoku and its variants with other
+# region layouts (jigsaw Sudoku and the like).
+#
+# Every variable (a cell in a state) is a row, and every constraint a
+# column: the cell takes at most one state of its exclusive group, and each
+# state appears exactly once in each ExactlyOneInRegion region (at most
+# once for an AtMostOneInRegion region). A solution picks rows so that
+# every primary column is covered exactly once and every secondary column
+# at most once. The columns are kept as sets of rows, as in the dancing
+# links version of the algorithm, and the search always branches on the
+# primary column with the fewest rows left.
+#
+# This replaces the pairwise clauses and conflict driven search of a
+# CNFSolver for these puzzles. ExactCoverSolver only builds the clauses if
+# a method that needs them (like `save`, `solve_local` or `make_search`) is
+# called, and `make_solver` picks it automatically for rule trees it can handle.
+
+import hashlib
+import json
+import time
+
+import numpy as np
+
+from rules import Rule, SuperRule
+from sat_solver import CNFSolver
+from checkpoint import ragged_arrays, ragged_lists
+from sudoku import InitialConditions, AtMostOneInRegion, ExactlyOneInRegion
+
+
+def walk_rules(rules):
+    """
+    Yields every Rule and SuperRule of a list of rule trees, parents first.
+    ExactlyOneInRegion rules are yielded without their two sub-rules.
+    """
+    for rule in rules:
+        yield rule
+        if isinstance(rule, SuperRule) and not isinstance(rule, ExactlyOneInRegion):
+            yield from walk_rules(rule.rules)
+
+
+def is_exact_cover(board, rules) -> bool:
+    """
+    Returns True if a list of rule trees can be solved as an exact cover
+    problem: it only holds ExactlyOneInRegion, AtMostOneInRegion and
+    InitialConditions rules, every state belongs to a single exclusive group
+    and every state is visible (so that covers and solved boards match one
+    to one).
+    """
+    groups = [rule.states for rule in walk_rules(rules) if rule.add_exclusive]
+    if len(groups) != 1:
+        return False
+    group = set(groups[0])
+    for rule in walk_rules(rules):
+        if isinstance(rule, SuperRule) and not isinstance(rule, ExactlyOneInRegion):
+            continue
+        if not isinstance(rule, (ExactlyOneInRegion, AtMostOneInRegion, InitialConditions)) \
+                and type(rule) is not Rule: # a plain Rule only groups states
+            return False
+        if not set(getattr(rule, "states", None) or []) <= group:
+            return False
+    return group <= set(board.visible_states)
+
+
+class ExactCoverSearch():
+    """
+    Algorithm X over the rows and columns of one puzzle. Used by CNFSolver.solve
+    in place of a `Search`, with the same interface for enumerating models.
+    A search runs once: make a new one to solve again.
+    """
+
+    def __init__(self, row_columns, primary, givens=()) -> None:
+        """
+        Args:
+            row_columns: list indexed by variable, holding the columns the
+                variable covers
+            primary: set of the columns that must be covered
+            givens: variables that must be True
+        """
+        self.row_columns = row_columns
+        self.primary = primary
+        self.givens = givens
+        self.columns = {col: set() for col in primary}
+        for row, cols in enumerate(row_columns):
+            for col in cols:
+                if col in self.columns:
+                    self.columns[col].add(row)
+                else:
+                    self.columns[col] = {row}
+        self.open = set(primary) # primary columns not covered yet
+        self.chosen = [] # rows of the partial solution
+        # each entry: [candidate rows, index of the next one, selected row, removed columns]
+        self.stack = []
+        self.restored = None # path to replay, set by `restore_state`
+        self.decisions = 0
+        self.conflicts = 0
+        self.budget = None
+        self.stop_reason = None
+        self.checkpointer = None # told about every decision (see checkpoint.py)
+        self.start_time = time.monotonic()
+
+    def select(self, row) -> list[set]:
+        """
+        Adds a row to the partial solution: covers its columns and removes
+        every row clashing with it. Returns the removed columns for `deselect`.
+        """
+        columns, row_columns = self.columns, self.row_columns
+        removed = []
+        for col in row_columns[row]:
+            for other in columns[col]:
+                for other_col in row_columns[other]:
+                    if other_col != col:
+                        columns[other_col].remove(other)
+            removed.append(columns.pop(col))
+            self.open.discard(col)
+        self.chosen.append(row)
+        return removed
+
+    def deselect(self, row, removed) -> None:
+        """
+        Undoes the `select` of the last row of the partial solution.
+        """
+        columns, row_columns = self.columns, self.row_columns
+        self.chosen.pop()
+        for col in reversed(row_columns[row]):
+            columns[col] = removed.pop()
+            if col in self.primary:
+                self.open.add(col)
+            for other in columns[col]:
+                for other_col in row_columns[other]:
+                    if other_col != col:
+                        columns[other_col].add(other)
+
+    def assume(self, assumptions) -> bool:
+        """
+        Selects the rows of the True literals of `assumptions` (internal
+        literals, 2*var for True and 2*var+1 for False) and removes the rows
+        of the False ones. Returns False if they clash.
+        """
+        columns, row_columns = self.columns, self.row_columns
+        for lit in assumptions:
+            row = lit >> 1
+            available = all(col in columns and row in columns[col] for col in row_columns[row])
+            if lit & 1:
+                if row in self.chosen:
+                    return False
+                if available:
+                    for col in row_columns[row]:
+                        columns[col].remove(row)
+            elif row not in self.chosen:
+                if not available:
+                    return False
+                self.select(row)
+        return True
+
+    def branch_column(self):
+        """
+        Returns the rows of the open primary column with the fewest rows.
+        """
+        columns = self.columns
+        best, best_size = None, None
+        for col in self.open:
+            size = len(columns[col])
+            if best is None or size < best_size:
+                best, best_size = col, size
+                if size <= 1: # cannot do better
+                    break
+        return sorted(columns[best])
+
+    def enumerate_models(self, max_models, block_vars=None, assumptions=()):
+        """
+        Yields up to `max_models` distinct exact covers in which the
+        `assumptions` (internal literals) hold, each as a sorted list of
+        True variables. Distinct covers always differ in their visible
+        states, so `block_vars` is not needed. Stops early, with
+        `self.stop_reason` set, if the budget runs out.
+        """
+        if max_models <= 0 or not self.assume([2*var for var in self.givens] + list(assumptions)):
+            return
+        if self.restored is not None:
+            self.replay(self.restored)
+        elif not self.open:
+            yield sorted(self.chosen)
+            return
+        else:
+            self.stack = [[self.branch_column(), 0, None, None]]
+        found = 0
+        stack = self.stack
+        while stack:
+            entry = stack[-1]
+            if entry[2] is not None:
+                self.deselect(entry[2], entry[3])
+                entry[2] = None
+            if entry[1] == len(entry[0]):
+                stack.pop()
+                continue
+            if self.budget is not None:
+                self.stop_reason = self.budget.exhausted(self)
+                if self.stop_reason is not None:
+                    return
+            if self.checkpointer is not None:
+                self.checkpointer.tick(self)
+            row = entry[0][entry[1]]
+            entry[1] += 1
+            self.decisions += 1
+            entry[2], entry[3] = row, self.select(row)
+            if not self.open:
+                found += 1
+                yield sorted(self.chosen)
+                if found >= max_models:
+                    return
+                continue
+            candidates = self.branch_column()
+            if not candidates:
+                self.conflicts += 1
+                continue
+            stack.append([candidates, 0, None, None])
+
+    def block(self, block_vars=None) -> bool:
+        """
+        Makes the search continue past the current cover, like Search.block.
+        Covers are never found twice anyway, so this only tells whether the
+        search has anything left to try.
+        """
+        return any(entry[1] < len(entry[0]) for entry in self.stack)
+
+    def replay(self, path) -> None:
+        """
+        Rebuilds the stack of a saved search by selecting the same candidates again.
+        """
+        for candidates, next_idx, selected in path:
+            entry = [candidates, next_idx, None, None]
+            if selected:
+                row = entry[0][next_idx-1]
+                entry[2], entry[3] = row, self.select(row)
+            self.stack.append(entry)
+
+    def checkpoint_state(self) -> tuple[dict, dict]:
+        """
+        Returns the state needed to resume this search as (JSON-serializable
+        dictionary, dictionary of arrays), for `restore_state`: the candidates
+        of every level, the index of the next one and whether the previous
+        one is selected.
+        """
+        path = np.array([[entry[1], entry[2] is not None] for entry in self.stack],
+                        dtype=np.int64).reshape(-1, 2)
+        lits, starts = ragged_arrays([entry[0] for entry in self.stack])
+        state = {"decisions": self.decisions, "conflicts": self.conflicts,
+                 "elapsed": time.monotonic() - self.start_time}
+        return state, {"path": path, "candidates": lits, "candidate_starts": starts}
+
+    def restore_state(self, state, arrays) -> None:
+        """
+        Continues a search saved by `checkpoint_state` on the same puzzle.
+        Must be called before `enumerate_models`, with the same assumptions.
+        """
+        candidates = ragged_lists(arrays["candidates"], arrays["candidate_starts"])
+        self.restored = [(rows, next_idx, bool(selected))
+                         for rows, (next_idx, selected) in zip(candidates, arrays["path"].tolist())]
+        self.decisions, self.conflicts = state["decisions"], state["conflicts"]
+        self.start_time = time.monotonic() - state["elapsed"]
+
+    def statistics(self) -> dict:
+        return {"decisions": self.decisions, "conflicts": self.conflicts,
+                "elapsed": time.monotonic() - self.start_time}
+
+
+class ExactCoverSolver(CNFSolver):
+    """
+    A CNFSolver for rule trees accepted by `is_exact_cover`, which solves
+    them by exact cover search. The clauses of the rules are only built
+    the first time `self.clauses` is used.
+    """
+
+    def __init__(self, board, rules=[], workers=None):
+        if not is_exact_cover(board, rules):
+            raise ValueError("the rules are not an exact cover problem")
+        self.tree = rules
+        super().__init__(board, rules, workers)
+
+    def add_rule_formulas(self):
+        self.formulas_added = False
+
+    @property
+    def clauses(self):
+        if not self.formulas_added:
+            self.formulas_added = True
+            CNFSolver.add_rule_formulas(self)
+        return self.store
+
+    @clauses.setter
+    def clauses(self, store):
+        self.store = store
+
+    def clause_stats(self):
+        self.clauses
+        return super().clause_stats()
+
+    def structure_key(self):
+        # exact cover search learns no clauses to share
+        return None
+
+    def formula_digest(self):
+        # the rows and columns define the search, without building the clauses
+        row_columns, primary, givens = self.row_columns()
+        return hashlib.sha256(json.dumps([self.exclusive_states, row_columns,
+                                          sorted(primary), givens]).encode()).hexdigest()
+
+    def row_columns(self) -> tuple[list[list[int]], set[int]]:
+        """
+        Returns the columns covered by every variable, the set of primary
+        columns and the variables of the givens. Column `cell` is the state of
+        a cell; the others are one per (region, state) pair. Cells of an
+        ExactlyOneInRegion region over every state always hold a state, so
+        their cell column is primary.
+        """
+        group = self.exclusive_states[0]
+        num_cells = self.height*self.width
+        row_columns = [[] for _ in range(self.num_vars)]
+        for cell in range(num_cells):
+            for state in group:
+                row_columns[cell*self.numstates + state].append(cell)
+        primary = set()
+        givens = []
+        next_col = num_cells
+        for rule in walk_rules(self.tree):
+            if isinstance(rule, InitialConditions):
+                for row_idx, row in enumerate(rule.board.data):
+                    for col_idx, cell in enumerate(row):
+                        if cell in rule.board.visible_states:
+                            givens.append(self.gen_state_int(row_idx, col_idx, cell))
+                continue
+            if isinstance(rule, ExactlyOneInRegion):
+                region, states, is_primary = rule.rules[0].region_coords, rule.rules[0].states, True
+            elif isinstance(rule, AtMostOneInRegion):
+                region, states, is_primary = rule.region_coords, rule.states, False
+            else:
+                continue
+            vars = [(row_idx*self.width + col_idx)*self.numstates for row_idx, col_idx in region]
+            for state in states:
+                state_num = self.state_map[state]
+                for var in vars:
+                    row_columns[var + state_num].append(next_col)
+                if is_primary:
+                    primary.add(next_col)
+                next_col += 1
+            if is_primary and len(states) == len(group):
+                primary.update(var // self.numstates for var in vars)
+        return row_columns, primary, givens
+
+    def make_enumerator(self, simplify=False):
+        """
+        Returns a fresh `ExactCoverSearch` over the rows and columns of the
+        puzzle, which `solve` enumerates solutions with. There are no clauses
+        to simplify, so `simplify` is ignored. `make_search` still returns a
+        conflict driven `Search` over the clauses, for callers that need to
+        add clauses or variables (such as backbone.py and generator.py).
+        """
+        return ExactCoverSearch(*self.row_columns())
+
+
+def make_solver(board, rules=[]):
+    """
+    Returns an ExactCoverSolver for rule trees it can handle (see
+    `is_exact_cover`), and a CNFSolver otherwise.
+    """
+    if is_exact_cover(board, rules):
+        return ExactCoverSolver(board, rules)
+    return CNFSolver(board, rules)
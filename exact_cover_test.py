@@ -0,0 +1,78 @@
+"""
+Checks that exact cover search finds the same solutions as the CNF search,
+for Sudoku and for other region layouts, and that it is only picked for
+rule trees it can handle.
+"""
+import os
+import tempfile
+
+from boards import Board
+from rules import SuperRule
+from sudoku import InitialConditions, ExactlyOneInRegion, ExactlyOneInRepeatingRect
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver, Unknown
+from exact_cover import ExactCoverSolver, make_solver
+
+hard_sudoku = "8......5..1..4.6.87....3.......9..2..5.....4.1..7..9.5......2....64......8..6.1.9"
+
+class Jigsaw(SuperRule):
+    """
+    A Sudoku whose boxes are replaced by arbitrary regions.
+    """
+
+    def __init__(self, board, states, regions):
+        self.board = board
+        self.states = states
+        self.rules = [ExactlyOneInRepeatingRect(board, states, 1, board.width),
+                      ExactlyOneInRepeatingRect(board, states, board.height, 1),
+                      *[ExactlyOneInRegion(board, states, region) for region in regions],
+                      InitialConditions(board, states)]
+        super().__init__(self.rules, True)
+
+def solved_boards(solver, board, max_sols):
+    results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None]
+    return sorted(str(solver.layout.to_board(sol, board).data) for sol in results)
+
+def test_sudoku_matches_cnf():
+    counts = []
+    for line, max_sols in ((hard_sudoku, 2), ("."*16, 1000), ("11" + "."*14, 10)):
+        board, rule = parse_sudoku_line(line)
+        solver = make_solver(board, [rule])
+        assert isinstance(solver, ExactCoverSolver)
+        found = solved_boards(solver, board, max_sols)
+        board, rule = parse_sudoku_line(line)
+        assert found == solved_boards(CNFSolver(board, [rule]), board, max_sols)
+        counts.append(len(found))
+    assert counts == [1, 288, 0]
+
+def test_jigsaw_regions():
+    states = ["1", "2", "3", "4"]
+    regions = [[(0, 0), (0, 1), (0, 2), (1, 0)], [(0, 3), (1, 1), (1, 2), (1, 3)],
+               [(2, 0), (3, 0), (3, 1), (2, 1)], [(2, 2), (2, 3), (3, 2), (3, 3)]]
+    data = Board.gen_empty_board(4, 4)
+    data[0][0] = "1"
+    board = Board(data, states)
+    rule = Jigsaw(board, states, regions)
+    solver = make_solver(board, [rule])
+    assert isinstance(solver, ExactCoverSolver)
+    found = solved_boards(solver, board, 100)
+    assert found and found == solved_boards(CNFSolver(board, [Jigsaw(board, states, regions)]), board, 100)
+
+def test_budget_and_fallback():
+    board, rule = parse_sudoku_line("."*81)
+    solver = make_solver(board, [rule])
+    results = list(solver.solve(max_sols=10**6, quiet=True, max_decisions=500))
+    assert isinstance(results[-1], Unknown) and results[-1].reason == "decisions"
+    # the clauses are only built when needed, for instance to save the formula
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sudoku.formula")
+        solver.save(path)
+        assert CNFSolver.load(path).num_vars == solver.num_vars
+    board, rule = parse_nurikabe_block(["2..", "...", "..1"])
+    assert type(make_solver(board, [rule])) is CNFSolver
+
+if __name__ == "__main__":
+    test_sudoku_matches_cnf()
+    test_jigsaw_regions()
+    test_budget_and_fallback()
+    print("All exact cover tests passed")
@@ -0,0 +1,77 @@
+# Binary file format for fully built formulas, so that a CNFSolver
+# can be saved once and loaded again without running any rules.
+#
+# Layout of a file:
+#   magic (4 bytes) | version (uint32) | header length (uint64) | header (JSON)
+#   followed by the raw arrays, each starting on a 64 byte boundary.
+# The header holds the solver metadata and, for each array, its dtype,
+# shape and offset in the file. Arrays are read back as zero-copy views
+# of a read-only memory map, so processes loading the same file share
+# a single copy in the page cache.
+
+import json
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"TLCF"
+VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<4sIQ")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_formula(path, metadata: dict, arrays: dict[str, np.ndarray], magic=MAGIC) -> None:
+    """
+    Writes the JSON-serializable `metadata` and the NumPy `arrays` to `path`.
+    Other kinds of files (like search checkpoints) use the same layout with
+    a `magic` of their own.
+    """
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    # the header stores the array offsets, which depend on the header length,
+    # so lay the arrays out relative to the end of the header first
+    table = {}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = _aligned(offset)
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+    header = json.dumps({"metadata": metadata, "arrays": table}).encode()
+    data_start = _aligned(PREAMBLE.size + len(header))
+    with open(path, "wb") as f:
+        f.write(PREAMBLE.pack(magic, VERSION, len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            position = data_start + table[name]["offset"]
+            f.write(b"\0" * (position - f.tell()))
+            f.write(arr.tobytes())
+
+
+def read_formula(path, magic=MAGIC) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Memory maps the file at `path` and returns (metadata, arrays), where every
+    array is a read-only view into the mapping.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    file_magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+    if file_magic != magic:
+        raise ValueError(f"{path} starts with {file_magic!r} instead of {magic!r}, "
+                         "so it is not a file of this kind")
+    if version != VERSION:
+        raise ValueError(f"{path} has format version {version}, expected {VERSION}")
+    header = json.loads(buffer[PREAMBLE.size:PREAMBLE.size+header_len])
+    data_start = _aligned(PREAMBLE.size + header_len)
+    arrays = {}
+    for name, info in header["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"], dtype=np.int64))
+        if count == 0:
+            arrays[name] = np.empty(info["shape"], dtype=dtype)
+            continue
+        arr = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + info["offset"])
+        arrays[name] = arr.reshape(info["shape"])
+    return header["metadata"], arrays
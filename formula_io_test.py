@@ -0,0 +1,65 @@
+"""
+Checks that a solver saved to a formula file and loaded again holds the
+same clauses, states and board, finds the same solutions without running
+any rule, and reads its arrays from a read-only memory map.
+"""
+import os
+import tempfile
+import numpy as np
+
+import formula_io
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+from nurikabe import Nurikabe
+
+def solutions(solver, max_sols=1000):
+    return [solver.layout.to_board(sol, solver.board).data
+            for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None]
+
+def test_round_trip():
+    puzzles = [parse_sudoku_line("1..." + "."*12), parse_nurikabe_block(["1...", "..3.", "....", "2..."])]
+    for board, rule in puzzles:
+        solver = CNFSolver(board, [rule])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "puzzle.formula")
+            solver.save(path)
+            loaded = CNFSolver.load(path)
+            assert loaded.rules == [] and loaded.board.data == board.data
+            assert loaded.board.visible_states == board.visible_states
+            assert loaded.board.constraints == board.constraints
+            assert (loaded.states, loaded.state_map, loaded.exclusive_states) == \
+                   (solver.states, solver.state_map, solver.exclusive_states)
+            assert np.array_equal(loaded.clauses.lits, solver.clauses.lits)
+            assert np.array_equal(loaded.clauses.starts, solver.clauses.starts)
+            for ours, theirs in zip(loaded.clauses.occurrences(), solver.clauses.occurrences()):
+                assert np.array_equal(ours, theirs)
+            assert not loaded.clauses.lits.flags.writeable
+            assert solutions(loaded) == solutions(solver)
+            # adding a clause copies the mapped arrays instead of writing to the file
+            loaded.clauses.add_clause([-1, -2, -3, -5, -8])
+            assert len(loaded.clauses) == len(solver.clauses) + 1
+            assert CNFSolver.load(path).clauses.num_clauses == len(solver.clauses)
+
+def test_refused_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "other.formula")
+        formula_io.write_formula(path, {"height": 1}, {"lits": np.arange(3)}, magic=b"XXXX")
+        metadata, arrays = formula_io.read_formula(path, magic=b"XXXX")
+        assert metadata == {"height": 1} and arrays["lits"].tolist() == [0, 1, 2]
+        try:
+            formula_io.read_formula(path) # not a formula file
+            assert False
+        except ValueError:
+            pass
+        board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+        lazy = Nurikabe(board, rule.empty_state, rule.filled_state, lazy=True)
+        try:
+            CNFSolver(board, [lazy]).save(path)
+            assert False
+        except ValueError:
+            pass
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_refused_files()
+    print("All formula file tests passed")
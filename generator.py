@@ -0,0 +1,172 @@
+# Generates puzzles with a unique solution.
+# A random full solution is found first, then clues (given cells) are
+# added until no other solution exists and removed again while the
+# solution stays unique. Every uniqueness check runs on the same
+# incremental Search: the clues are passed as assumptions and the
+# "differs from the solution" clause is switched on by a selector
+# variable, so learned clauses carry over from one check, and one
+# puzzle, to the next.
+#
+# Usage: python generator.py {sudoku,nurikabe} [template] [--count N] [--seed S] [--size N]
+#
+# The template is a puzzle file whose first puzzle gives the board and its
+# fixed constraints (its givens are kept). For Sudoku it defaults to an
+# empty --size x --size grid; for Nurikabe, whose clues are numbers, it is
+# required and the generated clues are shaded cells. Puzzles are written
+# to stdout in the formats of `puzzle_formats`, throughput to stderr.
+
+import argparse
+import copy
+import random
+import sys
+import time
+
+import numpy as np
+
+from exact_cover import make_solver
+from puzzle_formats import RECORDS, PARSERS, FORMATTERS, FILLED_STATE, iter_lines, parse_sudoku_line
+
+
+class PuzzleGenerator():
+    """
+    Generates puzzles for one board shape and rule, reusing a single search.
+    """
+
+    def __init__(self, board, rule, clue_states=None, seed=None):
+        """
+        Args:
+            board: the board to generate puzzles on; cells it already fills are kept
+            rule: the rule (usually a SuperRule) the puzzles follow
+            clue_states: the visible states that can be given as clues,
+                all visible states by default
+            seed: seed of the random number generator
+        """
+        self.board = board
+        self.solver = solver = make_solver(board, [rule])
+        self.search = solver.make_search()
+        self.rng = random.Random(seed)
+        self.visible_states = list(board.visible_states)
+        if clue_states is None:
+            clue_states = self.visible_states
+        self.clue_codes = {self.visible_states.index(state) for state in clue_states}
+        cells = np.arange(board.num_cells)
+        # cell_vars[cell][code] is the variable of visible state `code` in `cell`
+        self.cell_vars = np.stack([solver.gen_state_ints(cells, state)
+                                   for state in self.visible_states], axis=1).tolist()
+        self.generated = 0
+        self.checks = 0
+        self.elapsed = 0.0
+
+    def random_solution(self) -> list[int]:
+        """
+        Returns a random full solution, as the visible state code of every
+        cell (-1 for a cell without a visible state).
+        """
+        search = self.search
+        search.shuffle(self.rng)
+        if not search.solve():
+            raise ValueError("the puzzle has no solution")
+        return [next((code for code, var in enumerate(cell_vars) if search.var_value(var)), -1)
+                for cell_vars in self.cell_vars]
+
+    def has_other_solution(self, clues, solution, selector) -> bool:
+        """
+        Checks whether a solution other than `solution` agrees with the clues.
+        If so, the search is left on that other solution.
+        """
+        self.checks += 1
+        assumptions = [2*self.cell_vars[cell][solution[cell]] for cell in clues]
+        return bool(self.search.solve(assumptions + [2*selector]))
+
+    def generate_clues(self, solution) -> list[int]:
+        """
+        Returns a minimal list of cells whose solution states make `solution`
+        the only solution.
+        """
+        search = self.search
+        candidates = [cell for cell, code in enumerate(solution) if code in self.clue_codes]
+        # the selector switches on the clause requiring some other visible state
+        selector = search.new_var()
+        search.backtrack(0)
+        search.add_clause([2*selector+1] + [2*self.cell_vars[cell][code]+1
+                                            for cell, code in enumerate(solution) if code >= 0])
+        clues = []
+        while self.has_other_solution(clues, solution, selector):
+            differing = [cell for cell in candidates
+                         if not search.var_value(self.cell_vars[cell][solution[cell]])]
+            if not differing:
+                raise ValueError("the clue states cannot make this solution unique")
+            clues.append(self.rng.choice(differing))
+        # drop the clues the others make unnecessary
+        for cell in self.rng.sample(clues, len(clues)):
+            fewer = [other for other in clues if other != cell]
+            if not self.has_other_solution(fewer, solution, selector):
+                clues = fewer
+        search.backtrack(0)
+        search.add_clause([2*selector+1]) # retire the clause for good
+        return clues
+
+    def to_board(self, codes) -> "Board":
+        """
+        Returns a copy of the board with the given visible state codes filled in.
+        """
+        data = [list(row) for row in self.board.data]
+        for cell, code in codes.items():
+            row, col = divmod(cell, self.board.width)
+            data[row][col] = self.visible_states[code]
+        new_board = copy.copy(self.board)
+        new_board.data = data
+        return new_board
+
+    def generate(self):
+        """
+        Generates one puzzle. Returns (puzzle board, solved board).
+        """
+        start = time.perf_counter()
+        solution = self.random_solution()
+        clues = self.generate_clues(solution)
+        puzzle = self.to_board({cell: solution[cell] for cell in clues})
+        solved = self.to_board({cell: code for cell, code in enumerate(solution) if code >= 0})
+        self.generated += 1
+        self.elapsed += time.perf_counter() - start
+        return puzzle, solved
+
+    def throughput(self) -> float:
+        """
+        Puzzles generated per second so far.
+        """
+        return self.generated/self.elapsed if self.elapsed > 0 else 0.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate puzzles with a unique solution.")
+    parser.add_argument("puzzle_type", choices=sorted(PARSERS))
+    parser.add_argument("template", nargs="?", default=None,
+                        help="file whose first puzzle gives the board and fixed constraints")
+    parser.add_argument("--count", type=int, default=10, help="number of puzzles to generate")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--size", type=int, default=9, help="Sudoku size without a template")
+    args = parser.parse_args(argv)
+    if args.template is not None:
+        record = next(RECORDS[args.puzzle_type](iter_lines(args.template)))
+        board, rule = PARSERS[args.puzzle_type](record)
+    elif args.puzzle_type == "sudoku":
+        board, rule = parse_sudoku_line("."*args.size*args.size)
+    else:
+        parser.error("a template is needed for Nurikabe puzzles")
+    clue_states = [FILLED_STATE] if args.puzzle_type == "nurikabe" else None
+    generator = PuzzleGenerator(board, rule, clue_states, args.seed)
+    for _ in range(args.count):
+        puzzle, _ = generator.generate()
+        sys.stdout.write(FORMATTERS[args.puzzle_type](puzzle) + "\n")
+        if args.puzzle_type == "nurikabe":
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+    print(f"{generator.generated} puzzle(s) in {generator.elapsed:.3f} seconds "
+          f"({generator.throughput():.1f} puzzles/second, {generator.checks} uniqueness checks)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Generates a few Sudoku puzzles and checks, with fresh solvers, that each
+has exactly the generated solution and that no clue can be dropped.
+"""
+from generator import PuzzleGenerator
+from puzzle_formats import parse_sudoku_line, format_sudoku
+from sat_solver import CNFSolver
+from exact_cover import ExactCoverSolver
+
+def count_solutions(line, max_sols=2):
+    board, rule = parse_sudoku_line(line)
+    solver = CNFSolver(board, [rule])
+    return len([sol for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None])
+
+def test_unique_and_minimal():
+    board, rule = parse_sudoku_line("."*16)
+    generator = PuzzleGenerator(board, rule, seed=5)
+    for _ in range(5):
+        puzzle, solved = generator.generate()
+        line, solution = format_sudoku(puzzle), format_sudoku(solved)
+        assert "." not in solution
+        assert all(clue == "." or clue == value for clue, value in zip(line, solution))
+        assert count_solutions(line) == 1
+        for idx, clue in enumerate(line):
+            if clue != ".":
+                assert count_solutions(line[:idx] + "." + line[idx+1:]) == 2
+    assert generator.throughput() > 0
+    # Sudoku rules are solved by exact cover, but generating needs a CDCL search
+    assert isinstance(generator.solver, ExactCoverSolver)
+
+def test_9x9():
+    board, rule = parse_sudoku_line("."*81)
+    generator = PuzzleGenerator(board, rule, seed=1)
+    for _ in range(2):
+        puzzle, _ = generator.generate()
+        assert count_solutions(format_sudoku(puzzle)) == 1
+
+if __name__ == "__main__":
+    test_unique_and_minimal()
+    test_9x9()
+    print("All generator tests passed")
@@ -0,0 +1,172 @@
+# Simplification of a formula through its binary implication graph,
+# run once before search.
+#
+# Every binary clause (a OR b) is a pair of implications: NOT a -> b and
+# NOT b -> a. Literals in the same strongly connected component of this
+# graph imply each other, so they are equivalent: each component gets a
+# representative literal (the one of its smallest variable), substituted
+# for the other literals in every clause. Clauses that become tautologies
+# or duplicates are dropped and duplicate literals merged. A component
+# holding both a literal and its negation makes the formula unsatisfiable.
+# The substituted variables are not removed, as exclusive groups, solution
+# layouts and propagators refer to every variable of the grid: each one
+# stays tied to its representative by the two binary clauses of their
+# equivalence.
+#
+# The simplified formula is then probed (see Search.probe): a literal
+# whose assignment leads to a conflict by propagation alone is a failed
+# literal, so its negation holds in every model and is added as a unit
+# clause.
+
+from search import Search
+
+
+def binary_graph(num_vars, ilits, bounds) -> list[list[int]]:
+    """
+    Returns, for every internal literal, the literals its binary clauses imply.
+    """
+    graph = [[] for _ in range(2*num_vars)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end - start == 2:
+            first, second = ilits[start], ilits[start+1]
+            graph[first ^ 1].append(second)
+            graph[second ^ 1].append(first)
+    return graph
+
+
+def strongly_connected(graph) -> list[int]:
+    """
+    Returns the strongly connected component of every node of a graph given
+    as successor lists (Tarjan's algorithm, without recursion).
+    """
+    num_nodes = len(graph)
+    index = [-1]*num_nodes
+    low = [0]*num_nodes
+    component = [-1]*num_nodes
+    stack = []
+    counter = 0
+    num_components = 0
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        work = [(root, 0)]
+        while work:
+            node, pos = work[-1]
+            successors = graph[node]
+            if pos < len(successors):
+                work[-1] = (node, pos+1)
+                succ = successors[pos]
+                if index[succ] == -1:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    work.append((succ, 0))
+                elif component[succ] == -1: # still on the stack
+                    low[node] = min(low[node], index[succ])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    component[member] = num_components
+                    if member == node:
+                        break
+                num_components += 1
+    return component
+
+
+def equivalent_literals(num_vars, ilits, bounds) -> list[int] | None:
+    """
+    Returns the representative of every internal literal (itself if it has
+    no equivalent literal), or None if a literal is equivalent to its negation.
+    """
+    component = strongly_connected(binary_graph(num_vars, ilits, bounds))
+    rep = list(range(2*num_vars))
+    first = {} # component -> literal of its smallest variable
+    for lit in range(2*num_vars):
+        comp = component[lit]
+        if comp == component[lit ^ 1]:
+            return None
+        if comp in first:
+            rep[lit] = first[comp]
+        else:
+            first[comp] = lit
+    return rep
+
+
+def substitute(ilits, bounds, rep) -> tuple[list[int], list[int]]:
+    """
+    Rewrites clauses of internal literals with their representatives,
+    dropping tautologies and duplicate clauses, and adds the two binary
+    clauses tying every substituted variable to its representative.
+    Returns the new (literals, offsets) lists.
+    """
+    out_lits, out_bounds = [], [0]
+    seen = set()
+
+    def emit(clause):
+        key = tuple(sorted(clause))
+        if key not in seen:
+            seen.add(key)
+            out_lits.extend(clause)
+            out_bounds.append(len(out_lits))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        clause = list(dict.fromkeys(rep[lit] for lit in ilits[start:end]))
+        if any(lit ^ 1 in clause for lit in clause):
+            continue
+        emit(clause)
+    for lit in range(0, len(rep), 2):
+        if rep[lit] != lit:
+            emit([lit ^ 1, rep[lit]])
+            emit([lit, rep[lit] ^ 1])
+    return out_lits, out_bounds
+
+
+def simplify(num_vars, ilits, bounds, numstates=1, exclusive_lookup=None,
+             max_probes=None) -> tuple[tuple[list[int], list[int]], dict]:
+    """
+    Substitutes equivalent literals in a formula of internal literals and
+    adds the negations of its failed literals as unit clauses. The result
+    has the same models.
+
+    Args:
+        num_vars, numstates, exclusive_lookup: as for Search
+        ilits, bounds: the clauses, as lists of internal literals and offsets
+        max_probes: maximum number of literals to probe (by default all)
+    Returns:
+        the (literals, offsets) of the simplified formula and a dictionary of
+        statistics: number of substituted variables, failed literals and
+        clauses before and after
+    """
+    stats = {"clauses": len(bounds) - 1, "equivalent": 0, "failed": 0}
+    rep = equivalent_literals(num_vars, ilits, bounds)
+    if rep is None:
+        stats["simplified_clauses"] = 1
+        return ([], [0, 0]), stats # the empty clause
+    stats["equivalent"] = sum(rep[lit] != lit for lit in range(0, 2*num_vars, 2))
+    if stats["equivalent"]:
+        ilits, bounds = substitute(ilits, bounds, rep)
+    if max_probes == 0:
+        stats["simplified_clauses"] = len(bounds) - 1
+        return (ilits, bounds), stats
+    search = Search(num_vars, None, None, numstates, exclusive_lookup,
+                    internal_clauses=(ilits, bounds))
+    failed = search.probe(max_probes)
+    stats["failed"] = len(failed)
+    if not search.ok:
+        stats["simplified_clauses"] = 1
+        return ([], [0, 0]), stats
+    if failed:
+        ilits, bounds = list(ilits), list(bounds)
+        for lit in failed:
+            ilits.append(lit ^ 1)
+            bounds.append(len(ilits))
+    stats["simplified_clauses"] = len(bounds) - 1
+    return (ilits, bounds), stats
@@ -0,0 +1,62 @@
+"""
+Checks the binary implication lists of the search, the merging of
+equivalent literals and failed literal probing.
+"""
+from search import Search, to_internal
+from implications import equivalent_literals, simplify
+from puzzle_formats import parse_nurikabe_block, parse_sudoku_line
+from sat_solver import CNFSolver
+
+def internal(clauses):
+    ilits, bounds = [], [0]
+    for clause in clauses:
+        ilits.extend(to_internal(clause).tolist())
+        bounds.append(len(ilits))
+    return ilits, bounds
+
+def models(num_vars, clauses):
+    search = Search(num_vars, None, None, internal_clauses=clauses)
+    return sorted(tuple(model) for model in search.enumerate_models(100))
+
+def test_equivalences():
+    # 1 <-> 2 <-> -3, and 4 is implied by 1 through a longer clause
+    clauses = internal([[-1, 2], [-2, 1], [2, 3], [-2, -3], [-1, -3, 4], [1, 3, 4]])
+    rep = equivalent_literals(4, *clauses)
+    assert rep[2] == 0 and rep[5] == 0 and rep[4] == 1 and rep[6] == 6
+    simplified, stats = simplify(4, *clauses)
+    assert stats["equivalent"] == 2
+    assert models(4, simplified) == models(4, clauses)
+    # the binary clauses go to the implication lists
+    search = Search(4, None, None, internal_clauses=clauses)
+    assert search.num_binary == 4 and search.originals.num_long == 2
+    # x <-> -x
+    assert equivalent_literals(1, *internal([[1, 1], [-1, -1]])) is None
+    contradiction, _ = simplify(2, *internal([[1, 2], [-1, 2], [1, -2], [-1, -2]]))
+    assert models(2, contradiction) == []
+
+def test_failed_literals():
+    # 1 implies both 2 and -2
+    clauses = internal([[-1, 2], [-1, -2, 3], [-1, -3], [2, 3, 4]])
+    simplified, stats = simplify(4, *clauses)
+    assert stats["failed"] == 1
+    search = Search(4, None, None, internal_clauses=simplified)
+    assert search.var_value(0) is False
+    assert models(4, simplified) == models(4, clauses)
+
+def test_simplified_solves():
+    for board, rule in (parse_nurikabe_block(["1...", "..3.", "....", "2..."]),
+                        parse_sudoku_line("1..." + "."*12)):
+        plain = CNFSolver(board, [rule])
+        found = sorted(str(plain.layout.to_board(sol, board).data) for sol in plain.solve(quiet=True))
+        assert found
+        simplified = CNFSolver(board, [rule])
+        again = sorted(str(simplified.layout.to_board(sol, board).data)
+                       for sol in simplified.solve(quiet=True, simplify=True))
+        assert simplified.compiled.simplification is not None
+        assert found == again
+
+if __name__ == "__main__":
+    test_equivalences()
+    test_failed_literals()
+    test_simplified_solves()
+    print("All implication tests passed")
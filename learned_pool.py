@@ -0,0 +1,92 @@
+# Learned clauses shared between solves of puzzles with the same rules.
+#
+# Puzzles of one shape (every 9x9 Sudoku, every Nurikabe with the same clue
+# layout) have the same clauses once the clauses of their instance specific
+# rules (the givens, see Rule.instance_specific) are left out, which
+# CNFSolver.structure_key sums up in a digest. A solve given a pool searches
+# that structural formula with the givens as assumptions instead of unit
+# clauses. Assumptions are decisions, so every clause it learns follows
+# from the structural clauses alone and holds for every puzzle of the
+# shape (until the first blocking clause, which only holds for this
+# puzzle). They are kept in the pool under the digest, up to a maximum
+# number per digest, and seed the next search of the same shape as learned
+# clauses, so a stream of similar puzzles gets faster as the pool fills up.
+#
+# A pool can be saved to a file (the container of formula_io, with its own
+# magic) and loaded by later runs.
+
+import numpy as np
+
+import formula_io
+from checkpoint import ragged_arrays, ragged_lists
+
+MAGIC = b"TLLP"
+
+
+class LearnedClausePool():
+    """
+    Learned clauses of internal literals, with their LBD, per formula structure.
+    """
+
+    def __init__(self, max_clauses=5000) -> None:
+        """
+        Args:
+            max_clauses: maximum number of clauses kept per structure; clauses
+                learned once it is full are dropped
+        """
+        self.max_clauses = max_clauses
+        self.clauses = {} # structure key -> list of (clause, lbd)
+        self.seen = {} # structure key -> set of sorted clauses, to skip repeats
+
+    def __len__(self) -> int:
+        return sum(len(clauses) for clauses in self.clauses.values())
+
+    def get(self, key) -> list[tuple[tuple[int, ...], int]]:
+        """
+        Returns the (clause, lbd) pairs of a structure.
+        """
+        return self.clauses.get(key, [])
+
+    def add(self, key, clauses) -> int:
+        """
+        Adds (clause, lbd) pairs learned on a formula of structure `key`.
+        Returns the number of clauses actually added.
+        """
+        pool = self.clauses.setdefault(key, [])
+        seen = self.seen.setdefault(key, set())
+        added = 0
+        for clause, lbd in clauses:
+            if len(pool) >= self.max_clauses:
+                break
+            canonical = tuple(sorted(clause))
+            if canonical in seen:
+                continue
+            seen.add(canonical)
+            pool.append((tuple(clause), lbd))
+            added += 1
+        return added
+
+    def save(self, path) -> None:
+        """
+        Writes the pool to `path`.
+        """
+        keys = sorted(self.clauses)
+        arrays = {}
+        for idx, key in enumerate(keys):
+            pool = self.clauses[key]
+            arrays[f"lits_{idx}"], arrays[f"starts_{idx}"] = ragged_arrays([clause for clause, _ in pool])
+            arrays[f"lbd_{idx}"] = np.array([lbd for _, lbd in pool], dtype=np.int64)
+        formula_io.write_formula(path, {"keys": keys, "max_clauses": self.max_clauses},
+                                 arrays, magic=MAGIC)
+
+    @classmethod
+    def load(cls, path) -> "LearnedClausePool":
+        """
+        Reads a pool written by `save`.
+        """
+        metadata, arrays = formula_io.read_formula(path, magic=MAGIC)
+        pool = cls(metadata["max_clauses"])
+        for idx, key in enumerate(metadata["keys"]):
+            clauses = ragged_lists(arrays[f"lits_{idx}"], arrays[f"starts_{idx}"])
+            pool.add(key, zip(clauses, arrays[f"lbd_{idx}"].tolist()))
+        return pool
@@ -0,0 +1,63 @@
+"""
+Checks that learned clauses are only shared between puzzles of the same
+structure, that they keep every solution of the puzzles they seed, and
+that a pool survives being saved and loaded.
+"""
+import os
+import tempfile
+
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+from exact_cover import make_solver
+from learned_pool import LearnedClausePool
+from nurikabe import Nurikabe
+
+def solved_boards(solver, board, max_sols, pool=None):
+    results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True, pool=pool) if sol is not None]
+    return sorted(str(solver.layout.to_board(sol, board).data) for sol in results)
+
+def sudoku_key(line):
+    board, rule = parse_sudoku_line(line)
+    return CNFSolver(board, [rule]).structure_key()
+
+def test_structure_keys():
+    keys = {sudoku_key(line) for line in ("1..." + "."*12, ".2.." + "."*12, "."*16)}
+    assert len(keys) == 1 and None not in keys
+    assert sudoku_key("."*81) not in keys
+    board, rule = parse_sudoku_line("."*81)
+    assert make_solver(board, [rule]).structure_key() is None # exact cover search
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    lazy = Nurikabe(board, rule.empty_state, rule.filled_state, lazy=True)
+    assert CNFSolver(board, [lazy]).structure_key() is None
+
+def test_seeded_solves():
+    pool = LearnedClausePool()
+    for line, max_sols in (("12.." + "."*12, 100), ("1..." + "."*12, 100), ("."*16, 1000)):
+        board, rule = parse_sudoku_line(line)
+        expected = solved_boards(CNFSolver(board, [rule]), board, max_sols)
+        board, rule = parse_sudoku_line(line)
+        assert solved_boards(CNFSolver(board, [rule]), board, max_sols, pool) == expected
+    assert len(expected) == 288
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    expected = solved_boards(CNFSolver(board, [rule]), board, 10)
+    for _ in range(2):
+        board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+        assert solved_boards(CNFSolver(board, [rule]), board, 10, pool) == expected
+    assert len(pool) > 0
+
+def test_save_and_load():
+    pool = LearnedClausePool(max_clauses=3)
+    pool.add("a", [((0, 3), 2), ((3, 0), 2), ((4,), 1), ((6, 8, 10), 3), ((12, 14), 2)])
+    pool.add("b", [])
+    assert pool.get("a") == [((0, 3), 2), ((4,), 1), ((6, 8, 10), 3)] and len(pool) == 3
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "learned.pool")
+        pool.save(path)
+        loaded = LearnedClausePool.load(path)
+    assert loaded.get("a") == pool.get("a") and loaded.get("b") == [] and loaded.max_clauses == 3
+
+if __name__ == "__main__":
+    test_structure_keys()
+    test_seeded_solves()
+    test_save_and_load()
+    print("All learned clause pool tests passed")
@@ -0,0 +1,264 @@
+# Stochastic local search (probSAT, or WalkSAT) over a ClauseStore.
+# Starting from a random full assignment, a clause that is not satisfied
+# is picked at random and one of the moves satisfying it is made, chosen
+# by how many satisfied clauses it would break. Break counts are kept up
+# to date on every flip: a clause with a single True literal is
+# "critical" for that literal's variable, and break[var] counts the
+# clauses critical for var.
+# A variable of an exclusive group is not flipped on its own: the cell
+# moves from one state of the group to another (or to none of them), so
+# the at most one constraint of the group always holds. The break of
+# such a move is taken as the sum of the breaks of its two flips.
+# Variables fixed by unit clauses (such as the givens of a puzzle) start
+# at their value and are never flipped.
+# Local search can find models quickly but never proves that there is
+# none, so it gives up after a number of flips.
+
+import random
+import time
+import numpy as np
+
+from search import to_internal
+
+
+class LocalSearch():
+    """
+    Local search state for one formula: the assignment, the number of True
+    literals of every clause and the break counts.
+    """
+
+    check_every = 256 # flips between two checks of the budget
+
+    def __init__(self, num_vars, lits, starts, numstates=1, exclusive_lookup=None,
+                 seed=None, method="walksat"):
+        """
+        Args:
+            num_vars: number of variables, numbered from 0
+            lits, starts: the clause arena and offsets of a ClauseStore
+            numstates: number of states per cell, used to find exclusive groups
+            exclusive_lookup: list indexed by state number, holding either None
+                or the list of state numbers exclusive with that state
+            seed: seed of the random number generator
+            method: "probsat" to pick moves with probability (eps + break)^-cb,
+                "walksat" to pick a random move with probability `noise` and
+                otherwise one with the least break
+        """
+        if method not in ("probsat", "walksat"):
+            raise ValueError(f"unknown local search method {method!r}")
+        self.num_vars = num_vars
+        self.method = method
+        # the parameters suit the long clauses of grid puzzles, and were tuned
+        # on empty Sudoku grids up to 25x25
+        self.cb, self.eps = 8.0, 1.0 # probSAT parameters
+        self.noise = 0.1 # WalkSAT parameter
+        self.rng = random.Random(seed)
+        codes = to_internal(lits)
+        starts = np.asarray(starts, dtype=np.int64)
+        self.num_clauses = len(starts)-1
+        self.codes = codes
+        self.owners = np.repeat(np.arange(self.num_clauses), np.diff(starts))
+        ilits = codes.tolist()
+        bounds = starts.tolist()
+        self.clause_lits = [ilits[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        order = np.argsort(codes, kind="stable")
+        indptr = np.zeros(2*num_vars+1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=2*num_vars), out=indptr[1:])
+        owners = self.owners[order].tolist()
+        indptr = indptr.tolist()
+        self.occurs = [owners[indptr[code]:indptr[code+1]] for code in range(2*num_vars)]
+        # group_of[var] is the index in self.groups of the variables var is
+        # exclusive with (itself included), or -1
+        self.groups = []
+        self.group_of = [-1]*num_vars
+        if exclusive_lookup is not None:
+            for state, group in enumerate(exclusive_lookup):
+                if group is None or state != group[0]:
+                    continue
+                for base in range(0, num_vars, numstates):
+                    members = [base+member for member in group]
+                    for var in members:
+                        self.group_of[var] = len(self.groups)
+                    self.groups.append(members)
+        self.units = [lits[0] for lits in self.clause_lits if len(lits) == 1]
+        self.fixed = [False]*num_vars
+        for lit in self.units:
+            self.fixed[lit >> 1] = True
+        self.values = [0]*num_vars
+        self.holder = [-1]*len(self.groups) # the True variable of each group, or -1
+        self.num_true = []
+        self.critical = []
+        self.breaks = []
+        self.unsat = []
+        self.unsat_pos = [-1]*self.num_clauses
+        self.flips = 0
+        self.tries = 0
+        self.best_unsat = self.num_clauses
+        self.budget = None
+        self.stop_reason = None # set when the flips or the budget run out
+        self.start_time = time.monotonic()
+
+    def randomize(self) -> None:
+        """
+        Starts over from a random assignment in which every exclusive group
+        has one True variable and the unit clauses hold, then recomputes the
+        clause counts and break counts.
+        """
+        rng = self.rng
+        values = [rng.random() < 0.5 for _ in range(self.num_vars)]
+        for idx, members in enumerate(self.groups):
+            chosen = rng.choice(members)
+            for var in members:
+                values[var] = var == chosen
+            self.holder[idx] = chosen
+        for lit in self.units:
+            var = lit >> 1
+            if self.group_of[var] >= 0 and not lit & 1:
+                for other in self.groups[self.group_of[var]]:
+                    values[other] = False
+                self.holder[self.group_of[var]] = var
+            elif self.group_of[var] >= 0 and self.holder[self.group_of[var]] == var:
+                self.holder[self.group_of[var]] = -1
+            values[var] = not lit & 1
+        self.values = [int(value) for value in values]
+        value_array = np.array(self.values, dtype=np.int64)
+        true_lits = value_array[self.codes >> 1] ^ (self.codes & 1) == 1
+        num_true = np.bincount(self.owners[true_lits], minlength=self.num_clauses)
+        critical = np.full(self.num_clauses, -1, dtype=np.int64)
+        single = true_lits & (num_true[self.owners] == 1)
+        critical[self.owners[single]] = self.codes[single] >> 1
+        self.num_true = num_true.tolist()
+        self.critical = critical.tolist()
+        self.breaks = np.bincount(critical[critical >= 0], minlength=self.num_vars).tolist()
+        self.unsat = np.flatnonzero(num_true == 0).tolist()
+        self.unsat_pos = [-1]*self.num_clauses
+        for pos, clause in enumerate(self.unsat):
+            self.unsat_pos[clause] = pos
+
+    def flip(self, var) -> None:
+        """
+        Flips a variable, updating the clause counts, the critical variables
+        and the break counts of every clause it occurs in.
+        """
+        num_true, critical, breaks = self.num_true, self.critical, self.breaks
+        unsat, unsat_pos = self.unsat, self.unsat_pos
+        value = self.values[var] ^ 1
+        self.values[var] = value
+        true_lit = 2*var + (value ^ 1)
+        for clause in self.occurs[true_lit]:
+            count = num_true[clause] + 1
+            num_true[clause] = count
+            if count == 1:
+                last = unsat.pop()
+                if last != clause:
+                    unsat[unsat_pos[clause]] = last
+                    unsat_pos[last] = unsat_pos[clause]
+                unsat_pos[clause] = -1
+                critical[clause] = var
+                breaks[var] += 1
+            elif count == 2:
+                breaks[critical[clause]] -= 1
+                critical[clause] = -1
+        values = self.values
+        for clause in self.occurs[true_lit ^ 1]:
+            count = num_true[clause] - 1
+            num_true[clause] = count
+            if count == 0:
+                unsat_pos[clause] = len(unsat)
+                unsat.append(clause)
+                breaks[var] -= 1
+                critical[clause] = -1
+            elif count == 1:
+                for lit in self.clause_lits[clause]:
+                    if values[lit >> 1] ^ (lit & 1):
+                        critical[clause] = lit >> 1
+                        breaks[lit >> 1] += 1
+                        break
+        group = self.group_of[var]
+        if group >= 0:
+            if value:
+                self.holder[group] = var
+            elif self.holder[group] == var:
+                self.holder[group] = -1
+        self.flips += 1
+
+    def moves(self, clause) -> list[tuple]:
+        """
+        Returns the moves that would satisfy an unsatisfied clause, each as
+        a tuple of the variables to flip. Moves flipping a fixed variable are
+        left out, unless there is no other move. Every move keeps at most one
+        variable of each exclusive group True.
+        """
+        breaks, group_of, fixed = self.breaks, self.group_of, self.fixed
+        by_lit = []
+        for lit in self.clause_lits[clause]:
+            var = lit >> 1
+            group = group_of[var]
+            if group < 0:
+                options = [(var,)]
+            elif not lit & 1:
+                # the cell takes this state instead of its current one
+                holder = self.holder[group]
+                options = [(var,) if holder < 0 else (holder, var)]
+            else:
+                # the cell leaves this state, for another state or none
+                options = [(var,)] + [(var, other) for other in self.groups[group] if other != var]
+            by_lit.append(options)
+        free = [[move for move in options if not any(fixed[flipped] for flipped in move)]
+                for options in by_lit]
+        if not any(free): # the clause contradicts the unit clauses
+            free = by_lit
+        return [min(options, key=lambda move: sum(breaks[flipped] for flipped in move))
+                for options in free if options]
+
+    def pick(self, moves) -> tuple:
+        """
+        Picks one of the moves satisfying a clause.
+        """
+        breaks, rng = self.breaks, self.rng
+        scores = [sum(breaks[var] for var in move) for move in moves]
+        if self.method == "probsat":
+            weights = [(self.eps + score) ** -self.cb for score in scores]
+            return rng.choices(moves, weights)[0]
+        best = min(scores)
+        if best > 0 and rng.random() < self.noise:
+            return rng.choice(moves)
+        return rng.choice([move for move, score in zip(moves, scores) if score == best])
+
+    def solve(self, max_flips=100000, max_tries=10) -> bool | None:
+        """
+        Searches for a model, starting over from a new random assignment every
+        `max_flips` flips, at most `max_tries` times. Returns True if a model
+        is found. Otherwise returns None, with `self.stop_reason` set to
+        "flips" or to the reason `self.budget` ran out.
+        """
+        self.stop_reason = None
+        for _ in range(max_tries):
+            self.tries += 1
+            self.randomize()
+            last_flip = self.flips + max_flips
+            step = 0
+            while self.unsat and self.flips < last_flip:
+                self.best_unsat = min(self.best_unsat, len(self.unsat))
+                if self.budget is not None and step % self.check_every == 0:
+                    self.stop_reason = self.budget.exhausted(self)
+                    if self.stop_reason is not None:
+                        return None
+                step += 1
+                clause = self.unsat[self.rng.randrange(len(self.unsat))]
+                for var in self.pick(self.moves(clause)):
+                    self.flip(var)
+            if not self.unsat:
+                self.best_unsat = 0
+                return True
+        self.stop_reason = "flips"
+        return None
+
+    def model(self) -> list[int]:
+        """
+        Returns the list of variables that are True in the current assignment.
+        """
+        return [var for var, value in enumerate(self.values) if value]
+
+    def statistics(self) -> dict:
+        return {"flips": self.flips, "tries": self.tries, "best_unsat": self.best_unsat,
+                "elapsed": time.monotonic() - self.start_time}
@@ -0,0 +1,74 @@
+"""
+Checks that local search finds valid fills of empty Sudoku grids, keeps the
+givens of a puzzle, and reports running out of flips as Unknown.
+"""
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block, format_sudoku
+from sat_solver import CNFSolver
+from search import Unknown
+from clause_store import ClauseStore
+from local_search import LocalSearch
+
+def is_valid_sudoku(line, size, box_height, box_width):
+    rows = [line[row*size:(row+1)*size] for row in range(size)]
+    cols = ["".join(row[col] for row in rows) for col in range(size)]
+    boxes = ["".join(rows[top+row][left+col] for row in range(box_height) for col in range(box_width))
+             for top in range(0, size, box_height) for left in range(0, size, box_width)]
+    return all(len(set(group)) == size and "." not in group for group in rows + cols + boxes)
+
+def test_empty_grids():
+    for size, box_height, box_width in [(4, 2, 2), (9, 3, 3), (16, 4, 4)]:
+        board, rule = parse_sudoku_line("."*size*size)
+        solver = CNFSolver(board, [rule])
+        solution = next(solver.solve_local(seed=1, quiet=True))
+        assert solution is not None and not isinstance(solution, Unknown)
+        line = format_sudoku(solver.generate_solved_board())
+        assert is_valid_sudoku(line, size, box_height, box_width)
+        assert solver.stats["flips"] > 0
+
+def test_givens_are_kept():
+    line = "1...............2...............3...............4..............."
+    board, rule = parse_sudoku_line(line[:64] + "."*17)
+    solver = CNFSolver(board, [rule])
+    next(solver.solve_local(seed=2, quiet=True))
+    solved = format_sudoku(solver.generate_solved_board())
+    assert is_valid_sudoku(solved, 9, 3, 3)
+    assert all(clue == "." or clue == value for clue, value in zip(line, solved))
+
+def test_probsat_and_nurikabe():
+    board, rule = parse_nurikabe_block(["2..", "...", "..2"])
+    solver = CNFSolver(board, [rule])
+    solution = next(solver.solve_local(seed=3, method="probsat", quiet=True))
+    assert not isinstance(solution, Unknown)
+    expected = CNFSolver(board, [rule])
+    list(expected.solve(max_sols=10, quiet=True))
+    assert solver.generate_solved_board().data in expected.generate_solved_grids().tolist()
+
+def test_out_of_flips():
+    # the givens make the puzzle unsolvable, which local search cannot tell
+    board, rule = parse_sudoku_line("11" + "."*79)
+    solver = CNFSolver(board, [rule])
+    results = list(solver.solve_local(max_flips=200, max_tries=2, quiet=True))
+    assert len(results) == 1 and isinstance(results[0], Unknown)
+    assert results[0].reason == "flips" and solver.stats["tries"] == 2
+
+def test_groups_stay_exclusive():
+    # two cells of three exclusive states; the first cell is fixed to state 0
+    # but a clause asks for state 1 or 2, so every move has to move a fixed
+    # variable, and must do so without giving the cell two states
+    store = ClauseStore()
+    for clause in ([1], [2, 3], [4, -6]):
+        store.add_clause(clause)
+    search = LocalSearch(6, store.lits, store.starts, 3, [[0, 1, 2]]*3, seed=0)
+    search.randomize()
+    assert sorted(search.moves(1)) == [(0, 1), (0, 2)]
+    assert search.solve(max_flips=200, max_tries=3) is None
+    for members in search.groups:
+        assert sum(search.values[var] for var in members) <= 1
+
+if __name__ == "__main__":
+    test_empty_grids()
+    test_givens_are_kept()
+    test_probsat_and_nurikabe()
+    test_out_of_flips()
+    test_groups_stay_exclusive()
+    print("All local search tests passed")
@@ -3,8 +3,25 @@
 from typing import List, Tuple, Dict
 from boards import Board, BoardData
 from rules import Rule, SuperRule
+from clause_store import to_literals
 from sat_solver import CNFSolver
 from pprint import pp
+import numpy as np
+
+# cell values used by the deduction engine; values >= 0 are island indices
+SHADED = -1
+UNKNOWN = -2
+UNSHADED = -3 # unshaded, but not yet known to belong to a particular island
+
+def fix_outside(rule, cells, state_names) -> None:
+    """
+    Adds unit clauses making the states False in every cell outside `cells`,
+    for rules built over some of the cells only.
+    """
+    outside = np.setdiff1d(np.arange(rule.board.num_cells), cells)
+    if len(outside):
+        vars = np.concatenate([rule.gen_state_ints(outside, state_name) for state_name in state_names])
+        rule.add_clauses_bulk(to_literals(vars, False)[:, None])
 
 class AtLeastOneOfStateInCell(Rule):
     """
@@ -16,9 +33,11 @@ class AtLeastOneOfStateInCell(Rule):
         super().__init__(board, states)
 
     def add_formulas(self) -> None:
-        for cell in self.board.get_all_cells():
-            cell_states = [self.gen_state_int(*cell, state_name) for state_name in self.states]
-            clause = {var: True for var in cell_states}
+        cells = np.arange(self.board.num_cells)
+        cell_states = np.stack([self.gen_state_ints(cells, state_name)
+                                for state_name in self.states], axis=1)
+        for vars in cell_states.tolist():
+            clause = {var: True for var in vars}
             self.add_clause(clause)
         return None
 
@@ -26,6 +45,7 @@ class InitialAuxiliaryConditions(Rule):
     """
     Simple rule relating a set of cells to a state.
     """
+    instance_specific = True
 
     def __init__(self, board: Board, coords: List[tuple[int, int]], literals: List[bool], state_name: str) -> None:
         """
@@ -58,12 +78,9 @@ class NoTwoByTwoSquare(Rule):
         super().__init__(board, states)
 
     def add_formulas(self):
-        coords = self.gen_squares()
         for state_name in self.states:
-            for square in coords:
-                clause = {self.gen_state_int(*pair, state_name): False
-                          for pair in square}
-                self.add_clause(clause)
+            squares = self.gen_state_ints(self.board.windows_2x2, state_name)
+            self.add_clauses_bulk(to_literals(squares, False))
         return None
 
     def gen_squares(self) -> List[Tuple[int, int]]:
@@ -72,13 +89,9 @@ class NoTwoByTwoSquare(Rule):
         contains four (row, col) coordinates for
         each possible square on the board.
         """
-        height, width = self.board.height, self.board.width
-        out = []
-        for row in range(height-1):
-            for col in range(width-1):
-                square = ((row, col), (row+1, col), (row, col+1), (row+1, col+1))
-                out.append(square)
-        return out
+        coords = self.board.cell_coords.tolist()
+        return [tuple(tuple(coords[cell]) for cell in square)
+                for square in self.board.windows_2x2.tolist()]
 
 class NoAdjacenciesBetweenStates(Rule):
     """
@@ -90,35 +103,34 @@ class NoAdjacenciesBetweenStates(Rule):
         super().__init__(board, states)
 
     def add_formulas(self) -> None:
-        all_edges = []
-        all_coords = self.board.get_all_cells()
-        for cell in all_coords:
-            for adj_cell in self.board.get_adjacencies(*cell):
-                new_edge = (cell, adj_cell)
-                all_edges.append(new_edge)
-        state_name_pairs= list(Rule.construct_subsets(self.states, 2))
-        for cell_pair in all_edges:
-            for state_pair in state_name_pairs:
-                clause = {self.gen_state_int(*cell, state): False
-                          for cell, state in zip(cell_pair, state_pair)}
-                self.add_clause(clause)
+        edges = self.board.edges
+        state_name_pairs = list(Rule.construct_subsets(self.states, 2))
+        if not state_name_pairs: # a single island has no neighbours to keep apart
+            return None
+        # shape (num_edges, num_state_pairs, 2), ordered edge by edge
+        pair_vars = np.stack([np.stack([self.gen_state_ints(edges[:, 0], state_1),
+                                        self.gen_state_ints(edges[:, 1], state_2)], axis=1)
+                              for state_1, state_2 in state_name_pairs], axis=1)
+        self.add_clauses_bulk(to_literals(pair_vars.reshape(-1, 2), False))
         return None
 
 class AtMostNInBoard(Rule):
     """
     Rule requiring that at most N cells on the board can have a certain
     state. Assumes that N is less than the total number of cells on the board.
+    If `cells` (cell ids) is given, only those cells are counted, and the
+    state must be kept out of the other cells by other rules.
     """
 
-    def __init__(self, board: Board, state_name: str, max_num: int) -> None:
+    def __init__(self, board: Board, state_name: str, max_num: int, cells=None) -> None:
         self.max_num = max_num
         self.target_state = state_name
+        self.cells = np.arange(board.num_cells) if cells is None else np.asarray(cells, dtype=np.int64)
         self.additional_states = self.create_sequential_states()
         super().__init__(board, [state_name] + self.additional_states)
 
     def add_formulas_binomial(self) -> None:
-        all_states = [self.gen_state_int(*coords, self.target_state)
-                      for coords in self.board.get_all_cells()]
+        all_states = self.gen_state_ints(self.cells, self.target_state).tolist()
         for var_set in Rule.construct_subsets(all_states, self.max_num+1):
             clause = {var: False for var in var_set}
             self.add_clause(clause)
@@ -138,42 +150,39 @@ class AtMostNInBoard(Rule):
         Encoding scheme based off of section 3.3 in Frisch and Giannoros 
         https://www2.it.uu.se/research/group/astra/ModRef10/papers/Alan%20M.%20Frisch%20and%20Paul%20A.%20Giannoros.%20SAT%20Encodings%20of%20the%20At-Most-k%20Constraint%20-%20ModRef%202010.pdf
         """
-        all_cells = self.board.get_all_cells()
-        all_states = [self.gen_state_int(*coords, self.target_state)
-                      for coords in all_cells]
-        # it doesn't matter what order the cells are in, as long as its consistent
-        first_cell = all_cells[0]
-        first_state = self.additional_states[0]
-        last_state = self.additional_states[-1]
+        # it doesn't matter what order the cells are in, as long as its consistent,
+        # so the cells are taken in cell id order
+        cells = self.cells
+        if not len(cells):
+            return None
+        # registers of the cells that are not counted are unused
+        fix_outside(self, cells, self.additional_states)
+        targets = self.gen_state_ints(cells, self.target_state).tolist()
+        # registers[j][i] is register j of cell i
+        registers = [self.gen_state_ints(cells, register).tolist()
+                     for register in self.additional_states]
         # first register must be true if the cell is true
-        for cell in all_cells:
-            clause = {self.gen_state_int(*cell, self.target_state): False,
-                      self.gen_state_int(*cell, first_state): True}
+        for target, first_reg in zip(targets, registers[0]):
+            clause = {target: False, first_reg: True}
             self.add_clause(clause)
         # only the first register in the first cell can be true
         for j in range(1, self.max_num):
-            clause = {self.gen_state_int(*first_cell, self.additional_states[j]): False}
+            clause = {registers[j][0]: False}
             self.add_clause(clause)
         # for all other cells, they must contain registers of previous cell
-        for i in range(1, len(all_cells)-1):
-            cur_cell = all_cells[i]
-            prev_cell = all_cells[i-1]
-            for reg_num, register in enumerate(self.additional_states):
-                clause = {self.gen_state_int(*prev_cell, register): False,
-                          self.gen_state_int(*cur_cell, register): True}
+        for i in range(1, len(cells)-1):
+            for reg_num, register in enumerate(registers):
+                clause = {register[i-1]: False, register[i]: True}
                 self.add_clause(clause)
                 # if the cell is filled, add to the register
                 if reg_num > 0:
-                    clause = {self.gen_state_int(*cur_cell, self.target_state): False,
-                              self.gen_state_int(*prev_cell, self.additional_states[reg_num-1]): False,
-                              self.gen_state_int(*cur_cell, register): True}
+                    clause = {targets[i]: False,
+                              registers[reg_num-1][i-1]: False,
+                              register[i]: True}
                     self.add_clause(clause)
         # no register can overflow, otherwise more than k would exist
-        for i in range(1, len(all_cells)):
-            cur_cell = all_cells[i]
-            prev_cell = all_cells[i-1]
-            clause = {self.gen_state_int(*cur_cell, self.target_state): False,
-                      self.gen_state_int(*prev_cell, last_state): False}
+        for i in range(1, len(cells)):
+            clause = {targets[i]: False, registers[-1][i-1]: False}
             self.add_clause(clause)
         return None
 
@@ -181,6 +190,56 @@ class AtMostNInBoard(Rule):
         # self.add_formulas_binomial()
         self.add_formulas_sequential()
 
+class LazyAtMostNInBoard(Rule):
+    """
+    Same constraint as `AtMostNInBoard`, but enforced during search by
+    counting the cells with the state, so it needs neither auxiliary
+    states nor clauses. Once N cells have the state, every other cell
+    is forced not to have it.
+    """
+
+    def __init__(self, board: Board, state_name: str, max_num: int, cells=None) -> None:
+        self.max_num = max_num
+        self.target_state = state_name
+        self.cells = np.arange(board.num_cells) if cells is None else np.asarray(cells, dtype=np.int64)
+        super().__init__(board, [state_name])
+
+    def propagator_vars(self) -> list[int]:
+        return self.gen_state_ints(self.cells, self.target_state).tolist()
+
+    def attach_search(self, search) -> None:
+        super().attach_search(search)
+        self.targets = self.propagator_vars()
+        self.true_vars = [] # target variables currently True, in trail order
+        self.reasons = {} # implied literal -> the True variables forcing it
+
+    def propagate(self, assignment_delta: list[int]) -> list[int]:
+        self.true_vars.extend(lit-1 for lit in assignment_delta if lit > 0)
+        if len(self.true_vars) < self.max_num:
+            return []
+        forcing = tuple(self.true_vars[:self.max_num])
+        if len(self.true_vars) > self.max_num:
+            # one too many: imply that the extra one is False, a conflict
+            literal = -(self.true_vars[self.max_num]+1)
+            self.reasons[literal] = forcing
+            return [literal]
+        # the count may have reached N before this delta, and a backjump since
+        # undone the False literals implied then, so imply them again
+        implied = []
+        for var in self.targets:
+            if self.value(var) is None:
+                self.reasons[-(var+1)] = forcing
+                implied.append(-(var+1))
+        return implied
+
+    def explain(self, literal: int) -> list[int]:
+        return [literal] + [-(var+1) for var in self.reasons[literal]]
+
+    def backtrack(self, undone: list[int]) -> None:
+        for lit in undone:
+            if lit > 0:
+                self.true_vars.pop()
+
 class LinkAuxiliaryWithMainState(Rule):
     """
     Rule that requires any cell with an auxiliary state to also have the
@@ -195,12 +254,14 @@ class LinkAuxiliaryWithMainState(Rule):
         super().__init__(board, states)
 
     def add_formulas(self) -> None:
-        for cell in self.board.get_all_cells():
-            main_num = self.gen_state_int(*cell, self.main_state)
+        cells = np.arange(self.board.num_cells)
+        main_nums = self.gen_state_ints(cells, self.main_state).tolist()
+        aux_nums = np.stack([self.gen_state_ints(cells, aux_state)
+                             for aux_state in self.auxiliary_states], axis=1).tolist()
+        for main_num, cell_aux_nums in zip(main_nums, aux_nums):
             alt_clause = {main_num: False}
-            for aux_state in self.auxiliary_states:
+            for aux_num in cell_aux_nums:
                 # auxiliary implies main
-                aux_num = self.gen_state_int(*cell, aux_state)
                 clause = {aux_num: False, main_num: True}
                 self.add_clause(clause)
                 alt_clause[aux_num] = True
@@ -219,18 +280,20 @@ class ConnectedDecreasingTree(Rule):
     Generally, use `ConnectedRegionOfSizeN` if you want a region of a certain size.
     """
 
-    def __init__(self, board, state_prefix, size=None):
+    def __init__(self, board, state_prefix, size=None, cells=None):
         """
         Args:
             board: game board
             state_prefix: a valid state in the board that the rule will
                 build auxiliary states off of
             size: the maximum size of the region (not enforced)
-            seed: optional, a (row, col) tuple that is known to have this state
+            cells: optional, the ids of the only cells the region can take;
+                the tree then only runs through them
         """
         if size is None:
             size = board.height * board.width 
         self.size = size
+        self.cells = np.arange(board.num_cells) if cells is None else np.asarray(cells, dtype=np.int64)
         self.state_prefix = state_prefix
         states = [self.auxiliary_name(dist) for dist in range(size)]
         super().__init__(board, states, add_exclusive=True)
@@ -238,16 +301,107 @@ class ConnectedDecreasingTree(Rule):
     def auxiliary_name(self, dist):
         return self.state_prefix + "_" + str(dist)
 
+    def neighbour_table(self) -> np.ndarray:
+        """
+        Returns the neighbours of every cell of `self.cells`, padded to 4
+        columns with -1 where a cell has fewer neighbours among `self.cells`.
+        """
+        indptr, indices = self.board.neighbours
+        degrees = np.diff(indptr)
+        slots = np.arange(4)
+        padded = np.full((self.board.num_cells, 4), -1)
+        padded[slots < degrees[:, None]] = indices
+        inside = np.zeros(self.board.num_cells+1, dtype=bool) # the last entry stands for -1
+        inside[self.cells] = True
+        return np.where(inside[padded], padded, -1)[self.cells]
+
     def add_formulas(self):
-        all_cells = self.board.get_all_cells()
+        cells = self.cells
+        padded = self.neighbour_table()
+        fix_outside(self, cells, self.states)
         # enforce strictly decreasing tree to seed
+        blocks = []
         for dist in range(1, self.size):
-            for central_cell in all_cells:
-                clause = {self.gen_state_int(*central_cell, self.auxiliary_name(dist)): False}
-                for adj_cell in self.board.get_adjacencies(*central_cell):
-                    clause[self.gen_state_int(*adj_cell, self.auxiliary_name(dist-1))] = True
-                self.add_clause(clause)
-            
+            central = to_literals(self.gen_state_ints(cells, self.auxiliary_name(dist)), False)
+            adjacent = to_literals(self.gen_state_ints(padded, self.auxiliary_name(dist-1)), True)
+            blocks.append(np.column_stack([central, np.where(padded >= 0, adjacent, 0)]))
+        if blocks:
+            self.add_clauses_bulk(np.concatenate(blocks))
+
+class LazyConnectedDecreasingTree(ConnectedDecreasingTree):
+    """
+    Same constraint as `ConnectedDecreasingTree`, but its clauses (a cell at
+    distance d needs a neighbour at distance d-1) are never stored. They
+    are checked during search around the cells whose distance states change.
+    """
+
+    def add_formulas(self):
+        fix_outside(self, self.cells, self.states)
+
+    def distance_vars(self) -> list[list[int]]:
+        """
+        Returns dist_vars, where dist_vars[dist][cell] is the variable of
+        the distance state of a cell.
+        """
+        cells = np.arange(self.board.num_cells)
+        return [self.gen_state_ints(cells, self.auxiliary_name(dist)).tolist()
+                for dist in range(self.size)]
+
+    def propagator_vars(self) -> list[int]:
+        cells = self.cells.tolist()
+        return [row[cell] for row in self.distance_vars() for cell in cells]
+
+    def attach_search(self, search) -> None:
+        super().attach_search(search)
+        cells = np.arange(self.board.num_cells)
+        self.dist_vars = self.distance_vars()
+        self.var_info = {var: (dist, cell) for dist, row in enumerate(self.dist_vars)
+                         for cell, var in enumerate(row)}
+        self.adjacent = [[] for _ in cells]
+        for cell, row in zip(self.cells.tolist(), self.neighbour_table().tolist()):
+            self.adjacent[cell] = [other for other in row if other >= 0]
+        self.reasons = {} # implied literal -> (cell, dist) of the clause implying it
+
+    def support_clause(self, cell: int, dist: int) -> list[int]:
+        """
+        The clause saying that `cell` at distance `dist` has a neighbour at `dist`-1.
+        """
+        below = self.dist_vars[dist-1]
+        return [-(self.dist_vars[dist][cell]+1)] + [below[other]+1 for other in self.adjacent[cell]]
+
+    def check(self, cell: int, dist: int, implied: list[int]) -> None:
+        free = None
+        clause = self.support_clause(cell, dist)
+        for lit in clause:
+            value = self.value(abs(lit)-1)
+            if value is None:
+                if free is not None:
+                    return # two unassigned literals, nothing implied yet
+                free = lit
+            elif value == (lit > 0):
+                return # satisfied
+        if free is None:
+            free = clause[0] # every literal is False: a conflict
+        self.reasons[free] = (cell, dist)
+        implied.append(free)
+
+    def propagate(self, assignment_delta: list[int]) -> list[int]:
+        implied = []
+        for lit in assignment_delta:
+            dist, cell = self.var_info[abs(lit)-1]
+            if lit > 0:
+                if dist > 0:
+                    self.check(cell, dist, implied)
+            elif dist+1 < self.size:
+                for other in self.adjacent[cell]:
+                    self.check(other, dist+1, implied)
+        return implied
+
+    def explain(self, literal: int) -> list[int]:
+        clause = self.support_clause(*self.reasons[literal])
+        clause.remove(literal)
+        return [literal] + clause
+
 class ConnectedRegion(SuperRule):
     """
     Rule requiring that a region must be connected.
@@ -257,14 +411,23 @@ class ConnectedRegion(SuperRule):
     but it won't actually enforce it. Use `ConnectedRegionOfSizeAtMostN` instead.
     `seed` is an optional argument that can be specified if at least one cell
     is known to have the `state_prefix` state.
+    If `lazy` is True, the tree and the single seed are enforced during search
+    by propagators instead of clauses.
+    If `cells` (cell ids) is given, the region can only take those cells.
     """
 
-    def __init__(self, board, state_prefix, size=None, seed=None):
-        tree_rule = ConnectedDecreasingTree(board, state_prefix, size)
+    def __init__(self, board, state_prefix, size=None, seed=None, lazy=False, cells=None):
+        if lazy:
+            tree_rule = LazyConnectedDecreasingTree(board, state_prefix, size, cells)
+        else:
+            tree_rule = ConnectedDecreasingTree(board, state_prefix, size, cells)
         zero_state_name = tree_rule.auxiliary_name(0)
         aux_states = tree_rule.states
         link_rule = LinkAuxiliaryWithMainState(board, state_prefix, aux_states)
-        one_seed_rule = AtMostNInBoard(board, zero_state_name, 1)
+        if lazy:
+            one_seed_rule = LazyAtMostNInBoard(board, zero_state_name, 1, cells)
+        else:
+            one_seed_rule = AtMostNInBoard(board, zero_state_name, 1, cells)
         rules = [tree_rule, one_seed_rule, link_rule]
         if seed is not None:
             seed_rule = InitialAuxiliaryConditions(board, [seed], [True], zero_state_name)
@@ -275,11 +438,27 @@ class ConnectedRegionOfSizeAtMostN(SuperRule):
     """
     Rule requiring that a region must be connected and that
     it has size at most `size`.
+    If `cells` (cell ids) is given, the region can only take those cells,
+    and the connectivity and size rules are only built over them. With
+    `settled`, the region is known to be exactly `cells`, already connected
+    and small enough, so the state is only kept out of the other cells.
     """
 
-    def __init__(self, board, state_prefix, size, seed=None):
-        connected_rule = ConnectedRegion(board, state_prefix, size, seed)
-        size_rule = AtMostNInBoard(board, state_prefix, size)
+    def __init__(self, board, state_prefix, size, seed=None, lazy=False, cells=None, settled=False):
+        self.cells = cells
+        self.settled = settled
+        if settled:
+            outside = np.setdiff1d(np.arange(board.num_cells), cells)
+            coords = [tuple(coords) for coords in board.cell_coords[outside].tolist()]
+            super().__init__([InitialAuxiliaryConditions(board, coords, [False]*len(coords), state_prefix)])
+            return
+        if cells is not None and len(cells):
+            size = min(size, len(cells))
+        connected_rule = ConnectedRegion(board, state_prefix, size, seed, lazy, cells)
+        if lazy:
+            size_rule = LazyAtMostNInBoard(board, state_prefix, size, cells)
+        else:
+            size_rule = AtMostNInBoard(board, state_prefix, size, cells)
         rules = [connected_rule, size_rule]
         super().__init__(rules)
 
@@ -289,10 +468,27 @@ class Nurikabe(SuperRule):
     The offical rules can be found here: https://puzz.link/rules.html?nurikabe
     """
 
-    def __init__(self, board: Board, empty_state: str, filled_state: str) -> None:
+    def __init__(self, board: Board, empty_state: str, filled_state: str, deduce: bool = True,
+                 lazy: bool = False) -> None:
+        """
+        Args:
+            board: the game board, with the clues in constraints["numbers"]
+            empty_state, filled_state: names of the unshaded and shaded states
+            deduce: if True and the board is a NurikabeBoard, cells that can be
+                found by the usual human deductions are pinned before search
+            lazy: if True, region connectivity and sizes are enforced by
+                propagators during search instead of by clauses
+        """
         self.board = board
+        self.lazy = lazy
         self.empty_state = empty_state
         self.filled_state = filled_state
+        self.deductions = None
+        if deduce and isinstance(board, NurikabeBoard):
+            try:
+                self.deductions = board.deduce(empty_state, filled_state)
+            except ValueError:
+                pass # contradictory givens; leave it to the solver to find no solution
         rules, self.states = self.generate_rules()
         super().__init__(rules, add_exclusive=True) # TODO: also add the exclusive states
 
@@ -307,12 +503,17 @@ class Nurikabe(SuperRule):
             state_prefix = self.empty_state + "r" + str(id) # name of the state
             seed_states.append(state_prefix)
             # each region takes a state name in seed_states, and must be size num
-            region_rule = ConnectedRegionOfSizeAtMostN(self.board, state_prefix, size=num, seed=coords)
+            region_rule = ConnectedRegionOfSizeAtMostN(self.board, state_prefix, size=num, seed=coords,
+                                                       lazy=self.lazy, **self.region_cells(id-1, num))
             out.append(region_rule)
             remaining_size -= num
             assert remaining_size >= 0
         # black squares are also connected 
-        shaded_rule = ConnectedRegionOfSizeAtMostN(self.board, self.filled_state, size=remaining_size, seed=self.find_unshaded_seed())
+        shaded_seed = self.find_unshaded_seed()
+        if shaded_seed is None and self.deductions is not None:
+            shaded_seed = self.find_deduced_seed()
+        shaded_rule = ConnectedRegionOfSizeAtMostN(self.board, self.filled_state, size=remaining_size, seed=shaded_seed,
+                                                  lazy=self.lazy, **self.region_cells(SHADED, remaining_size))
         square_rule = NoTwoByTwoSquare(self.board, [self.filled_state])
         # an empty square must take one of the region-specific states, and vice versa
         link_rule = LinkAuxiliaryWithMainState(self.board, self.empty_state, seed_states)
@@ -323,9 +524,70 @@ class Nurikabe(SuperRule):
         # each auxiliary unshaded region is exclusive
         exclusive_rule = Rule(self.board, seed_states, add_exclusive=True)
         out.extend([shaded_rule, square_rule, link_rule, shaded_or_unshaded_rule, unshaded_disjunct_rule, exclusive_rule])
+        if self.deductions is not None:
+            out.extend(self.deduction_rules(seed_states))
         vis_states = [self.empty_state, self.filled_state]
         return out, vis_states
 
+    def region_cells(self, value: int, size: int) -> dict:
+        """
+        Returns the `cells` and `settled` arguments of the rule of a region
+        (an island index, or SHADED for the shaded cells) of `size` cells:
+        the cells the deductions leave to it, and whether they already make
+        up the whole region. Empty without deductions.
+        """
+        if self.deductions is None:
+            return {}
+        known = self.deductions.ravel()
+        cells = np.flatnonzero(known == value)
+        if len(cells) == size and len(cells) and self.is_connected(cells):
+            return {"cells": cells, "settled": True}
+        open_cells = np.flatnonzero((known == UNKNOWN) | ((known == UNSHADED) & (value != SHADED)))
+        return {"cells": np.union1d(cells, open_cells)}
+
+    def is_connected(self, cells) -> bool:
+        """
+        Returns True if the cells (ids) form one orthogonally connected group.
+        """
+        indptr, indices = self.board.neighbours
+        inside = set(cells.tolist())
+        seen = {cells[0]}
+        queue = [cells[0]]
+        for cell in queue:
+            for other in indices[indptr[cell]:indptr[cell+1]].tolist():
+                if other in inside and other not in seen:
+                    seen.add(other)
+                    queue.append(other)
+        return len(seen) == len(inside)
+
+    def deduction_rules(self, seed_states: list[str]) -> list[Rule]:
+        """
+        Returns rules pinning every cell found by `NurikabeBoard.deduce`, so
+        that only the remaining unknown cells are left to the search.
+        """
+        coords = [tuple(cell) for cell in self.board.cell_coords.tolist()]
+        known = self.deductions.ravel().tolist()
+        pinned = [(self.filled_state, [cell for cell, value in enumerate(known) if value == SHADED]),
+                  (self.empty_state, [cell for cell, value in enumerate(known)
+                                      if value not in (SHADED, UNKNOWN)])]
+        for idx, state_prefix in enumerate(seed_states):
+            pinned.append((state_prefix, [cell for cell, value in enumerate(known) if value == idx]))
+        out = []
+        for state_name, cells in pinned:
+            if cells:
+                out.append(InitialAuxiliaryConditions(self.board, [coords[cell] for cell in cells],
+                                                      [True]*len(cells), state_name))
+        return out
+
+    def find_deduced_seed(self):
+        """
+        Finds the first cell deduced to be shaded, or None.
+        """
+        shaded = np.flatnonzero(self.deductions.ravel() == SHADED)
+        if len(shaded) == 0:
+            return None
+        return tuple(self.board.cell_coords[shaded[0]].tolist())
+
     def find_unshaded_seed(self):
         """
         Finds the first unshaded black square in the givens.
@@ -363,6 +625,197 @@ class NurikabeBoard(Board):
                     out[(row_idx, col_idx)] = cell
         return out
 
+    def deduce(self, empty_state: str, filled_state: str) -> np.ndarray:
+        """
+        Runs the standard human deductions until none of them applies any more:
+        complete islands are walled off, cells next to two islands are shaded,
+        cells no island can reach are shaded, islands with a single way out grow
+        through it, 2x2 pools are avoided and shaded regions with a single way
+        out escape through it.
+
+        Returns a (height, width) array holding for each cell SHADED, UNKNOWN,
+        UNSHADED, or the index of its island (clues numbered in the order of
+        constraints["numbers"]). Raises ValueError if the givens contradict.
+        """
+        return NurikabeDeduction(self, empty_state, filled_state).run()
+
+
+class NurikabeDeduction():
+    """
+    State of one run of `NurikabeBoard.deduce`. Cells are kept in a flat
+    list of values indexed by cell id; every pass is linear in the number
+    of cells, apart from the reachability search which is linear per clue.
+    """
+
+    def __init__(self, board: NurikabeBoard, empty_state: str, filled_state: str) -> None:
+        numbers = board.constraints["numbers"]
+        self.board = board
+        self.sizes = list(numbers.values())
+        self.num_shaded = board.num_cells - sum(self.sizes)
+        indptr, indices = board.neighbours
+        self.adjacent = [indices[indptr[cell]:indptr[cell+1]].tolist()
+                         for cell in range(board.num_cells)]
+        self.windows = board.windows_2x2.tolist()
+        self.values = [UNKNOWN]*board.num_cells
+        for cell, code in enumerate(board.grid.ravel().tolist()):
+            if code >= 0 and board.symbols[code] == filled_state:
+                self.values[cell] = SHADED
+            elif code >= 0 and board.symbols[code] == empty_state:
+                self.values[cell] = UNSHADED
+        for idx, cell in enumerate(board.coords_to_ids(list(numbers)).tolist()):
+            self.mark(cell, idx)
+        self.changed = False
+
+    def mark(self, cell: int, value: int) -> None:
+        """
+        Records that `cell` has `value`, raising ValueError on a contradiction.
+        """
+        old = self.values[cell]
+        if old == value or (value == UNSHADED and old >= 0):
+            return
+        if old != UNKNOWN and not (old == UNSHADED and value >= 0):
+            raise ValueError(f"contradiction at cell {cell}: {old} and {value}")
+        self.values[cell] = value
+        self.changed = True
+
+    def run(self) -> np.ndarray:
+        steps = [self.join_islands, self.wall_off_islands, self.separate_islands,
+                 self.shade_unreachable, self.grow_islands, self.avoid_pools,
+                 self.escape_shaded, self.count_shaded]
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            for step in steps:
+                step()
+        return np.array(self.values).reshape(self.board.height, self.board.width)
+
+    def islands(self) -> list[list[int]]:
+        out = [[] for _ in self.sizes]
+        for cell, value in enumerate(self.values):
+            if value >= 0:
+                out[value].append(cell)
+        return out
+
+    def touches_other_island(self, cell: int, idx: int) -> bool:
+        return any(self.values[other] >= 0 and self.values[other] != idx
+                   for other in self.adjacent[cell])
+
+    def join_islands(self) -> None:
+        # unshaded cells next to an island belong to it
+        for cell, value in enumerate(self.values):
+            if value < 0:
+                continue
+            for other in self.adjacent[cell]:
+                if self.values[other] == UNSHADED:
+                    self.mark(other, value)
+                elif self.values[other] >= 0 and self.values[other] != value:
+                    raise ValueError(f"islands {value} and {self.values[other]} touch")
+
+    def wall_off_islands(self) -> None:
+        # a complete island is surrounded by shaded cells
+        for idx, cells in enumerate(self.islands()):
+            if len(cells) > self.sizes[idx]:
+                raise ValueError(f"island {idx} is too big")
+            if len(cells) == self.sizes[idx]:
+                for cell in cells:
+                    for other in self.adjacent[cell]:
+                        if self.values[other] == UNKNOWN:
+                            self.mark(other, SHADED)
+
+    def separate_islands(self) -> None:
+        # a cell next to two different islands would join them
+        for cell, value in enumerate(self.values):
+            if value == UNKNOWN:
+                owners = {self.values[other] for other in self.adjacent[cell]
+                          if self.values[other] >= 0}
+                if len(owners) > 1:
+                    self.mark(cell, SHADED)
+
+    def reachable(self, idx: int, cells: list[int]) -> set[int]:
+        """
+        Returns the cells island `idx` could still grow into, by a breadth first
+        search from its cells limited by the number of cells it is missing.
+        """
+        budget = self.sizes[idx] - len(cells)
+        dist = dict.fromkeys(cells, 0)
+        queue = list(cells)
+        for cell in queue:
+            if dist[cell] == budget:
+                continue
+            for other in self.adjacent[cell]:
+                if (other not in dist and self.values[other] in (UNKNOWN, UNSHADED)
+                        and not self.touches_other_island(other, idx)):
+                    dist[other] = dist[cell] + 1
+                    queue.append(other)
+        return set(dist)
+
+    def shade_unreachable(self) -> None:
+        # unknown cells no island can reach are shaded, and an unshaded cell
+        # only one island can reach belongs to it
+        reach = [self.reachable(idx, cells) for idx, cells in enumerate(self.islands())]
+        for cell, value in enumerate(self.values):
+            if value not in (UNKNOWN, UNSHADED):
+                continue
+            owners = [idx for idx, cells in enumerate(reach) if cell in cells]
+            if not owners:
+                self.mark(cell, SHADED)
+            elif value == UNSHADED and len(owners) == 1:
+                self.mark(cell, owners[0])
+
+    def grow_islands(self) -> None:
+        # an incomplete island with a single way out has to take it
+        for idx, cells in enumerate(self.islands()):
+            if len(cells) >= self.sizes[idx]:
+                continue
+            exits = {other for cell in cells for other in self.adjacent[cell]
+                     if self.values[other] in (UNKNOWN, UNSHADED)
+                     and not self.touches_other_island(other, idx)}
+            if not exits:
+                raise ValueError(f"island {idx} cannot grow")
+            if len(exits) == 1:
+                self.mark(exits.pop(), idx)
+
+    def avoid_pools(self) -> None:
+        # a 2x2 window with three shaded cells needs its fourth cell unshaded
+        for window in self.windows:
+            values = [self.values[cell] for cell in window]
+            if values.count(SHADED) == 3 and UNKNOWN in values:
+                self.mark(window[values.index(UNKNOWN)], UNSHADED)
+
+    def escape_shaded(self) -> None:
+        # a shaded region that is not all of the shaded cells must leave
+        # through one of its unknown neighbours
+        seen = set()
+        escapes = []
+        for start, value in enumerate(self.values):
+            if value != SHADED or start in seen:
+                continue
+            region = [start]
+            seen.add(start)
+            exits = set()
+            for cell in region:
+                for other in self.adjacent[cell]:
+                    if self.values[other] == SHADED and other not in seen:
+                        seen.add(other)
+                        region.append(other)
+                    elif self.values[other] == UNKNOWN:
+                        exits.add(other)
+            if len(region) < self.num_shaded:
+                if not exits:
+                    raise ValueError("a shaded region is cut off")
+                if len(exits) == 1:
+                    escapes.append(exits.pop())
+        # marked afterwards, so every region is found from the same grid
+        for cell in escapes:
+            self.mark(cell, SHADED)
+
+    def count_shaded(self) -> None:
+        # once every shaded cell is known, the unknown cells are unshaded
+        if self.values.count(SHADED) == self.num_shaded:
+            for cell, value in enumerate(self.values):
+                if value == UNKNOWN:
+                    self.mark(cell, UNSHADED)
+
 if __name__ == "__main__":
     data_board = Board.gen_empty_board(4, 4)
     constraints_board = Board.gen_empty_board(4, 4)
@@ -5,7 +5,8 @@ Puzzles found at https://www.puzzle-nurikabe.com/.
 from nurikabe import Nurikabe
 from sat_solver import CNFSolver
 from boards import Board
-from nurikabe import NurikabeBoard
+from nurikabe import NurikabeBoard, SHADED, UNKNOWN
+import numpy as np
 import time
 import sys
 
@@ -21,6 +22,56 @@ def test_sudoku(test_boards):
         print(solved)
         print(f"Time to solve: {end_time-start_time} seconds")
 
+def test_deductions():
+    """
+    Checks that every cell found by deduction agrees with the solved board.
+    """
+    for board, puzzle in puzzle_boards():
+        deduced = board.deduce(puzzle.empty_state, puzzle.filled_state)
+        solved = CNFSolver(board, [puzzle])
+        next(solved.solve(max_sols=1, quiet=True))
+        solved_data = solved.generate_solved_board().data
+        for (row, col), value in np.ndenumerate(deduced):
+            if value != UNKNOWN:
+                assert (solved_data[row][col] == puzzle.filled_state) == (value == SHADED)
+        print(f"{(deduced == UNKNOWN).sum()} of {board.num_cells} cells left after deduction")
+
+def test_lazy_rules():
+    """
+    Checks that enforcing regions by propagators gives the same solutions,
+    all of them, on puzzles with one solution and on boards with several.
+    """
+    multiple = [[(2, 2, 4), (0, 1, 3)], [(0, 0, 1), (1, 2, 3), (3, 0, 2)], [(1, 1, 3), (2, 3, 2)], [(0, 2, 5)]]
+    boards = puzzle_boards() + [small_board(4, 4, clues) for clues in multiple]
+    for board, puzzle in boards:
+        for deduce in (True, False):
+            eager = CNFSolver(board, [Nurikabe(board, puzzle.empty_state, puzzle.filled_state, deduce=deduce)])
+            lazy = CNFSolver(board, [Nurikabe(board, puzzle.empty_state, puzzle.filled_state,
+                                              lazy=True, deduce=deduce)])
+            assert all_solutions(lazy) == all_solutions(eager)
+    # solution counts checked by enumerating every shading of the 4x4 boards
+    assert [len(all_solutions(CNFSolver(board, [puzzle]))) for board, puzzle in boards[2:]] == [10, 4, 5, 3]
+    print(f"lazy rules: {len(lazy.clauses)} clauses instead of {len(eager.clauses)}")
+
+def test_residual_rules():
+    """
+    Checks that the rules built over the cells left by deduction give the
+    same solutions with fewer clauses, and that a fully deduced board leaves
+    nothing to search.
+    """
+    for board, puzzle in puzzle_boards():
+        full = CNFSolver(board, [Nurikabe(board, puzzle.empty_state, puzzle.filled_state, deduce=False)])
+        residual = CNFSolver(board, [puzzle])
+        next(full.solve(max_sols=1, quiet=True))
+        next(residual.solve(max_sols=1, quiet=True))
+        assert residual.generate_solved_board().data == full.generate_solved_board().data
+        assert len(residual.clauses) < len(full.clauses)
+    board, puzzle = small_board(4, 4, [(0, 3, 2), (3, 0, 3), (3, 2, 2)])
+    assert all(region.settled for region in puzzle.rules[:4])
+    solver = CNFSolver(board, [puzzle])
+    assert len(list(solver.solve(max_sols=2, quiet=True))) == 1 and solver.stats["decisions"] == 0
+    print(f"residual rules: {len(residual.clauses)} clauses instead of {len(full.clauses)}")
+
 def add_constraints_to_board(numbers: list[list[int]], constraints: list[tuple[int, int, int]]) -> None:
     """
     Adds a list of numbers to the corresponding to coordinates.
@@ -28,6 +79,40 @@ def add_constraints_to_board(numbers: list[list[int]], constraints: list[tuple[i
     for row, col, val in constraints:
         numbers[row][col] = val
 
+def all_solutions(solver: CNFSolver, max_sols: int = 1000) -> list[str]:
+    """
+    Returns every solved board of a solver, sorted, as strings.
+    """
+    return sorted(str(solver.layout.to_board(sol, solver.board).data)
+                  for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None)
+
+def small_board(height: int, width: int, constraints: list[tuple[int, int, int]]) -> tuple[NurikabeBoard, Nurikabe]:
+    """
+    Returns an empty board with the given numbers and its Nurikabe rule.
+    """
+    numbers = Board.gen_empty_board(height, width)
+    add_constraints_to_board(numbers, constraints)
+    board = NurikabeBoard(Board.gen_empty_board(height, width), numbers, [".", "x"])
+    return board, Nurikabe(board, ".", "x")
+
+def puzzle_boards() -> list[tuple[NurikabeBoard, Nurikabe]]:
+    """
+    Builds the 7x7 puzzles below afresh, so tests do not share rule state.
+    """
+    # 7x7 easy, puzzle ID 9,027,278
+    data_easy_1 = Board.gen_empty_board(7, 7)
+    data_easy_1[2][5] = "x"
+    numbers_1 = Board.gen_empty_board(7, 7)
+    add_constraints_to_board(numbers_1, [(1, 5, 5), (2, 0, 1), (3, 1, 1), (3, 5, 3), (4, 6, 5), (5, 1, 1)])
+    easy_1_board = NurikabeBoard(data_easy_1, numbers_1, [".", "x"])
+    data_hard_2 = Board.gen_empty_board(7, 7)
+    data_hard_2[3][5] = "x"
+    numbers_2 = Board.gen_empty_board(7, 7)
+    add_constraints_to_board(numbers_2, [(0, 0, 1), (0, 6, 2), (1, 2, 2), (2, 5, 3), (4, 5, 7), (5, 2, 2), (6, 6, 3)])
+    hard_2_board = NurikabeBoard(data_hard_2, numbers_2, [".", "x"])
+    return [(easy_1_board, Nurikabe(easy_1_board, ".", "x")),
+            (hard_2_board, Nurikabe(hard_2_board, ".", "x"))]
+
 # 7x7 easy, puzzle ID 9,027,278
 data_easy_1 = Board.gen_empty_board(7, 7)
 data_easy_1[2][5] = "x"
@@ -51,3 +136,8 @@ hard_2_rule = Nurikabe(hard_2_board, empty_state, filled_state)
 test_boards = [(easy_1_board, easy_1_rule), (hard_2_board, hard_2_rule)]
 
 test_sudoku(test_boards)
+
+if __name__ == "__main__":
+    test_deductions()
+    test_lazy_rules()
+    test_residual_rules()
@@ -0,0 +1,221 @@
+# Streaming parsers and formatters for common plain-text puzzle formats.
+# Puzzles are read one at a time from a file or stdin, so arbitrarily
+# large collections can be processed with bounded memory.
+#
+# Sudoku: one puzzle per line, as n*n characters read row by row, with
+#   '.' or '0' for an empty cell (e.g. the common 81 character format).
+#   Anything after the first whitespace or comma is ignored.
+# Nurikabe: one puzzle per block of lines, blocks separated by blank lines.
+#   Each line is a row, each character a cell: '.' or '-' for unknown,
+#   'x' for a cell known to be shaded, and a digit for a clue.
+#   Rows containing whitespace are split into tokens instead, which
+#   allows clues bigger than 9.
+# In both formats, lines starting with '#' are comments.
+
+import math
+import mmap
+import sys
+from typing import Iterator, IO
+
+from boards import Board
+from sudoku import Sudoku
+from nurikabe import Nurikabe, NurikabeBoard
+
+SUDOKU_SYMBOLS = "123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SUDOKU_EMPTY = ".0"
+NURIKABE_UNKNOWN = ".-"
+NURIKABE_SHADED = "xX"
+EMPTY_STATE = "."
+FILLED_STATE = "x"
+
+
+class PuzzleFormatError(ValueError):
+    """
+    Raised when a puzzle in an input stream cannot be parsed.
+    """
+
+
+def iter_lines(source: str | IO[bytes] = "-", use_mmap: bool = False) -> Iterator[str]:
+    """
+    Yields the lines of `source` one at a time, without trailing newlines.
+    `source` is a path, "-" for stdin, or an open binary file. With `use_mmap`,
+    a file path is memory mapped instead of read through a buffer.
+    """
+    if not isinstance(source, str):
+        for line in source:
+            yield line.decode().rstrip("\r\n")
+        return
+    if source == "-":
+        yield from iter_lines(sys.stdin.buffer)
+        return
+    with open(source, "rb") as f:
+        if use_mmap:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty files cannot be mapped
+                return
+            with buffer:
+                yield from iter_lines(iter(buffer.readline, b""))
+        else:
+            yield from iter_lines(f)
+
+
+def is_comment(line: str) -> bool:
+    return line.startswith("#")
+
+
+def sudoku_box_shape(size: int) -> tuple[int, int]:
+    """
+    Returns the (height, width) of the boxes of a size x size Sudoku, picking
+    the most square factorization with the wider side horizontal.
+    """
+    for height in range(math.isqrt(size), 0, -1):
+        if size % height == 0:
+            return height, size // height
+    return 1, size
+
+
+def parse_sudoku_line(line: str) -> tuple[Board, Sudoku]:
+    """
+    Parses one puzzle in the line format into a Board and its Sudoku rule.
+    """
+    cells = line.replace(",", " ").split(maxsplit=1)[0]
+    size = math.isqrt(len(cells))
+    if size*size != len(cells) or size > len(SUDOKU_SYMBOLS):
+        raise PuzzleFormatError(f"a Sudoku line needs n*n cells, got {len(cells)}")
+    states = list(SUDOKU_SYMBOLS[:size])
+    data = Board.gen_empty_board(size, size)
+    for idx, char in enumerate(cells.upper()):
+        if char in SUDOKU_EMPTY:
+            continue
+        if char not in states:
+            raise PuzzleFormatError(f"unexpected character {char!r} in a {size}x{size} Sudoku")
+        data[idx // size][idx % size] = char
+    board = Board(data, states)
+    reg_height, reg_width = sudoku_box_shape(size)
+    return board, Sudoku(board, states, reg_height, reg_width)
+
+
+def iter_sudoku_records(lines: Iterator[str]) -> Iterator[str]:
+    """
+    Yields the puzzle lines of `lines`, skipping blank lines and comments.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not is_comment(line):
+            yield line
+
+
+def read_sudokus(lines: Iterator[str]) -> Iterator[tuple[Board, Sudoku]]:
+    """
+    Yields a (board, rule) pair for every puzzle line in `lines`.
+    """
+    for record in iter_sudoku_records(lines):
+        yield parse_sudoku_line(record)
+
+
+def format_sudoku(board: Board) -> str:
+    """
+    Returns a board in the Sudoku line format.
+    """
+    return "".join(cell if cell is not None else "." for row in board.data for cell in row)
+
+
+def parse_nurikabe_block(rows: list[str]) -> tuple[NurikabeBoard, Nurikabe]:
+    """
+    Parses the rows of one Nurikabe puzzle into a NurikabeBoard and its rule.
+    """
+    grid = [row.split() if any(char.isspace() for char in row.strip()) else list(row.strip())
+            for row in rows]
+    width = len(grid[0])
+    if any(len(row) != width for row in grid):
+        raise PuzzleFormatError("every row of a Nurikabe puzzle must have the same width")
+    data = Board.gen_empty_board(len(grid), width)
+    numbers = Board.gen_empty_board(len(grid), width)
+    for row_idx, row in enumerate(grid):
+        for col_idx, token in enumerate(row):
+            if token in NURIKABE_SHADED:
+                data[row_idx][col_idx] = FILLED_STATE
+            elif token.isdigit():
+                if int(token) < 1:
+                    raise PuzzleFormatError(f"a Nurikabe clue must be at least 1, got {token!r}")
+                numbers[row_idx][col_idx] = int(token)
+            elif token not in NURIKABE_UNKNOWN:
+                raise PuzzleFormatError(f"unexpected token {token!r} in a Nurikabe puzzle")
+    if sum(num for row in numbers for num in row if num is not None) >= len(grid)*width:
+        raise PuzzleFormatError("the clues of a Nurikabe puzzle must leave room for shaded cells")
+    board = NurikabeBoard(data, numbers, [EMPTY_STATE, FILLED_STATE])
+    return board, Nurikabe(board, EMPTY_STATE, FILLED_STATE)
+
+
+def iter_nurikabe_records(lines: Iterator[str]) -> Iterator[list[str]]:
+    """
+    Yields the rows of every blank-line separated puzzle in `lines`.
+    """
+    rows = []
+    for line in lines:
+        if is_comment(line.strip()):
+            continue
+        if line.strip():
+            rows.append(line)
+            continue
+        if rows:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def read_nurikabes(lines: Iterator[str]) -> Iterator[tuple[NurikabeBoard, Nurikabe]]:
+    """
+    Yields a (board, rule) pair for every blank-line separated puzzle in `lines`.
+    """
+    for record in iter_nurikabe_records(lines):
+        yield parse_nurikabe_block(record)
+
+
+def format_nurikabe(board: Board) -> str:
+    """
+    Returns a solved board in the Nurikabe block format, with clues kept in place.
+    """
+    numbers = board.constraints.get("numbers", {})
+    out = []
+    for row_idx, row in enumerate(board.data):
+        tokens = [str(numbers[(row_idx, col_idx)]) if (row_idx, col_idx) in numbers
+                  else (cell if cell is not None else "-")
+                  for col_idx, cell in enumerate(row)]
+        separator = " " if any(len(token) > 1 for token in tokens) else ""
+        out.append(separator.join(tokens))
+    return "\n".join(out)
+
+
+def parse_solution(puzzle_type: str, text: str, puzzle: Board) -> Board:
+    """
+    Parses a filled board of `puzzle` written in the format of FORMATTERS (a
+    Sudoku line, or Nurikabe rows where 'x' is shaded and '.' or a clue is
+    unshaded) into a Board that `verify.verify` can check.
+    """
+    if puzzle_type == "sudoku":
+        cells = text.replace(",", " ").split(maxsplit=1)[0].upper()
+        if len(cells) != puzzle.num_cells:
+            raise PuzzleFormatError(f"expected {puzzle.num_cells} cells, got {len(cells)}")
+        tokens = [None if char in SUDOKU_EMPTY else char for char in cells]
+    elif puzzle_type == "nurikabe":
+        rows = [row for row in text.strip("\n").split("\n") if row.strip()]
+        grid = [row.split() if any(char.isspace() for char in row.strip()) else list(row.strip())
+                for row in rows]
+        tokens = [FILLED_STATE if token in NURIKABE_SHADED else
+                  EMPTY_STATE if token == "." or token.isdigit() else None
+                  for row in grid for token in row]
+        if len(rows) != puzzle.height or len(tokens) != puzzle.num_cells:
+            raise PuzzleFormatError(f"expected a {puzzle.height}x{puzzle.width} Nurikabe board")
+    else:
+        raise PuzzleFormatError(f"unknown puzzle type {puzzle_type!r}")
+    data = [tokens[row*puzzle.width:(row+1)*puzzle.width] for row in range(puzzle.height)]
+    return Board(data, puzzle.visible_states, puzzle.constraints)
+
+
+READERS = {"sudoku": read_sudokus, "nurikabe": read_nurikabes}
+RECORDS = {"sudoku": iter_sudoku_records, "nurikabe": iter_nurikabe_records}
+PARSERS = {"sudoku": parse_sudoku_line, "nurikabe": parse_nurikabe_block}
+FORMATTERS = {"sudoku": format_sudoku, "nurikabe": format_nurikabe}
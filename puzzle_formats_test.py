@@ -0,0 +1,105 @@
+"""
+Checks the text puzzle formats and the batch command line entry point
+on a few small inputs.
+"""
+import io
+import tempfile
+from puzzle_formats import (read_sudokus, read_nurikabes, iter_lines,
+                            format_sudoku, format_nurikabe, PuzzleFormatError)
+from cli import solve_stream, write_result
+from rules import Rule, SuperRule
+import puzzle_formats
+
+sudoku_lines = ["# websudoku easy, then evil",
+                "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61",
+                "",
+                "8......5..1..4.6.87....3.......9..2..5.....4.1..7..9.5......2....64......8..6.1.9 evil"]
+
+nurikabe_lines = ["...2",
+                  "....",
+                  "....",
+                  "3.2.",
+                  "",
+                  "# 7x7 easy, puzzle ID 9,027,278",
+                  "-------",
+                  "-----5-",
+                  "1----x-",
+                  "-1---3-",
+                  "------5",
+                  "-1-----",
+                  "-------"]
+
+def test_parse_sudoku():
+    puzzles = list(read_sudokus(iter(sudoku_lines)))
+    assert len(puzzles) == 2
+    board, rule = puzzles[0]
+    assert board.data[0][:4] == ["9", "1", None, "7"]
+    assert format_sudoku(board) == sudoku_lines[1]
+
+def test_parse_nurikabe():
+    puzzles = list(read_nurikabes(iter(nurikabe_lines)))
+    assert len(puzzles) == 2
+    board, rule = puzzles[1]
+    assert board.constraints["numbers"][(1, 5)] == 5
+    assert board.data[2][5] == "x"
+    assert format_nurikabe(board).split("\n")[2] == "1----x-"
+
+def test_bad_puzzle_is_reported():
+    results = list(solve_stream("sudoku", iter(["123", sudoku_lines[1]])))
+    assert isinstance(results[0][4], PuzzleFormatError)
+    assert results[1][3] == 1
+
+def test_single_clue():
+    results = list(solve_stream("nurikabe", iter(["2.x", "..."]), max_sols=2))
+    out = io.StringIO()
+    write_result(out, "nurikabe", *results[0][:4], 2, results[0][4])
+    assert out.getvalue().strip() == "# puzzle 0: 1 solution(s)\n2.x\nxxx"
+
+def test_bad_rules_are_reported():
+    out = io.StringIO()
+    for result in solve_stream("nurikabe", iter(["0..", "...", "...", "", "2.x", "..."])):
+        write_result(out, "nurikabe", *result[:4], 1, result[4])
+    assert out.getvalue().startswith("# puzzle 0: error: a Nurikabe clue must be at least 1")
+    assert "# puzzle 1: 1 solution(s)" in out.getvalue()
+    # a rule failing while its clauses are built only loses its own puzzle
+    class Unbuildable(Rule):
+        def add_formulas(self):
+            raise ValueError("cannot build these clauses")
+    def parse_unbuildable(record):
+        board, rule = puzzle_formats.parse_sudoku_line(record)
+        return board, SuperRule([rule, Unbuildable(board, [])])
+    parse_sudoku = puzzle_formats.PARSERS["sudoku"]
+    puzzle_formats.PARSERS["sudoku"] = parse_unbuildable
+    try:
+        results = list(solve_stream("sudoku", iter([sudoku_lines[1]]*2)))
+    finally:
+        puzzle_formats.PARSERS["sudoku"] = parse_sudoku
+    assert [str(result[4]) for result in results] == ["cannot build these clauses"]*2
+
+def test_stream_from_file():
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as f:
+        f.write("\n".join(nurikabe_lines) + "\n")
+        f.flush()
+        for use_mmap in (False, True):
+            out = io.StringIO()
+            for result in solve_stream("nurikabe", iter_lines(f.name, use_mmap), max_sols=2):
+                write_result(out, "nurikabe", *result[:4], 2, result[4])
+            blocks = out.getvalue().strip().split("\n\n")
+            assert blocks[0] == "# puzzle 0: 1 solution(s)\nxx.2\n.xxx\n.x.x\n3x2x"
+            assert blocks[1].startswith("# puzzle 1: 1 solution(s)")
+
+def test_timeout_is_reported():
+    out = io.StringIO()
+    for result in solve_stream("sudoku", iter(["." * 256]), max_sols=10**6, timeout=0.2):
+        write_result(out, "sudoku", *result[:4], 10**6, result[4])
+    assert out.getvalue().endswith("?\n")
+
+if __name__ == "__main__":
+    test_parse_sudoku()
+    test_parse_nurikabe()
+    test_bad_puzzle_is_reported()
+    test_single_clue()
+    test_bad_rules_are_reported()
+    test_stream_from_file()
+    test_timeout_is_reported()
+    print("All format tests passed")
@@ -2,8 +2,12 @@
 # rules in different puzzle types.
 import math
 from typing import Iterable, Any
+from clause_store import to_literal
 
 class Rule():
+    # True for rules that only pin down the instance (such as the givens of a
+    # puzzle), as opposed to the rules of the puzzle type; see CNFSolver.structure_key
+    instance_specific = False
 
     def __init__(self, board, states=None, add_exclusive=False):
         self.board = board # board with various attributes depending on puzzle
@@ -21,7 +25,9 @@ class Rule():
         """
         self.cnf = cnf_obj
         self.linked_to_cnf = True
-        self.formula_contribution = {}
+        self.clause_range = range(0)
+        self.duplicate_clauses = 0 # clauses dropped because an identical one was stored
+        self.tautologies = 0
 
     def add_states_to_overall(self):
         """
@@ -49,29 +55,93 @@ class Rule():
     def gen_state_int(self, row_idx, col_idx, state_name=None, state_num=None):
         return self.cnf.gen_state_int(row_idx, col_idx, state_name, state_num)
 
+    def gen_state_ints(self, cell_ids, state_name=None, state_num=None):
+        return self.cnf.gen_state_ints(cell_ids, state_name, state_num)
+
     def add_clause(self, clause):
         """
-        Adds a clause to the formula and varmap dictionaries.
-        Assumes there are no self conflicts (i.e. each clause contains
-        each variable exactly once).
+        Adds a clause to the solver's clause store. The store drops the
+        clause if it is a tautology or an identical clause is already stored.
         
         Args:
             clause: a dictionary where each item is a variable
             to be solved for and each value is a boolean.
         """
-        formula = self.cnf.formula
-        var_map = self.cnf.var_map
-        idx = len(formula)
-        formula[idx] = clause
-        self.formula_contribution[idx] = clause # for printing / debugging
-        for var, literal in clause.items():
-            temp = var_map.setdefault(var, {})
-            temp.setdefault(literal, set()).add(idx)
+        self.cnf.clauses.add_clause([to_literal(var, literal) for var, literal in clause.items()])
+        return None
+
+    def add_clauses_bulk(self, block):
+        """
+        Adds many clauses to the solver's clause store at once.
+
+        Args:
+            block: a 2-D integer array with one clause per row. Each entry is
+            var+1 for a True literal or -(var+1) for a False one, and rows
+            shorter than the array are padded with 0.
+        """
+        self.cnf.clauses.add_clauses_bulk(block)
         return None
 
+    @property
+    def formula_contribution(self):
+        """
+        The clauses added by this rule, as {clause_id: {var: literal}} (for printing / debugging).
+        """
+        store = self.cnf.clauses
+        return {idx: store.clause_dict(idx) for idx in self.clause_range}
+
     def add_formulas(self):
         pass
 
+    # Propagator interface. A rule whose `propagator_vars` returns a list of
+    # variables takes part in the search directly instead of (or as well as)
+    # through clauses: it is told about assignments to those variables and
+    # answers with the literals they imply, explained by a clause on demand.
+    # Literals are signed, var+1 for True and -(var+1) for False.
+
+    def propagator_vars(self):
+        """
+        Returns the variables this rule wants to hear about in `propagate`,
+        or None if the rule is fully expressed by its clauses.
+        """
+        return None
+
+    def attach_search(self, search):
+        """
+        Called when a search starts using this rule as a propagator. Rules
+        keeping state between calls to `propagate` should reset it here.
+        """
+        self.search = search
+
+    def value(self, var):
+        """
+        Returns the current value of a variable in the search, or None if unassigned.
+        """
+        return self.search.var_value(var)
+
+    def propagate(self, assignment_delta):
+        """
+        Called with the literals assigned since the last call, in trail order.
+        Returns the literals they imply; returning a literal that is already
+        False reports a conflict.
+        """
+        return []
+
+    def explain(self, literal):
+        """
+        Returns the reason for a literal returned by `propagate`: a clause
+        (list of signed literals) starting with `literal`, whose other
+        literals were all False when it was implied.
+        """
+        raise NotImplementedError
+
+    def backtrack(self, undone):
+        """
+        Called with the literals, most recent first, that were passed to
+        `propagate` and have since been unassigned.
+        """
+        pass
+
     def __repr__(self):
         return f"{self.__class__.__name__} over states {self.states} with rules:\n{self.formula_contribution}"
 
@@ -4,14 +4,44 @@
 # we know these are grid based logic puzzles.
 
 from rules import Rule
+from solutions import SolutionLayout, PackedSolution
+from clause_store import ClauseStore
+from search import Search, Budget, CancellationToken, Unknown, to_internal
+from local_search import LocalSearch
+from compiled import CompiledFormula
+from checkpoint import Checkpointer
+from boards import Board
+import formula_io
+import hashlib
+import json
+import multiprocessing
 import sys
 import copy
 import pprint
+import numpy as np
+
+_building = None # the solver whose rules forked workers are building
+
+
+def build_rule_clauses(rule_ids):
+    """
+    Runs in a worker process forked by CNFSolver.add_rule_formulas. Builds
+    the clauses of some rules of the solver being built, each rule into a
+    ClauseStore of its own. Returns (rule id, literals, offsets, duplicates,
+    tautologies) for every rule.
+    """
+    solver = _building
+    out = []
+    for idx in rule_ids:
+        solver.clauses = store = ClauseStore()
+        solver.rules[idx].add_formulas()
+        out.append((idx, store.lits.copy(), store.starts.copy(), store.duplicates, store.tautologies))
+    return out
 
 
 class CNFSolver():
 
-    def __init__(self, board, rules=[]):
+    def __init__(self, board, rules=[], workers=None):
         """
         Initiates the solver by linking all rules to this solver, combining the
         states into a centralized representation, and populating the CNF formulas
@@ -21,10 +51,12 @@ class CNFSolver():
             board: board object to solve
             rules: list of Rule or SuperRule objects (or objects that inherit from Rule) that
                 the solution must satisfy
+            workers: if more than 1, the clauses of the rules are built by that
+                many worker processes (see `add_rule_formulas`)
         """
+        self.workers = workers
         self.rules = self.flatten_rules(rules) # list of rule objects
-        self.formula = {} # dictionary of clause dictionaries
-        self.var_map = {} # dictionary of variable dictionaries of clause_id sets for T/F
+        self.clauses = ClauseStore() # arena of every clause, as signed literals
         self.board = board
         self.height, self.width = board.height, board.width
         self.states = [] # strings, indices correspond to internal int representation
@@ -36,12 +68,90 @@ class CNFSolver():
         for rule in self.rules: # only atomic Rules do this, not SuperRules
             rule.add_states_to_overall()
         self.numstates = len(self.states)
-        for rule in self.rules:
-            rule.add_formulas()
+        self.num_vars = self.height*self.width*self.numstates
+        self.add_rule_formulas()
         for rule in rules:
             rule.add_exclusive_states()
         self.exclusive_states_lookup = self.parse_exclusive_states()
         self.solution = None # unsolved for now
+        self.solutions = [] # PackedSolution objects from the last solve
+        self.layout = None
+        self.stats = {} # search statistics from the last solve
+        self.compiled = None # CompiledFormula, built on first use
+
+    def add_rule_formulas(self):
+        """
+        Adds the clauses of every rule to `self.clauses`, recording on each
+        rule the range of clause ids it added and the clauses the store dropped.
+        """
+        if self.workers is not None and self.workers > 1 and len(self.rules) > 1 \
+                and "fork" in multiprocessing.get_all_start_methods():
+            self.add_rule_formulas_parallel()
+            return
+        for rule in self.rules:
+            first_id = len(self.clauses)
+            duplicates, tautologies = self.clauses.duplicates, self.clauses.tautologies
+            rule.add_formulas()
+            rule.clause_range = range(first_id, len(self.clauses))
+            rule.duplicate_clauses = self.clauses.duplicates - duplicates
+            rule.tautologies = self.clauses.tautologies - tautologies
+
+    def add_rule_formulas_parallel(self):
+        """
+        Same as `add_rule_formulas`, with the rules built by `self.workers`
+        forked worker processes. Variables only depend on the cell and the
+        state, so every worker numbers them as the solver would; each rule
+        comes back as its own arena of clauses, and the arenas are appended
+        to `self.clauses` in rule order, with their offsets shifted (see
+        ClauseStore.merge_arenas). The store drops the clauses repeating an
+        earlier rule's, so the formula is the one a sequential build gives.
+        """
+        global _building
+        num_chunks = min(len(self.rules), 4*self.workers)
+        chunks = [list(range(start, len(self.rules), num_chunks)) for start in range(num_chunks)]
+        store = self.clauses
+        _building = self # inherited by the forked workers
+        try:
+            context = multiprocessing.get_context("fork")
+            with context.Pool(self.workers) as pool:
+                built = [entry for chunk in pool.map(build_rule_clauses, chunks) for entry in chunk]
+        finally:
+            _building = None
+            self.clauses = store
+        built.sort(key=lambda entry: entry[0])
+        merged = self.clauses.merge_arenas([(lits, starts) for _, lits, starts, _, _ in built])
+        for (idx, _, _, duplicates, tautologies), (clause_range, dropped) in zip(built, merged):
+            rule = self.rules[idx]
+            rule.clause_range = clause_range
+            rule.duplicate_clauses = duplicates + dropped
+            rule.tautologies = tautologies
+        self.clauses.tautologies += sum(entry[4] for entry in built)
+        self.clauses.duplicates += sum(entry[3] for entry in built)
+
+    @property
+    def formula(self):
+        """
+        The formula as an enumerated dictionary of clauses, each clause
+        its own dictionary with {var: literal} pairs. Built from
+        `self.clauses` on every access, so only meant for debugging.
+        """
+        return {idx: self.clauses.clause_dict(idx) for idx in range(len(self.clauses))}
+
+    @property
+    def var_map(self):
+        """
+        A dictionary with {var: dict} pairs, where each inner dictionary maps a
+        literal to the set of clause ids the variable appears in with it.
+        Built from the occurrence index on every access, so only meant for debugging.
+        """
+        indptr, clause_ids = self.clauses.occurrences()
+        out = {}
+        for code in range(len(indptr)-1):
+            if indptr[code] == indptr[code+1]:
+                continue
+            ids = set(clause_ids[indptr[code]:indptr[code+1]].tolist())
+            out.setdefault(code >> 1, {})[not code & 1] = ids
+        return out
 
     def parse_exclusive_states(self):
         """
@@ -98,244 +208,393 @@ class CNFSolver():
         assert row_idx >= 0 and col_idx >= 0
         return (self.width*row_idx + col_idx)*self.numstates+state_num
 
-    def find_exclusive_states(self, entry, already_subbed):
-        """
-        Given a variable that we set to True, checks if the state it represents is part of
-        `self.exclusive_states`. If so, returns a set of all the
-        vars that should be set to False. If not, returns a set containing itself.
-        """
-        var, literal = entry
-        if not literal:
-            return set((entry,)) if var not in already_subbed else set()
-        row_idx, col_idx, state = self.get_idx_and_state(var)
-        ex_states = self.exclusive_states_lookup.get(state, None)
-        if ex_states is None:
-            return set((entry,)) if var not in already_subbed else set()
-        out_set = set()
-        for sub_state in ex_states:
-            new_var = self.gen_state_int(row_idx, col_idx, state_num=sub_state)
-            if new_var in already_subbed:
-                continue
-            new_literal = literal if new_var == var else not literal
-            out_set.add((new_var, new_literal))
-        return out_set
-        
-
-    def solve(self, verbose=False, max_sols=100):
-        """
-        Solves the system. Returns a dictionary of {var: literal} if
-        the CNF system is solvable, and None if not.
-
-        Makes heavy use of self.formula and self.varmap. Their formats are as 
-        follows:
-            self.formula: an enumerated dictionary of clauses. Each clause is
-                its own dictionary with {var: literal} pairs. 
-            self.var_map: a dictionary with {var: dict} pairs. Each inner dictionary
-                has two keys, one for True and one for False. Each value in
-                the inner dictionary is a set containing the enumerated numbers
-                of all the clauses var appears in associated with the literal.
-
-        As an example, if we wanted to represent (a OR NOT b) AND (a OR b OR NOT c),
-            self.formula would be
-            {0: {a: True, b: False}, 1: {a: True, b: True, c: False}}
-            and self.var_map would be
-            {a: {True: {0, 1}, False: set()}, 
-             b: {True: {1}, False: {0}}, 
-             c: {True: set(), False: {1}}}.
-        Notably, self.var_map doesn't necessarily have to contain both True/False keys.
-        """
-        print("Beginning new test")
-        formula_dict, var_map = self.formula, self.var_map
-        overall_solutions = [] # only modified if we know it works
-        already_subbed = {} # modified as we go, set of vars that already substituted
-        changed_visible = {}
-        # first pass base cases
-        if len(formula_dict) == 0:
-            yield overall_out
-            return
-        for clause in formula_dict.values():
-            if len(clause) == 0:
-                yield None
-                return
-
-        def modify_formula_dict(inp_formula, inp_map, inp_entries):
-            """
-            Mutates the formula to reflect changes made upon substitution for the 
-            first yield. First yield is True if instantly solvable, False if not,
-            and None if neither. Second yield is to undo these changes 
-            (for instance, if a certain case is unsolvable).
-            """
-            add_back_clauses = {}
-            add_back_entries = {}
-            add_back_inp_map = {}
-            seen_subvars = {}
-            flag = None
-            # preprocessing with checking for exclusive states
-            sub_entries = set()
-            for entry in inp_entries:
-                sub_entries.update(self.find_exclusive_states(entry, already_subbed))
-            if verbose:
-                print(f"{inp_entries=}")
-            if not sub_entries:
-                raise Exception
-            if verbose: print(f"{sub_entries=}")
-            for sub_var, sub_literal in sub_entries:
-                if sub_var in already_subbed: 
-                    continue
-                # if sub_var in self.board.visible_states:
-                if flag is False or sub_var in seen_subvars:
-                    flag = False
-                    break # second condition only possible if somehow we forced a variable to be true and false
-                seen_subvars[sub_var] = sub_literal
-                if inp_map.get(sub_var, None) is None:
-                    continue
-                for clause_id in inp_map[sub_var].get(sub_literal, set()):
-                    target_clause = inp_formula.get(clause_id, None)
-                    if target_clause is None:
-                        continue
-                    add_back_clauses[clause_id] = target_clause
-                    del inp_formula[clause_id]  # still exists in add_back_clauses
-                for clause_id in inp_map[sub_var].get(not sub_literal, set()):
-                    target_clause = inp_formula.get(clause_id, None)
-                    if target_clause is None:
-                        continue
-                    add_back_entries.setdefault(clause_id, []).append(
-                        (sub_var, not sub_literal)
-                    )
-                    del inp_formula[clause_id][sub_var]
-                    if not inp_formula[clause_id]:
-                        if verbose: print(f"Contradiction found at clause #{clause_id}")
-                        flag = False  # impossible, short circuit asap
-                        break
-                add_back_inp_map[sub_var] = inp_map[sub_var]
-                del inp_map[sub_var]
-            seen_subvars[sub_var] = sub_literal
-            already_subbed.update(seen_subvars)
-            if not inp_formula and flag is not False:
-                flag = True
-            yield flag
-            # assert num_entries_deleted == sum(len(clause_entries) for clause_entries in add_back_entries.values())
-            # second half of the function, now replaces everything
-            for sub_var in seen_subvars:
-                del already_subbed[sub_var]
-            for var, var_map in add_back_inp_map.items():
-                inp_map[var] = var_map
-            for clause_id, clause in add_back_clauses.items():
-                inp_formula[clause_id] = clause
-            for clause_id, entries in add_back_entries.items():
-                for entry in entries:
-                    inp_formula.setdefault(clause_id, {})[entry[0]] = entry[1]
-            yield
-
-        def satisfying_helper_dict(calls_made=0, state="guess", forcing=False):
-            """
-            Recursive helper function for the dictionary representation.
-            """
+    def gen_state_ints(self, cell_ids, state_name=None, state_num=None):
+        """
+        Vectorized version of `gen_state_int`. Returns an array with the same
+        shape as `cell_ids` holding the variable of each cell being in a state.
+        """
+        if state_num is None:
+            state_num = self.state_map[state_name]
+        assert state_num >= 0
+        return np.asarray(cell_ids)*self.numstates + state_num
+
+    def exclusive_lookup_list(self):
+        """
+        Returns `self.exclusive_states_lookup` as a list indexed by state number,
+        with None for states that are not part of an exclusive group.
+        """
+        return [self.exclusive_states_lookup.get(state, None) for state in range(self.numstates)]
+
+    def propagators(self):
+        """
+        Returns the rules that take part in the search as propagators.
+        """
+        return [rule for rule in self.rules if rule.propagator_vars() is not None]
+
+    def clause_stats(self):
+        """
+        Returns, for every rule, the number of clauses it added and the number
+        of duplicate and tautological clauses it produced that were dropped.
+        """
+        return [{"rule": rule.__class__.__name__, "states": rule.states,
+                 "clauses": len(rule.clause_range), "duplicates": rule.duplicate_clauses,
+                 "tautologies": rule.tautologies}
+                for rule in self.rules]
+
+    def compile(self, simplify=False):
+        """
+        Returns the `CompiledFormula` of this solver: its read-only formula,
+        which many searches can share, for instance from several threads.
+        With `simplify`, the formula is simplified once before any search
+        (see implications.py). Raises ValueError if some rules are enforced
+        by propagators.
+        """
+        if self.compiled is None or (simplify and self.compiled.simplification is None):
+            self.compiled = CompiledFormula(self, simplify)
+        return self.compiled
+
+    def instance_clauses(self) -> np.ndarray:
+        """
+        Returns a boolean array marking the clauses added by instance specific
+        rules (see Rule.instance_specific).
+        """
+        mask = np.zeros(len(self.clauses), dtype=bool)
+        for rule in self.rules:
+            if rule.instance_specific:
+                mask[rule.clause_range.start:rule.clause_range.stop] = True
+        return mask
+
+    def structure_key(self) -> str | None:
+        """
+        Returns a digest of the formula without the clauses of instance specific
+        rules: of its shape, exclusive groups and other clauses. Two formulas
+        with the same key only differ by their instance clauses, so clauses
+        learned from the rest of one formula hold for the other (see
+        learned_pool.py). Returns None for formulas that cannot be split that
+        way: with propagators, or with instance clauses that are not units.
+        """
+        if self.propagators():
+            return None
+        mask = self.instance_clauses()
+        lengths = self.clauses.clause_lengths()
+        if (lengths[mask] != 1).any():
+            return None
+        digest = hashlib.sha256(json.dumps([self.height, self.width, self.numstates,
+                                            self.exclusive_states]).encode())
+        digest.update(lengths[~mask].astype(np.int64).tobytes())
+        digest.update(self.clauses.lits[np.repeat(~mask, lengths)].astype(np.int32).tobytes())
+        return digest.hexdigest()
+
+    def make_structural_search(self):
+        """
+        Returns a fresh `Search` over the formula without its instance clauses,
+        and the internal literals of the instance units, to be passed to the
+        search as assumptions. Only for formulas with a `structure_key`.
+        """
+        mask = self.instance_clauses()
+        lengths = self.clauses.clause_lengths()
+        lits = self.clauses.lits
+        units = lits[self.clauses.starts[:-1][mask]]
+        kept = lits[np.repeat(~mask, lengths)]
+        starts = np.zeros((~mask).sum()+1, dtype=np.int64)
+        np.cumsum(lengths[~mask], out=starts[1:])
+        search = Search(self.num_vars, kept, starts, self.numstates, self.exclusive_lookup_list())
+        return search, to_internal(units).tolist()
+
+    def make_search(self, simplify=False):
+        """
+        Returns a fresh `Search` over the formula, its exclusive groups and
+        propagators. `simplify` is passed on to `compile`; formulas with
+        propagators are never simplified.
+        """
+        if not self.propagators():
+            return self.compile(simplify).new_search()
+        return Search(self.num_vars, self.clauses.lits, self.clauses.starts,
+                      self.numstates, self.exclusive_lookup_list(), self.propagators())
+
+    def make_enumerator(self, simplify=False):
+        """
+        Returns the search `solve` enumerates solutions with. This is the
+        `Search` of `make_search`; solvers with a search of their own, which
+        need not offer the rest of the `Search` interface, override it.
+        """
+        return self.make_search(simplify)
+
+    def solution_layout(self, visible_only=False):
+        """
+        Returns the layout used to pack solutions of this solver into bitsets.
+        If `visible_only` is True, only the variables of visible states are kept.
+        """
+        return SolutionLayout(self.height, self.width, self.states,
+                              self.board.visible_states, visible_only)
+
+    def solve(self, verbose=False, max_sols=100, visible_only=False, quiet=False,
+              timeout=None, max_decisions=None, max_conflicts=None, cancel=None,
+              checkpoint=None, checkpoint_interval=60.0, simplify=False, pool=None):
+        """
+        Solves the system. Yields each solution as a `PackedSolution` if
+        the CNF system is solvable, and None if not. If `visible_only` is
+        True, the stored solutions only keep the variables of visible states.
+        If `quiet` is True, nothing is printed.
+
+        The search can be limited by a wall-clock `timeout` in seconds, a number
+        of decisions `max_decisions`, a number of conflicts `max_conflicts` and a
+        `CancellationToken` `cancel`, all checked at every decision. When a limit
+        is hit, the solutions found so far are yielded followed by an `Unknown`
+        result holding the reason. Search statistics end up in `self.stats`.
+
+        With a `checkpoint` path, the state of the search is saved there every
+        `checkpoint_interval` seconds and when the solve ends (see checkpoint.py).
+        If the file already exists, the solve resumes from it: the solutions it
+        holds count towards `max_sols` and are yielded first, and the search
+        carries on where it was saved. Rerunning an interrupted job with the
+        same arguments thus continues it.
+
+        With `simplify`, equivalent literals are merged and failed literals
+        removed before the search starts (see implications.py). This pays off
+        on larger formulas with many auxiliary variables, such as Nurikabe.
+
+        With a `LearnedClausePool`, the givens are searched as assumptions, the
+        search starts with the clauses the pool learned on puzzles of the same
+        structure, and the clauses it learns are added to the pool (see
+        learned_pool.py). Formulas without a `structure_key` ignore the pool.
+
+        The clauses live in `self.clauses`, a `ClauseStore` arena of signed
+        literals, and are searched by a conflict driven `Search`. Solutions
+        are told apart by the variables of `block_vars`, so two solutions
+        never produce the same solved board. As the
+        results are stored on the solver, concurrent solves should go through
+        `compile()` instead.
+        """
+        if not quiet: print("Beginning new test")
+        self.layout = layout = self.solution_layout(visible_only)
+        overall_solutions = []
+        self.solutions = overall_solutions
+        key = self.structure_key() if pool is not None else None
+        assumptions = []
+        if key is None:
+            search = self.make_enumerator(simplify)
+        else:
+            search, assumptions = self.make_structural_search()
+            search.seed(pool.get(key))
+            search.shared = []
+        block_vars = self.block_vars()
+        complete = False # every solution has been found
+        if checkpoint is not None:
+            checkpointer = self.checkpointer(checkpoint, checkpoint_interval, visible_only, search)
+            saved = checkpointer.load()
+            if saved is not None:
+                metadata, arrays = saved
+                overall_solutions.extend(PackedSolution(bits.tobytes(), layout)
+                                         for bits in arrays["solutions"])
+                search.restore_state(metadata["search"], arrays)
+                complete = metadata["complete"]
+                if not quiet: print(f"Resuming from {checkpoint} with "
+                                    f"{len(overall_solutions)} solution(s)")
+            checkpointer.solutions = overall_solutions
+            search.checkpointer = checkpointer
+        # the limits count from where a resumed search starts
+        search.budget = Budget(timeout,
+                               None if max_decisions is None else search.decisions + max_decisions,
+                               None if max_conflicts is None else search.conflicts + max_conflicts,
+                               cancel)
+        remaining = 0 if complete else max_sols - len(overall_solutions)
+        found = 0
+        for model in search.enumerate_models(remaining, block_vars, assumptions):
+            overall_solutions.append(layout.pack(model))
+            found += 1
             if verbose:
-               print(f"Substituting at depth #{calls_made}, {state}, {forcing=}")
-            if len(overall_solutions) >= max_sols:
-                return None
-
-            def get_one_item(dic, unit=True):
-                """
-                Finds any key, value pair from dic, and then finds
-                all of the exclusive states to add as well.
-                Returns a set of (var, literal) pairs.
-                """
-                for key, value in dic.items():
-                    entry = key, value
-                    return (key, value)
-                if unit:
-                    return self.find_exclusive_states(entry, already_subbed) 
-                return self.find_exclusive_states(entry, already_subbed), entry
-
-            if not formula_dict:
-                return True
-            unit_clauses = set()
-            clause = None
-            forcing = False
-            for clause in formula_dict.values():
-                if len(clause) == 1:
-            #         print(f"{clause}")
-                    unit_clauses.add(get_one_item(clause))
-                    forcing = True
-                if len(clause) == 0:
-                    print("what")
-                    input()
-                    return False
-            clauses_to_sub = unit_clauses if unit_clauses else set((get_one_item(clause),))
-            # kept_formula = copy.deepcopy(formula_dict)
-            # kept = copy.deepcopy(already_subbed)
-            mutate_gen = modify_formula_dict(formula_dict, var_map, clauses_to_sub)
-            gen_out = next(mutate_gen)
-            if gen_out is True:
-                sol = copy.deepcopy(already_subbed)
-                overall_solutions.append(sol)
-                if verbose: 
-                    print("-------SOLUTION FOUND-----------------------------------------------------")
-                    input()
-                next(mutate_gen)
-                return True
-            if gen_out is None and satisfying_helper_dict(calls_made+1, "guess", forcing) and forcing:
-                # pass
-                if verbose: print(f"Direct backtracking at depth #{calls_made}...")
-                next(mutate_gen)
-                return True
-            if verbose: print(f"Resubstituting at depth #{calls_made}...")
-            next(mutate_gen)  # this failed, so we revert the formula
-            # assert formula_dict.keys() == kept_formula.keys(), str(set(formula_dict) ^ set(kept)) + str(pass_times)
-            # assert already_subbed == kept, str(set(kept.keys())-set(already_subbed.keys())) + str(set(already_subbed.keys())-set(kept.keys()))
-            if forcing:
-                return False  # current subs don't work, no alternatives
-            tup_clause = tuple(clauses_to_sub)
-            clause_alt = [(tup_clause[0][0], not tup_clause[0][1])]
-            mutate_gen_alt = modify_formula_dict(formula_dict, var_map, clause_alt)
-            gen_out_alt = next(mutate_gen_alt)
-            if gen_out_alt is True:
-                next(mutate_gen_alt)
-                return True
-            if gen_out_alt is None and satisfying_helper_dict(calls_made+1, "guess_alt"):
-                if verbose: print(f"Direct backtracking at depth #{calls_made} as both options were considered...")
-                next(mutate_gen_alt)
-                return True
-            next(mutate_gen_alt)  # this failed, so we revert the formula
-            if verbose: print(f"Backtracking at depth #{calls_made} as this path failed...")
-            return False
-
-        satisfying_helper_dict()
+                print(f"Solution #{len(overall_solutions)} found after "
+                      f"{search.decisions} decisions and {search.conflicts} conflicts")
+        if checkpoint is not None:
+            if search.stop_reason is None and found < remaining:
+                complete = True
+            elif search.stop_reason is None and found:
+                # stopped at max_sols: the last model is not blocked yet
+                complete = not search.block(block_vars)
+            checkpointer.save(search, complete)
+        if key is not None and search.shared is not None:
+            pool.add(key, search.shared)
+        self.stats = search.statistics()
+        self.stats["solutions"] = len(overall_solutions)
+        if search.stop_reason is not None:
+            self.stats["stop_reason"] = search.stop_reason
+            if not quiet: print(f"Search stopped ({search.stop_reason}) after finding "
+                                f"{len(overall_solutions)} solution(s).")
+            for solution in overall_solutions:
+                self.solution = solution
+                yield self.solution
+            yield Unknown(search.stop_reason, self.stats)
+            return
         if overall_solutions:
             if len(overall_solutions) >= 100:
-                print("Warning: search terminated after finding 100 solutions")
-#             assert overall_out.keys() == already_subbed
-            print(f"{len(overall_solutions)} solution(s) found.")
+                if not quiet: print("Warning: search terminated after finding 100 solutions")
+            if not quiet: print(f"{len(overall_solutions)} solution(s) found.")
             for solution in overall_solutions:
                 self.solution = solution
                 yield self.solution
-            print(f"No more solutions found")
+            if not quiet: print(f"No more solutions found")
             return
-#             return overall_out
-        print("No solutions found")
+        if not quiet: print("No solutions found")
         self.solution = None
         yield None
 
+    def checkpointer(self, path, interval, visible_only, search):
+        """
+        Returns the `Checkpointer` of a solve, identified by the shape, states
+        and size of the formula, a digest of its clauses and by the kind of search.
+        """
+        identity = {"height": self.height, "width": self.width, "states": list(self.states),
+                    "num_vars": self.num_vars, "visible_only": visible_only,
+                    "search": type(search).__name__, "formula": self.formula_digest()}
+        return Checkpointer(path, interval, identity)
+
+    def formula_digest(self) -> str:
+        """
+        Returns a digest of the clauses (givens included) and exclusive groups
+        of the formula, which tells apart formulas of the same shape.
+        """
+        digest = hashlib.sha256(json.dumps(self.exclusive_states).encode())
+        digest.update(np.asarray(self.clauses.starts, dtype=np.int64).tobytes())
+        digest.update(np.asarray(self.clauses.lits, dtype=np.int32).tobytes())
+        return digest.hexdigest()
+
+    def solve_local(self, max_flips=100000, max_tries=10, seed=None, method="walksat",
+                    visible_only=False, quiet=False, timeout=None, cancel=None):
+        """
+        Looks for one solution by stochastic local search (see `LocalSearch`),
+        which can be much faster than `solve` on large, loosely constrained
+        puzzles. Yields the solution as a `PackedSolution` if one is found.
+        Local search cannot prove that there is no solution, so when the
+        flips (`max_flips` per try, at most `max_tries` tries), the `timeout`
+        or the `CancellationToken` `cancel` run out, it yields an `Unknown`
+        result instead. Statistics end up in `self.stats`.
+        Raises ValueError if some rules are enforced by propagators.
+        """
+        if self.propagators():
+            raise ValueError("local search needs every rule as clauses, "
+                             "but some rules are enforced lazily")
+        if not quiet: print("Beginning new local search")
+        self.layout = layout = self.solution_layout(visible_only)
+        self.solutions = []
+        self.solution = None
+        search = LocalSearch(self.num_vars, self.clauses.lits, self.clauses.starts,
+                             self.numstates, self.exclusive_lookup_list(), seed, method)
+        search.budget = Budget(timeout, cancel=cancel)
+        found = search.solve(max_flips, max_tries)
+        self.stats = search.statistics()
+        if not found:
+            self.stats["stop_reason"] = search.stop_reason
+            if not quiet: print(f"Local search stopped ({search.stop_reason}) after "
+                                f"{search.flips} flips.")
+            yield Unknown(search.stop_reason, self.stats)
+            return
+        self.stats["solutions"] = 1
+        if not quiet: print(f"Solution found after {search.flips} flips.")
+        self.solution = layout.pack(search.model())
+        self.solutions.append(self.solution)
+        yield self.solution
+
+    def visible_vars(self):
+        """
+        Returns an array of every variable whose state is a visible state of the board.
+        """
+        visible = [num for num, state in enumerate(self.states) if state in self.board.visible_states]
+        cells = np.arange(self.height*self.width)
+        return (cells[:, None]*self.numstates + np.array(visible, dtype=np.int64)).ravel()
+
+    def block_vars(self):
+        """
+        Returns the variables that tell solutions apart: those of the visible
+        states. The other variables, such as the auxiliary states of the
+        Nurikabe connectivity and size rules, can often take many values for
+        the same filled board, and each of those would otherwise count as
+        another solution. Returns None for boards without visible states,
+        whose models are then told apart by the decisions that led to them.
+        """
+        visible = self.visible_vars()
+        return visible if len(visible) else None
+
+    def save(self, path):
+        """
+        Writes the fully built formula to `path` in the binary format of
+        `formula_io`: the clause arena and offsets, the occurrence index, the
+        states, exclusive state groups and the board needed to decode solutions.
+        Raises ValueError if some rules are enforced by propagators.
+        """
+        if self.propagators():
+            raise ValueError("formulas with lazy rules cannot be saved, as their "
+                             "constraints are not stored as clauses")
+        indptr, clause_ids = self.clauses.occurrences()
+        numbers = self.board.constraints.get("numbers", {})
+        metadata = {
+            "height": self.height,
+            "width": self.width,
+            "numstates": self.numstates,
+            "num_vars": self.num_vars,
+            "states": self.states,
+            "state_map": self.state_map,
+            "exclusive_states": self.exclusive_states,
+            "board": {"data": self.board.data,
+                      "visible_states": self.board.visible_states,
+                      "numbers": [[*coords, num] for coords, num in numbers.items()]},
+        }
+        arrays = {"lits": self.clauses.lits, "starts": self.clauses.starts,
+                  "occurrence_indptr": indptr, "occurrence_clause_ids": clause_ids}
+        formula_io.write_formula(path, metadata, arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a solver written by `save`. The clause arena and occurrence index
+        are zero-copy views of a read-only memory map of the file, so the rules
+        are never run again and processes loading the same file share its pages.
+        The loaded solver has no rules, and its board is a plain `Board`.
+        """
+        metadata, arrays = formula_io.read_formula(path)
+        board_info = metadata["board"]
+        constraints = {}
+        if board_info["numbers"]:
+            constraints["numbers"] = {(row, col): num for row, col, num in board_info["numbers"]}
+        solver = cls.__new__(cls)
+        solver.rules = []
+        solver.clauses = ClauseStore.from_arrays(
+            arrays["lits"], arrays["starts"],
+            (arrays["occurrence_indptr"], arrays["occurrence_clause_ids"]))
+        solver.board = Board(board_info["data"], board_info["visible_states"], constraints)
+        solver.height, solver.width = metadata["height"], metadata["width"]
+        solver.states = metadata["states"]
+        solver.state_map = metadata["state_map"]
+        solver.exclusive_states = metadata["exclusive_states"]
+        solver.numstates = metadata["numstates"]
+        solver.num_vars = metadata["num_vars"]
+        solver.exclusive_states_lookup = solver.parse_exclusive_states()
+        solver.solution = None
+        solver.solutions = []
+        solver.layout = None
+        solver.stats = {}
+        solver.compiled = None
+        return solver
+
     def generate_solved_board(self):
-        new_board = copy.deepcopy(self.board)
         if self.solution is None:
-            return new_board
-        data = new_board.data
-        for var, literal in self.solution.items():
-            if not literal:
-                continue
-            row_idx, col_idx, state_num = self.get_idx_and_state(var)
-            state = self.states[state_num]
-            new_board.add_state_to_board(row_idx, col_idx, state)
-        return new_board
+            return copy.deepcopy(self.board)
+        return self.layout.to_board(self.solution, self.board)
+
+    def generate_solved_grids(self):
+        """
+        Decodes every solution from the last call to `solve` at once.
+        Returns an object array of shape (num_solutions, height, width).
+        """
+        if self.layout is None:
+            self.layout = self.solution_layout()
+        return self.layout.to_grids(self.solutions)
 
 
 if __name__ == "__main__":
-    formula = {0: {'a': True, 'b': True}, 1: {'a': False, 'b': False, 'c': True}, 2: {'b': True, 'c': True}, 3: {'b': True, 'c': False}, 4: {'a': False, 'b': False, 'c': False}}
-    var_map = {'a': {True: {0}, False: {1, 4}}, 'b': {True: {0, 2, 3}, False: {1, 4}}, 'c': {True: {1, 2}, False: {3, 4}}}
-    solver = CNFSolver(1, 1, [])
-    solver.formula = formula
-    solver.var_map = var_map
-    print(solver.solve())
+    # (a OR b) AND (NOT a OR NOT b OR c) AND (b OR c) AND (b OR NOT c) AND (NOT a OR NOT b OR NOT c)
+    # with a, b, c as variables 0, 1, 2
+    store = ClauseStore()
+    store.add_clauses_bulk([[1, 2, 0], [-1, -2, 3], [2, 3, 0], [2, -3, 0], [-1, -2, -3]])
+    search = Search(3, store.lits, store.starts)
+    print(list(search.enumerate_models(10)))
@@ -0,0 +1,916 @@
+# Conflict driven clause learning search over a ClauseStore.
+# Internally a literal is 2*var for a True variable and 2*var+1 for
+# a False one, so the negation of literal l is always l ^ 1.
+# Exclusive states are not expanded into clauses: whenever a variable
+# is set to True, every other state of its exclusive group in the
+# same cell is set to False directly during propagation.
+# The original clauses are read from a SharedClauses, the arena of internal
+# literals that any number of searches over one formula share: a search
+# only keeps, per clause, which two literals it watches. Clauses added
+# later (learned and blocking clauses) are lists owned by the search.
+# Rules can also take part in propagation directly (see Rule.propagate):
+# they are told about new assignments to the variables they watch once
+# clause propagation settles, and the literals they imply get the rule
+# itself as reason, to be turned into a clause by Rule.explain only when
+# conflict analysis needs it.
+
+from heapq import heappush, heappop, heapify
+import threading
+import time
+import numpy as np
+
+from checkpoint import ragged_arrays, ragged_lists
+
+UNASSIGNED = -1
+
+
+def to_internal(lits) -> np.ndarray:
+    """
+    Converts an array of signed (DIMACS style) literals to internal literals.
+    """
+    lits = np.asarray(lits, dtype=np.int64)
+    return 2*(np.abs(lits)-1) + (lits < 0)
+
+
+def to_signed(lit: int) -> int:
+    """
+    Converts an internal literal to a signed (DIMACS style) literal.
+    """
+    return -((lit >> 1)+1) if lit & 1 else (lit >> 1)+1
+
+
+def from_signed(lit: int) -> int:
+    """
+    Converts a signed (DIMACS style) literal to an internal literal.
+    """
+    return 2*(lit-1) if lit > 0 else 2*(-lit-1)+1
+
+
+def luby(idx: int) -> int:
+    """
+    Returns the idx-th element (starting from 0) of the Luby sequence
+    1, 1, 2, 1, 1, 2, 4, 1, ... used to space out restarts.
+    """
+    size, seq = 1, 0
+    while size < idx+1:
+        seq += 1
+        size = 2*size+1
+    while size-1 != idx:
+        size = (size-1) >> 1
+        seq -= 1
+        idx = idx % size
+    return 1 << seq
+
+
+class CancellationToken():
+    """
+    Lets another thread ask a running search to stop. The search polls
+    the token at every decision and stops with an UNKNOWN result.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class Budget():
+    """
+    Resource limits for a search: a wall-clock timeout in seconds, a number
+    of decisions, a number of conflicts and a cancellation token. Any of them
+    can be None for no limit. The clock starts when the budget is created.
+    """
+
+    def __init__(self, timeout=None, max_decisions=None, max_conflicts=None, cancel=None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.max_decisions = max_decisions
+        self.max_conflicts = max_conflicts
+        self.cancel = cancel
+
+    def exhausted(self, search) -> str | None:
+        """
+        Returns the reason the search has to stop, or None if it may continue.
+        """
+        if self.max_decisions is not None and search.decisions >= self.max_decisions:
+            return "decisions"
+        if self.max_conflicts is not None and search.conflicts >= self.max_conflicts:
+            return "conflicts"
+        if self.cancel is not None and self.cancel.cancelled:
+            return "cancelled"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "timeout"
+        return None
+
+
+class Unknown():
+    """
+    Result of a search that stopped because its budget ran out, before it
+    could tell whether (more) solutions exist. Unlike None, which means
+    there is no solution, this says nothing about satisfiability.
+    """
+
+    def __init__(self, reason: str, stats: dict) -> None:
+        self.reason = reason # "timeout", "decisions", "conflicts" or "cancelled"
+        self.stats = stats
+
+    def __repr__(self) -> str:
+        return f"Unknown(reason={self.reason!r}, stats={self.stats})"
+
+
+class SharedClauses():
+    """
+    The original clauses of a formula, read (never changed) by every search
+    over it: the arena of internal literals and its offsets, the unit
+    clauses, the implications of the binary clauses and the literals every
+    search starts by watching in the longer clauses.
+    """
+
+    def __init__(self, num_vars, ilits, bounds) -> None:
+        """
+        Args:
+            num_vars: number of variables, numbered from 0
+            ilits, bounds: the clauses, as lists of internal literals and offsets
+        """
+        self.num_vars = num_vars
+        self.ok = True # False if there is an empty clause
+        ilits, bounds = self.normalized(ilits, bounds)
+        self.ilits, self.bounds = tuple(ilits), tuple(bounds)
+        self.units = []
+        # implied_by[lit] holds, for every binary clause (lit^1 OR other),
+        # the reason [other, lit^1] used to assign other once lit is True
+        self.implied_by = [[] for _ in range(2*num_vars)]
+        # clause ids of the longer clauses, by the two literals watched first
+        self.watches = [[] for _ in range(2*num_vars)]
+        first_watch = [0]*(len(bounds)-1)
+        second_watch = [0]*(len(bounds)-1)
+        self.num_binary = self.num_long = 0
+        for idx, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if end - start == 0:
+                self.ok = False
+            elif end - start == 1:
+                self.units.append(ilits[start])
+            elif end - start == 2:
+                first, second = ilits[start], ilits[start+1]
+                self.implied_by[first ^ 1].append([second, first])
+                self.implied_by[second ^ 1].append([first, second])
+                self.num_binary += 1
+            else:
+                first_watch[idx], second_watch[idx] = ilits[start], ilits[start+1]
+                self.watches[ilits[start]].append(idx)
+                self.watches[ilits[start+1]].append(idx)
+                self.num_long += 1
+        self.first_watch, self.second_watch = tuple(first_watch), tuple(second_watch)
+
+    @staticmethod
+    def normalized(ilits, bounds):
+        """
+        Returns the clauses without repeated literals and tautologies, as the
+        watches need distinct literals. Clauses of a ClauseStore with `dedup`
+        are already so, and are returned as they are.
+        """
+        clauses = []
+        changed = False
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            clause = ilits[start:end]
+            if len(set(clause)) != len(clause):
+                clause = list(dict.fromkeys(clause))
+                changed = True
+            if any(lit ^ 1 in clause for lit in clause if not lit & 1):
+                changed = True
+                continue
+            clauses.append(clause)
+        if not changed:
+            return ilits, bounds
+        ilits, bounds = [], [0]
+        for clause in clauses:
+            ilits.extend(clause)
+            bounds.append(len(ilits))
+        return ilits, bounds
+
+
+class Search():
+    """
+    Search state for one formula. Holds the assignment, the trail and the
+    learned clauses, and can enumerate models one after another.
+    """
+
+    restart_base = 100 # conflicts per unit of the Luby sequence
+    var_decay = 0.95
+
+    def __init__(self, num_vars, lits, starts, numstates=1, exclusive_lookup=None, propagators=(),
+                 internal_clauses=None):
+        """
+        Args:
+            num_vars: number of variables, numbered from 0
+            lits, starts: the clause arena and offsets of a ClauseStore
+            numstates: number of states per cell, used to find exclusive groups
+            exclusive_lookup: list indexed by state number, holding either None
+                or the list of state numbers exclusive with that state
+            propagators: rules implementing `propagator_vars`, `propagate`,
+                `explain` and `backtrack` (see Rule)
+            internal_clauses: the arena already converted by `to_internal` and the
+                offsets, both as lists, or a SharedClauses built from them to
+                share it between searches (see CompiledFormula); `lits` and
+                `starts` are then not used
+        """
+        self.num_vars = num_vars
+        self.num_grid_vars = num_vars # variables added later by new_var belong to no cell
+        self.numstates = numstates
+        if exclusive_lookup is not None and not any(exclusive_lookup):
+            exclusive_lookup = None
+        self.exclusive_lookup = exclusive_lookup
+        self.value = [UNASSIGNED]*(2*num_vars) # per literal: 1 True, 0 False
+        self.level = [0]*num_vars
+        self.reason = [None]*num_vars
+        self.phase = [False]*num_vars
+        self.activity = [0.0]*num_vars
+        self.var_inc = 1.0
+        self.trail = []
+        self.trail_lim = [] # trail index where each decision level starts
+        self.qhead = 0
+        if internal_clauses is None:
+            internal_clauses = (to_internal(lits).tolist(), np.asarray(starts).tolist())
+        if not isinstance(internal_clauses, SharedClauses):
+            internal_clauses = SharedClauses(num_vars, *internal_clauses)
+        originals = self.originals = internal_clauses
+        # watches of the original clauses of more than two literals, by clause
+        # id; the literal watched along with the one at second_watch is at first_watch
+        self.arena_watches = [list(watching) for watching in originals.watches]
+        self.first_watch = list(originals.first_watch)
+        self.second_watch = list(originals.second_watch)
+        self.watches = [[] for _ in range(2*num_vars)] # of the clauses below
+        # binary clauses are not watched: implied_by[lit] holds, for every
+        # binary clause (lit^1 OR other), the reason [other, lit^1] used to
+        # assign other as soon as lit becomes True. The lists of the original
+        # clauses are shared, so one is replaced rather than appended to.
+        self.implied_by = list(originals.implied_by)
+        self.num_binary = originals.num_binary
+        self.clauses = [] # clauses added after the original ones, such as blocking clauses
+        self.learnts = []
+        self.learnt_lbd = []
+        self.max_learnts = 2000
+        self.ok = True
+        self.heap = [(0.0, var) for var in range(num_vars)]
+        self.in_heap = [True]*num_vars
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+        self.restarts = 0
+        self.budget = None
+        self.stop_reason = None # set when the budget runs out
+        self.checkpointer = None # told about every decision (see checkpoint.py)
+        self.blocked = [] # copies of the clauses added by `block`
+        # when a list, every learned clause (of up to shared_max_length literals
+        # if set) is copied there as a (clause, lbd) pair, until the first `block`
+        self.shared = None
+        self.shared_max_length = None
+        self.start_time = time.monotonic()
+        self.assumptions = [] # internal literals of the last solve
+        self.propagators = list(propagators)
+        self.prop_head = 0 # trail index up to which propagators have been told
+        self.delivered = [[] for _ in self.propagators] # (trail index, literal) told to each
+        self.var_props = [None]*num_vars # propagators watching each variable
+        for idx, propagator in enumerate(self.propagators):
+            propagator.attach_search(self)
+            for var in propagator.propagator_vars():
+                if self.var_props[var] is None:
+                    self.var_props[var] = []
+                self.var_props[var].append(idx)
+        self.ok = originals.ok
+        for lit in originals.units:
+            if not self.add_clause([lit]):
+                break
+
+    def decision_level(self) -> int:
+        return len(self.trail_lim)
+
+    def add_clause(self, clause, learnt=False) -> bool:
+        """
+        Adds a clause of internal literals at decision level 0. Removes duplicate
+        literals, literals already False and clauses already satisfied.
+        Returns False if the formula is now known to be unsatisfiable.
+        """
+        assert self.decision_level() == 0
+        if not self.ok:
+            return False
+        value = self.value
+        out = []
+        for lit in dict.fromkeys(clause):
+            if value[lit] == 1 or lit ^ 1 in out:
+                return True # satisfied or a tautology
+            if value[lit] == UNASSIGNED:
+                out.append(lit)
+        if not out:
+            self.ok = False
+            return False
+        if len(out) == 1:
+            self.assign(out[0], None)
+            return True
+        if len(out) == 2 and not learnt:
+            first, second = out
+            implied_by = self.implied_by
+            implied_by[first ^ 1] = implied_by[first ^ 1] + [[second, first]]
+            implied_by[second ^ 1] = implied_by[second ^ 1] + [[first, second]]
+            self.num_binary += 1
+            return True
+        self.attach(out, learnt)
+        return True
+
+    def attach(self, clause, learnt=False) -> None:
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+        if learnt:
+            self.learnts.append(clause)
+        else:
+            self.clauses.append(clause)
+
+    def assign(self, lit, reason) -> None:
+        value = self.value
+        value[lit] = 1
+        value[lit ^ 1] = 0
+        var = lit >> 1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def new_var(self) -> int:
+        """
+        Adds a fresh variable, for example a selector used to switch a group
+        of clauses on and off through assumptions. Returns its number.
+        """
+        var = self.num_vars
+        self.num_vars += 1
+        self.value.extend((UNASSIGNED, UNASSIGNED))
+        self.level.append(0)
+        self.reason.append(None)
+        self.phase.append(False)
+        self.activity.append(0.0)
+        self.watches.extend(([], []))
+        self.arena_watches.extend(([], []))
+        self.implied_by.extend(([], []))
+        self.var_props.append(None)
+        self.in_heap.append(True)
+        heappush(self.heap, (0.0, var))
+        return var
+
+    def shuffle(self, rng) -> None:
+        """
+        Backtracks to level 0 and randomizes the phases and the branching
+        order, so that the next model found is a random one.
+        """
+        self.backtrack(0)
+        self.phase = [rng.random() < 0.5 for _ in range(self.num_vars)]
+        self.activity = [rng.random()*self.var_inc for _ in range(self.num_vars)]
+        self.rebuild_heap()
+
+    def var_value(self, var) -> bool | None:
+        """
+        Returns the value of a variable, or None if it is unassigned.
+        """
+        value = self.value[2*var]
+        return None if value == UNASSIGNED else value == 1
+
+    def propagate(self):
+        """
+        Runs unit propagation, and then the propagators, over everything on
+        the trail that has not been propagated yet, until neither implies
+        anything new. Returns a conflicting clause, or None.
+        """
+        while True:
+            conflict = self.propagate_clauses()
+            if conflict is not None or not self.propagators:
+                return conflict
+            conflict = self.run_propagators()
+            if conflict is not None or self.qhead == len(self.trail):
+                return conflict
+
+    def run_propagators(self):
+        """
+        Tells each propagator about the new assignments to its variables and
+        assigns the literals it implies. Returns a conflicting clause, or None.
+        """
+        trail, var_props = self.trail, self.var_props
+        deltas = {}
+        for pos in range(self.prop_head, len(trail)):
+            lit = trail[pos]
+            watching = var_props[lit >> 1]
+            if watching is not None:
+                for idx in watching:
+                    deltas.setdefault(idx, []).append((pos, lit))
+        self.prop_head = len(trail)
+        # every propagator hears about the delta before any literal is assigned,
+        # as a conflict found on the way would keep it from the later ones
+        answers = []
+        for idx in sorted(deltas):
+            propagator = self.propagators[idx]
+            self.delivered[idx].extend(deltas[idx])
+            answers.append((propagator, propagator.propagate([to_signed(lit) for _, lit in deltas[idx]])))
+        value = self.value
+        for propagator, implied in answers:
+            for signed in implied:
+                lit = from_signed(signed)
+                if value[lit] == 1:
+                    continue
+                if value[lit] == 0:
+                    return [from_signed(other) for other in propagator.explain(signed)]
+                self.assign(lit, propagator)
+        return None
+
+    def reason_of(self, var):
+        """
+        Returns the reason clause of an implied variable, asking the propagator
+        that implied it for an explanation if it has not done so yet.
+        """
+        why = self.reason[var]
+        if why is None or isinstance(why, list):
+            return why
+        lit = 2*var if self.value[2*var] == 1 else 2*var+1
+        if isinstance(why, int): # an original clause, by id
+            originals = self.originals
+            start, end = originals.bounds[why], originals.bounds[why+1]
+            why = [lit] + [other for other in originals.ilits[start:end] if other != lit]
+        else:
+            why = [from_signed(other) for other in why.explain(to_signed(lit))]
+        self.reason[var] = why
+        return why
+
+    def propagate_clauses(self):
+        """
+        Runs unit propagation over the clauses and exclusive groups for everything
+        on the trail that has not been propagated yet. Returns a conflicting
+        clause, or None.
+        """
+        value, watches, trail = self.value, self.watches, self.trail
+        implied_by, arena_watches = self.implied_by, self.arena_watches
+        first_watch, second_watch = self.first_watch, self.second_watch
+        ilits, bounds = self.originals.ilits, self.originals.bounds
+        exclusive_lookup, numstates = self.exclusive_lookup, self.numstates
+        assign = self.assign
+        while self.qhead < len(trail):
+            lit = trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            if exclusive_lookup is not None and not lit & 1 and lit >> 1 < self.num_grid_vars:
+                var = lit >> 1
+                group = exclusive_lookup[var % numstates]
+                if group is not None:
+                    base = var - var % numstates
+                    for state in group:
+                        other = 2*(base + state)
+                        if other == lit or value[other] == 0:
+                            continue
+                        reason = [other ^ 1, lit ^ 1]
+                        if value[other] == 1:
+                            return reason
+                        assign(other ^ 1, reason)
+            for reason in implied_by[lit]:
+                implied = reason[0]
+                if value[implied] == 1:
+                    continue
+                if value[implied] == 0:
+                    return reason
+                assign(implied, reason)
+            false_lit = lit ^ 1
+            watch_list = arena_watches[false_lit]
+            if watch_list:
+                kept = []
+                idx, num = 0, len(watch_list)
+                while idx < num:
+                    clause_id = watch_list[idx]
+                    idx += 1
+                    first = first_watch[clause_id]
+                    if first == false_lit:
+                        first = first_watch[clause_id] = second_watch[clause_id]
+                        second_watch[clause_id] = false_lit
+                    if value[first] == 1:
+                        kept.append(clause_id)
+                        continue
+                    for k in range(bounds[clause_id], bounds[clause_id+1]):
+                        other = ilits[k]
+                        if value[other] != 0 and other != first:
+                            second_watch[clause_id] = other
+                            arena_watches[other].append(clause_id)
+                            break
+                    else:
+                        kept.append(clause_id)
+                        if value[first] == 0:
+                            kept.extend(watch_list[idx:])
+                            arena_watches[false_lit] = kept
+                            return list(ilits[bounds[clause_id]:bounds[clause_id+1]])
+                        assign(first, clause_id)
+                arena_watches[false_lit] = kept
+            watch_list = watches[false_lit]
+            kept = []
+            idx, num = 0, len(watch_list)
+            while idx < num:
+                clause = watch_list[idx]
+                idx += 1
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if value[first] == 1:
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    other = clause[k]
+                    if value[other] != 0:
+                        clause[1], clause[k] = other, false_lit
+                        watches[other].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if value[first] == 0:
+                        kept.extend(watch_list[idx:])
+                        watches[false_lit] = kept
+                        return clause
+                    assign(first, clause)
+            watches[false_lit] = kept
+        return None
+
+    def analyze(self, conflict):
+        """
+        First-UIP conflict analysis. Returns the learned clause, with the
+        asserting literal first, and the level to backjump to.
+        """
+        level, reason_of, trail = self.level, self.reason_of, self.trail
+        current = len(self.trail_lim)
+        seen = set()
+        learnt = [None]
+        counter = 0
+        lit = None
+        idx = len(trail)-1
+        clause = conflict
+        while True:
+            for other in (clause if lit is None else clause[1:]):
+                var = other >> 1
+                if var not in seen and level[var] > 0:
+                    seen.add(var)
+                    self.bump(var)
+                    if level[var] >= current:
+                        counter += 1
+                    else:
+                        learnt.append(other)
+            while trail[idx] >> 1 not in seen:
+                idx -= 1
+            lit = trail[idx]
+            idx -= 1
+            counter -= 1
+            if counter == 0:
+                break
+            clause = reason_of(lit >> 1)
+        learnt[0] = lit ^ 1
+        # drop literals implied by the rest of the learned clause
+        in_learnt = {other >> 1 for other in learnt}
+        minimized = [learnt[0]]
+        for other in learnt[1:]:
+            why = reason_of(other >> 1)
+            if why is None or any(level[x >> 1] > 0 and x >> 1 not in in_learnt for x in why[1:]):
+                minimized.append(other)
+        learnt = minimized
+        if len(learnt) == 1:
+            return learnt, 0
+        max_idx = max(range(1, len(learnt)), key=lambda k: level[learnt[k] >> 1])
+        learnt[1], learnt[max_idx] = learnt[max_idx], learnt[1]
+        return learnt, level[learnt[1] >> 1]
+
+    def bump(self, var) -> None:
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > 1e100:
+            for other in range(self.num_vars):
+                activity[other] *= 1e-100
+            self.var_inc *= 1e-100
+            self.rebuild_heap()
+        elif self.in_heap[var]:
+            heappush(self.heap, (-activity[var], var))
+
+    def rebuild_heap(self) -> None:
+        value, activity = self.value, self.activity
+        free = [var for var in range(self.num_vars) if value[2*var] == UNASSIGNED]
+        self.in_heap = [False]*self.num_vars
+        for var in free:
+            self.in_heap[var] = True
+        self.heap = [(-activity[var], var) for var in free]
+        heapify(self.heap)
+
+    def backtrack(self, target_level) -> None:
+        if len(self.trail_lim) <= target_level:
+            return
+        value, phase, heap, in_heap, activity = self.value, self.phase, self.heap, self.in_heap, self.activity
+        start = self.trail_lim[target_level]
+        for lit in self.trail[start:]:
+            var = lit >> 1
+            value[lit] = value[lit ^ 1] = UNASSIGNED
+            phase[var] = not lit & 1
+            self.reason[var] = None
+            if not in_heap[var]:
+                in_heap[var] = True
+                heappush(heap, (-activity[var], var))
+        for idx, delivered in enumerate(self.delivered):
+            if delivered and delivered[-1][0] >= start:
+                undone = []
+                while delivered and delivered[-1][0] >= start:
+                    undone.append(to_signed(delivered.pop()[1]))
+                self.propagators[idx].backtrack(undone)
+        del self.trail[start:]
+        del self.trail_lim[target_level:]
+        self.qhead = len(self.trail)
+        self.prop_head = min(self.prop_head, start)
+
+    def pick_branch(self):
+        """
+        Returns the next decision literal, or None if every variable is assigned.
+        """
+        heap, value, activity, in_heap = self.heap, self.value, self.activity, self.in_heap
+        if len(heap) > 4*self.num_vars + 1000:
+            self.rebuild_heap()
+            heap = self.heap
+        while heap:
+            neg_act, var = heappop(heap)
+            if -neg_act != activity[var]:
+                continue # stale entry
+            in_heap[var] = False
+            if value[2*var] == UNASSIGNED:
+                return 2*var + (0 if self.phase[var] else 1)
+        return None
+
+    def learn(self, learnt) -> None:
+        if len(learnt) == 1:
+            if self.shared is not None and not self.blocked:
+                self.shared.append((tuple(learnt), 1))
+            self.assign(learnt[0], None)
+            return
+        level = self.level
+        lbd = len({level[lit >> 1] for lit in learnt})
+        if self.shared is not None and not self.blocked and \
+                (self.shared_max_length is None or len(learnt) <= self.shared_max_length):
+            self.shared.append((tuple(learnt), lbd))
+        self.attach(learnt, learnt=True)
+        self.learnt_lbd.append(lbd)
+        self.assign(learnt[0], learnt)
+
+    def reduce_learnts(self) -> None:
+        """
+        Forgets the less useful half of the learned clauses. Must be called at
+        decision level 0, where it also drops every satisfied clause.
+        """
+        assert self.decision_level() == 0
+        order = sorted(range(len(self.learnts)), key=lambda k: (self.learnt_lbd[k], len(self.learnts[k])))
+        keep = set(order[:len(order)//2])
+        keep.update(k for k in order if self.learnt_lbd[k] <= 2)
+        learnts = [self.learnts[k] for k in sorted(keep)]
+        lbds = [self.learnt_lbd[k] for k in sorted(keep)]
+        self.rebuild_watches(learnts, lbds)
+        self.max_learnts = int(self.max_learnts*1.1)
+
+    def rebuild_watches(self, learnts, lbds) -> None:
+        value = self.value
+        self.watches = [[] for _ in range(2*self.num_vars)]
+        old_clauses = self.clauses
+        self.clauses, self.learnts, self.learnt_lbd = [], [], []
+        for clauses, learnt in ((old_clauses, False), (learnts, True)):
+            for idx, clause in enumerate(clauses):
+                if any(value[lit] == 1 for lit in clause):
+                    continue
+                clause = [lit for lit in clause if value[lit] == UNASSIGNED]
+                self.attach(clause, learnt)
+                if learnt:
+                    self.learnt_lbd.append(lbds[idx])
+
+    def statistics(self) -> dict:
+        return {"decisions": self.decisions, "conflicts": self.conflicts,
+                "propagations": self.propagations, "restarts": self.restarts,
+                "learnts": len(self.learnts), "elapsed": time.monotonic() - self.start_time}
+
+    def solve(self, assumptions=()) -> bool | None:
+        """
+        Searches for the next model from the current state. Returns True with
+        every variable assigned if one exists, and False otherwise. If
+        `self.budget` runs out first, returns None and sets `self.stop_reason`;
+        the search can then be continued by calling `solve` again.
+
+        `assumptions` is a list of internal literals that must hold in the model.
+        They are decided first, one per decision level, so a False answer with
+        assumptions only means there is no model satisfying them; everything
+        learned along the way stays valid without them.
+        """
+        if not self.ok:
+            return False
+        assumptions = list(assumptions)
+        if assumptions != self.assumptions:
+            self.backtrack(0)
+            self.assumptions = assumptions
+        value = self.value
+        budget = self.budget
+        self.stop_reason = None
+        restarts = 0
+        conflicts_left = luby(restarts)*self.restart_base
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts_left -= 1
+                if self.decision_level() == 0:
+                    self.ok = False
+                    return False
+                learnt, backjump = self.analyze(conflict)
+                self.backtrack(backjump)
+                self.learn(learnt)
+                self.var_inc /= self.var_decay
+                continue
+            if conflicts_left <= 0:
+                restarts += 1
+                self.restarts += 1
+                conflicts_left = luby(restarts)*self.restart_base
+                self.backtrack(0)
+                if len(self.learnts) > self.max_learnts:
+                    self.reduce_learnts()
+                continue
+            if budget is not None:
+                self.stop_reason = budget.exhausted(self)
+                if self.stop_reason is not None:
+                    return None
+            if self.checkpointer is not None:
+                self.checkpointer.tick(self)
+            lit = None
+            while len(self.trail_lim) < len(assumptions):
+                assumption = assumptions[len(self.trail_lim)]
+                if value[assumption] == 0:
+                    return False # the assumptions cannot all hold
+                if value[assumption] == UNASSIGNED:
+                    lit = assumption
+                    break
+                self.trail_lim.append(len(self.trail)) # already True: an empty level
+            if lit is None:
+                lit = self.pick_branch()
+                if lit is None:
+                    return True
+                self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self.assign(lit, None)
+
+    def probe(self, max_probes=None) -> list[int]:
+        """
+        Looks for failed literals at decision level 0: every unassigned
+        literal is assigned on its own and propagated, and if that leads to a
+        conflict its negation is added as a unit. Stops after `max_probes`
+        literals (by default tries all of them). Returns the failed literals;
+        `self.ok` is False if the formula turned out to be unsatisfiable.
+        """
+        self.backtrack(0)
+        if not self.ok or self.propagate() is not None:
+            self.ok = False
+            return []
+        failed = []
+        probes = 0
+        value = self.value
+        for lit in range(2*self.num_vars):
+            if max_probes is not None and probes >= max_probes:
+                break
+            if value[lit] != UNASSIGNED:
+                continue
+            probes += 1
+            self.trail_lim.append(len(self.trail))
+            self.assign(lit, None)
+            conflict = self.propagate()
+            self.backtrack(0)
+            if conflict is None:
+                continue
+            failed.append(lit)
+            self.assign(lit ^ 1, None)
+            if self.propagate() is not None:
+                self.ok = False
+                break
+        return failed
+
+    def model(self) -> list[int]:
+        """
+        Returns the list of variables that are True in the current assignment.
+        """
+        value = self.value
+        return [var for var in range(self.num_vars) if value[2*var] == 1]
+
+    def block(self, block_vars=None) -> bool:
+        """
+        Adds a clause excluding the current model and backtracks so that the
+        search can continue. If `block_vars` is given, models are only told apart
+        by those variables; otherwise by the decisions that led to the model.
+        Returns False if no other model can exist.
+        """
+        if block_vars is not None:
+            value = self.value
+            clause = [2*var+1 for var in block_vars if value[2*var] == 1]
+            # a False variable only needs a literal if no other state of its
+            # exclusive group is in the clause, like the other digits of a
+            # filled Sudoku cell
+            in_clause = {lit >> 1 for lit in clause}
+            for var in block_vars:
+                if value[2*var] == 1 or self.excluded_by(var, in_clause):
+                    continue
+                clause.append(2*var)
+        else:
+            clause = [self.trail[start] ^ 1 for start in self.trail_lim]
+        self.blocked.append(list(clause))
+        level = self.level
+        clause.sort(key=lambda lit: -level[lit >> 1])
+        if not clause or level[clause[0] >> 1] == 0:
+            self.ok = False
+            return False
+        self.backtrack(level[clause[0] >> 1]-1)
+        if len(clause) == 1:
+            self.backtrack(0)
+            return self.add_clause(clause)
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+        self.clauses.append(clause)
+        if self.value[clause[1]] == 0:
+            self.assign(clause[0], clause)
+        return True
+
+    def excluded_by(self, var, true_vars) -> bool:
+        """
+        Returns True if a variable of `true_vars` is another state of the
+        exclusive group of `var` in the same cell.
+        """
+        if self.exclusive_lookup is None or var >= self.num_grid_vars:
+            return False
+        group = self.exclusive_lookup[var % self.numstates]
+        if group is None:
+            return False
+        base = var - var % self.numstates
+        return any(base + state in true_vars for state in group if base + state != var)
+
+    def checkpoint_state(self) -> tuple[dict, dict]:
+        """
+        Returns the state needed to resume this search as (JSON-serializable
+        dictionary, dictionary of arrays), for `restore_state`.
+        """
+        level_zero = self.trail[:self.trail_lim[0]] if self.trail_lim else self.trail
+        blocked_lits, blocked_starts = ragged_arrays(self.blocked)
+        learnt_lits, learnt_starts = ragged_arrays(self.learnts)
+        state = {"num_vars": self.num_vars, "ok": self.ok, "var_inc": self.var_inc,
+                 "max_learnts": self.max_learnts, "decisions": self.decisions,
+                 "conflicts": self.conflicts, "propagations": self.propagations,
+                 "restarts": self.restarts, "elapsed": time.monotonic() - self.start_time}
+        arrays = {"units": np.array(level_zero, dtype=np.int64),
+                  "blocked_lits": blocked_lits, "blocked_starts": blocked_starts,
+                  "learnt_lits": learnt_lits, "learnt_starts": learnt_starts,
+                  "learnt_lbd": np.array(self.learnt_lbd, dtype=np.int64),
+                  "activity": np.array(self.activity), "phase": np.array(self.phase, dtype=bool)}
+        return state, arrays
+
+    def restore_state(self, state, arrays) -> None:
+        """
+        Continues a search saved by `checkpoint_state` on the same formula:
+        adds its fixed literals, blocking and learned clauses, and takes over
+        its heuristic and counters. Must be called on a fresh search.
+        """
+        assert state["num_vars"] == self.num_vars and self.decision_level() == 0
+        for lit in arrays["units"].tolist():
+            self.add_clause([lit])
+        self.blocked = ragged_lists(arrays["blocked_lits"], arrays["blocked_starts"])
+        for clause in self.blocked:
+            self.add_clause(list(clause))
+        self.seed(zip(ragged_lists(arrays["learnt_lits"], arrays["learnt_starts"]),
+                      arrays["learnt_lbd"].tolist()))
+        self.shared = None # the saved units may come from clauses that are not shared
+        self.ok = self.ok and state["ok"]
+        self.activity = arrays["activity"].tolist()
+        self.phase = arrays["phase"].tolist()
+        self.var_inc = state["var_inc"]
+        self.max_learnts = state["max_learnts"]
+        self.rebuild_heap()
+        for key in ("decisions", "conflicts", "propagations", "restarts"):
+            setattr(self, key, state[key])
+        self.start_time = time.monotonic() - state["elapsed"]
+
+    def seed(self, clauses) -> None:
+        """
+        Adds (clause, lbd) pairs of internal literals as learned clauses, at
+        decision level 0. The clauses must follow from the formula, like the
+        clauses learned by an earlier search over the same one.
+        """
+        for clause, lbd in clauses:
+            before = len(self.learnts)
+            if not self.add_clause(list(clause), learnt=True):
+                return
+            if len(self.learnts) > before:
+                self.learnt_lbd.append(lbd)
+
+    def enumerate_models(self, max_models, block_vars=None, assumptions=()):
+        """
+        Yields up to `max_models` distinct models satisfying the `assumptions`
+        (internal literals), each as a list of True variables.
+        Stops early, with `self.stop_reason` set, if the budget runs out.
+        """
+        found = 0
+        while found < max_models and self.solve(assumptions):
+            found += 1
+            yield self.model()
+            if found < max_models and not self.block(block_vars):
+                return
@@ -0,0 +1,179 @@
+"""
+Checks the conflict driven search against brute force enumeration of the
+models of small random formulas, with exclusive groups and assumptions.
+"""
+import itertools
+import random
+
+from search import Search
+from clause_store import ClauseStore
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+
+def random_formula(rng, num_vars, num_clauses, max_length=4):
+    clauses = []
+    for _ in range(num_clauses):
+        vars = rng.sample(range(1, num_vars+1), rng.randint(1, min(max_length, num_vars)))
+        clauses.append([var if rng.random() < 0.5 else -var for var in vars])
+    return clauses
+
+def brute_force(num_vars, clauses, numstates=1, exclusive=False, assumptions=()):
+    models = set()
+    for values in itertools.product((False, True), repeat=num_vars):
+        if not all(any(values[abs(lit)-1] == (lit > 0) for lit in clause) for clause in clauses):
+            continue
+        if exclusive and any(sum(values[cell:cell+numstates]) > 1 for cell in range(0, num_vars, numstates)):
+            continue
+        if all(values[var] for var in assumptions):
+            models.add(tuple(var for var in range(num_vars) if values[var]))
+    return models
+
+def make_search(num_vars, clauses, numstates=1, exclusive_lookup=None, propagators=()):
+    store = ClauseStore()
+    for clause in clauses:
+        store.add_clause(clause)
+    return Search(num_vars, store.lits, store.starts, numstates, exclusive_lookup, propagators)
+
+class AtMostOne():
+    """
+    A propagator keeping at most one of its variables True, which forces the
+    others False from the first True one it hears about.
+    """
+
+    def __init__(self, vars):
+        self.vars = vars
+
+    def propagator_vars(self):
+        return self.vars
+
+    def attach_search(self, search):
+        self.true_vars = []
+
+    def propagate(self, assignment_delta):
+        self.true_vars.extend(lit-1 for lit in assignment_delta if lit > 0)
+        if not self.true_vars:
+            return []
+        return [-(var+1) for var in self.vars if var != self.true_vars[0]]
+
+    def explain(self, literal):
+        return [literal, -(self.true_vars[0]+1)]
+
+    def backtrack(self, undone):
+        for lit in undone:
+            if lit > 0:
+                self.true_vars.pop()
+
+def test_models_match_brute_force():
+    rng = random.Random(0)
+    for _ in range(60):
+        num_vars = rng.randint(3, 9)
+        clauses = random_formula(rng, num_vars, rng.randint(2, 4*num_vars))
+        expected = brute_force(num_vars, clauses)
+        search = make_search(num_vars, clauses)
+        found = [tuple(model) for model in search.enumerate_models(10**6)]
+        assert len(found) == len(set(found)) and set(found) == expected
+
+def test_exclusive_groups():
+    rng = random.Random(1)
+    numstates = 3
+    lookup = [[0, 1, 2]]*numstates
+    for _ in range(30):
+        num_vars = numstates*rng.randint(1, 3)
+        clauses = random_formula(rng, num_vars, rng.randint(1, 2*num_vars), 3)
+        expected = brute_force(num_vars, clauses, numstates, exclusive=True)
+        search = make_search(num_vars, clauses, numstates, lookup)
+        found = {tuple(model) for model in search.enumerate_models(10**6)}
+        assert found == expected
+
+def test_block_vars():
+    # models told apart by some of the variables only, with or without exclusive groups
+    rng = random.Random(3)
+    for numstates, lookup in ((1, None), (3, [[0, 1, 2]]*3)):
+        for _ in range(40):
+            num_vars = numstates*rng.randint(2, 3) if numstates > 1 else rng.randint(3, 8)
+            clauses = random_formula(rng, num_vars, rng.randint(1, 3*num_vars), 3)
+            block_vars = sorted(rng.sample(range(num_vars), rng.randint(1, num_vars)))
+            expected = {tuple(var for var in model if var in block_vars)
+                        for model in brute_force(num_vars, clauses, numstates, lookup is not None)}
+            search = make_search(num_vars, clauses, numstates, lookup)
+            found = [tuple(var for var in model if var in block_vars)
+                     for model in search.enumerate_models(10**6, block_vars)]
+            assert len(found) == len(set(found)) and set(found) == expected
+
+def test_solutions_are_boards():
+    # one filled Nurikabe board has many models, which differ in the auxiliary
+    # states of the connectivity rules, but is a single solution
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    solver = CNFSolver(board, [rule])
+    boards = [str(sol.layout.to_board(sol, board).data)
+              for sol in solver.solve(max_sols=100, quiet=True) if sol is not None]
+    assert len(boards) == len(set(boards)) == 4
+    models = list(solver.make_search().enumerate_models(50))
+    layout = solver.solution_layout(True)
+    assert len({str(layout.to_board(layout.pack(model), board).data) for model in models}) < 50
+    board, rule = parse_sudoku_line("."*16)
+    solver = CNFSolver(board, [rule])
+    block_vars = solver.block_vars()
+    assert len(block_vars) == 64 and len(list(solver.solve(max_sols=1000, quiet=True))) == 288
+    search = solver.make_search()
+    search.solve()
+    search.block(block_vars)
+    assert len(search.blocked[0]) == 16 # one digit per cell, the others are exclusive with it
+
+def test_assumptions():
+    rng = random.Random(2)
+    for _ in range(30):
+        num_vars = rng.randint(3, 8)
+        clauses = random_formula(rng, num_vars, rng.randint(2, 3*num_vars))
+        search = make_search(num_vars, clauses)
+        for _ in range(3):
+            assumed = rng.sample(range(num_vars), rng.randint(1, 2))
+            expected = brute_force(num_vars, clauses, assumptions=assumed)
+            if not expected:
+                assert not search.solve([2*var for var in assumed])
+                continue
+            assert search.solve([2*var for var in assumed])
+            assert tuple(search.model()) in expected
+        # failing under assumptions proves nothing about the formula itself
+        assert search.solve() == bool(brute_force(num_vars, clauses))
+
+def test_propagators():
+    # overlapping propagators, so that a conflict raised by one of them happens
+    # while others still have assignments to hear about
+    rng = random.Random(4)
+    for _ in range(60):
+        num_vars = rng.randint(4, 8)
+        clauses = random_formula(rng, num_vars, rng.randint(1, 2*num_vars), 3)
+        groups = [rng.sample(range(num_vars), 3) for _ in range(3)]
+        at_most_one = [[-(first+1), -(second+1)] for group in groups
+                       for first, second in itertools.combinations(group, 2)]
+        expected = brute_force(num_vars, clauses + at_most_one)
+        search = make_search(num_vars, clauses, propagators=[AtMostOne(group) for group in groups])
+        found = [tuple(model) for model in search.enumerate_models(10**6)]
+        assert len(found) == len(set(found)) and set(found) == expected
+    # both propagators hear about the givens, though the first one conflicts
+    first, second = AtMostOne([0, 1]), AtMostOne([1, 0, 2])
+    search = make_search(3, [[1], [2]], propagators=[first, second])
+    assert search.solve() is False
+    assert [sorted(lit for _, lit in delivered) for delivered in search.delivered] == [[0, 2], [0, 2]]
+
+def test_pigeonhole():
+    # 6 pigeons in 5 holes takes learned clauses and a restart to refute
+    pigeons, holes = 6, 5
+    var = lambda pigeon, hole: pigeon*holes + hole + 1
+    clauses = [[var(pigeon, hole) for hole in range(holes)] for pigeon in range(pigeons)]
+    for hole in range(holes):
+        for first, second in itertools.combinations(range(pigeons), 2):
+            clauses.append([-var(first, hole), -var(second, hole)])
+    search = make_search(pigeons*holes, clauses)
+    assert search.solve() is False and search.restarts > 0 and search.learnts
+
+if __name__ == "__main__":
+    test_models_match_brute_force()
+    test_exclusive_groups()
+    test_block_vars()
+    test_solutions_are_boards()
+    test_assumptions()
+    test_propagators()
+    test_pigeonhole()
+    print("All search tests passed")
@@ -0,0 +1,428 @@
+# A small asyncio HTTP/JSON service for solving puzzles.
+# Requests are queued in a bounded queue and dispatched to a fixed pool
+# of worker processes, so one slow puzzle never blocks the others.
+#
+# POST /solve with a JSON body
+#     {"type": "sudoku" | "nurikabe", "puzzle": "<text>", "max_sols": 1, "deadline": 5.0}
+#   where the puzzle text is in the format of `puzzle_formats` and the
+#   deadline (seconds, optional) covers both queueing and solving. Answers
+#     {"status": "solved" | "unsat", "count": n, "solutions": ["<text>", ...], "elapsed": s}
+#   or an error status: "busy" (503, queue full), "timeout" (504, deadline
+#   passed; the search stops itself at the deadline, and a worker that does
+#   not answer shortly after is replaced) or "error" (400, the request or
+#   puzzle could not be parsed). Solved and timed out answers carry the
+#   search statistics under "stats". With --cache, puzzles seen before
+#   (up to symmetry) are answered from the cache and marked "cached".
+# POST /verify with a JSON body
+#     {"type": "sudoku" | "nurikabe", "puzzle": "<text>", "solution": "<text>"}
+#   checks a filled board (in the format solutions are returned in) against
+#   the puzzle directly, without search, so it is answered without going
+#   through the worker pool. Answers {"status": "valid"} or
+#     {"status": "invalid", "rule": "<rule class>", "message": "...", "cells": [[row, col], ...]}
+# GET /stats returns request counters, the queue depth and latency
+#   histograms per status.
+#
+# Usage: python service.py [--host 127.0.0.1] [--port 8000] [--workers 4] [--queue-size 64]
+#                          [--cache solutions.db]
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from bisect import bisect_left
+
+from sat_solver import Unknown
+from exact_cover import make_solver
+from puzzle_formats import PARSERS, FORMATTERS, PuzzleFormatError, parse_solution
+from verify import verify
+from solution_cache import SolutionCache
+from learned_pool import LearnedClausePool
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 503: "Service Unavailable", 504: "Gateway Timeout"}
+MAX_BODY_SIZE = 1 << 20
+DEADLINE_GRACE = 0.5 # seconds a worker gets past the deadline before it is replaced
+
+
+def solve_request(puzzle_type, puzzle, max_sols=1, timeout=None, cache=None, pool=None):
+    """
+    Parses and solves one puzzle, giving up after `timeout` seconds.
+    If a `SolutionCache` is given, the puzzle (or a symmetric variant of it)
+    is looked up there first, and the solutions of completed searches are
+    stored in it. A `LearnedClausePool` shares learned clauses between
+    puzzles of the same structure. Returns a JSON-serializable result dictionary.
+    """
+    if puzzle_type not in PARSERS:
+        raise PuzzleFormatError(f"unknown puzzle type {puzzle_type!r}")
+    record = puzzle.strip() if puzzle_type == "sudoku" else puzzle.strip("\n").split("\n")
+    board, rule = PARSERS[puzzle_type](record)
+    if cache is not None:
+        cached = cache.lookup(puzzle_type, board, max_sols)
+        if cached is not None:
+            texts = [FORMATTERS[puzzle_type](solved) for solved in cached]
+            return {"status": "solved" if texts else "unsat", "count": len(texts),
+                    "solutions": texts, "stats": {}, "cached": True}
+    solver = make_solver(board, [rule])
+    results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True, timeout=timeout, pool=pool)
+               if sol is not None]
+    solved = [solver.layout.to_board(sol, board) for sol in results if not isinstance(sol, Unknown)]
+    texts = [FORMATTERS[puzzle_type](solved_board) for solved_board in solved]
+    if texts:
+        status = "solved"
+    else:
+        status = "timeout" if results else "unsat"
+    if cache is not None and len(solved) == len(results):
+        cache.store(puzzle_type, board, solved, max_sols)
+    return {"status": status, "count": len(texts), "solutions": texts, "stats": solver.stats}
+
+
+def verify_request(puzzle_type, puzzle, solution):
+    """
+    Checks a filled board against a puzzle without search.
+    Returns a JSON-serializable result dictionary.
+    """
+    if puzzle_type not in PARSERS:
+        raise PuzzleFormatError(f"unknown puzzle type {puzzle_type!r}")
+    record = puzzle.strip() if puzzle_type == "sudoku" else puzzle.strip("\n").split("\n")
+    board, rule = PARSERS[puzzle_type](record)
+    violation = verify(parse_solution(puzzle_type, solution, board), rule)
+    if violation is None:
+        return {"status": "valid"}
+    return {"status": "invalid", "rule": violation.rule.__class__.__name__,
+            "message": violation.message, "cells": [list(cell) for cell in violation.cells]}
+
+
+def worker_main(conn, cache_path=None) -> None:
+    """
+    Entry point of a worker process: answers jobs from `conn` until it is closed.
+    With a `cache_path`, solutions are cached in memory and in the SQLite
+    database at that path, which all workers share. Every worker keeps a
+    pool of learned clauses for the puzzle structures it has seen.
+    """
+    cache = SolutionCache(cache_path) if cache_path is not None else None
+    pool = LearnedClausePool()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = solve_request(job["type"], job["puzzle"], job.get("max_sols", 1),
+                                   job.get("timeout"), cache, pool)
+        except (PuzzleFormatError, KeyError, TypeError, ValueError, AssertionError) as error:
+            result = {"status": "error", "message": str(error)}
+        conn.send(result)
+
+
+class LatencyHistogram():
+    """
+    Counts latencies in fixed, roughly logarithmic buckets (in seconds).
+    """
+    bounds = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+    def __init__(self) -> None:
+        self.counts = [0]*(len(self.bounds)+1) # the last bucket is everything slower
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Returns the upper bound of the bucket holding the q-th quantile,
+        or None if nothing was observed (or it falls in the overflow bucket).
+        """
+        if self.count == 0:
+            return None
+        target = q*self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {"count": self.count, "sum": self.total, "buckets": buckets,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99)}
+
+
+class Worker():
+    """
+    One worker process and the pipe used to talk to it.
+    """
+
+    def __init__(self, context, cache_path=None) -> None:
+        self.context = context
+        self.cache_path = cache_path
+        self.start()
+
+    def start(self) -> None:
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=worker_main, args=(child_conn, self.cache_path),
+                                            daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def restart(self) -> None:
+        """
+        Kills the worker (cancelling whatever it was solving) and starts a fresh one.
+        """
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+        self.start()
+
+    def close(self) -> None:
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+
+    async def run(self, job, timeout):
+        """
+        Sends a job to the worker and waits at most `timeout` seconds for its
+        result. On timeout the worker is restarted and TimeoutError is raised.
+        A worker that died while idle is restarted and gets the job instead;
+        if the worker dies after that, it is restarted and EOFError or OSError
+        is raised.
+        """
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_readable():
+            loop.remove_reader(fd)
+            try:
+                result.set_result(self.conn.recv())
+            except (EOFError, OSError) as error: # the worker died
+                result.set_exception(error)
+
+        if not self.process.is_alive(): # the worker died while idle
+            self.restart()
+        try:
+            self.conn.send(job)
+        except OSError: # it died since the check: give a fresh one a single try
+            self.restart()
+            try:
+                self.conn.send(job)
+            except OSError:
+                self.restart()
+                raise
+        loop.add_reader(fd, on_readable)
+        try:
+            return await asyncio.wait_for(result, timeout)
+        except (asyncio.TimeoutError, EOFError, OSError):
+            loop.remove_reader(fd)
+            self.restart()
+            raise
+
+
+class SolveService():
+    """
+    The HTTP server, its request queue and its pool of workers.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, workers=2, queue_size=64, default_deadline=30.0,
+                 cache_path=None):
+        """
+        Args:
+            host, port: address to listen on; port 0 picks a free port
+            workers: number of worker processes
+            queue_size: number of requests that may wait for a worker before
+                new ones are turned away with "busy"
+            default_deadline: deadline in seconds for requests that do not give one
+            cache_path: SQLite file caching solutions across workers and restarts,
+                or None to solve every request
+        """
+        self.host, self.port = host, port
+        self.num_workers = workers
+        self.queue_size = queue_size
+        self.default_deadline = default_deadline
+        self.cache_path = cache_path
+        self.histograms = {}
+        self.counters = {}
+        self.server = None
+
+    async def start(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [Worker(context, self.cache_path) for _ in range(self.num_workers)]
+        self.dispatchers = [asyncio.create_task(self.dispatch(worker)) for worker in self.workers]
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        for worker in self.workers:
+            worker.close()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def dispatch(self, worker) -> None:
+        """
+        Feeds queued jobs to one worker, one at a time.
+        """
+        while True:
+            job, deadline, reply = await self.queue.get()
+            remaining = deadline - time.monotonic()
+            try:
+                if reply.cancelled():
+                    continue # the caller already gave up
+                if remaining <= 0:
+                    reply.cancel()
+                    continue
+                job["timeout"] = remaining
+                result = await worker.run(job, remaining + DEADLINE_GRACE)
+                if not reply.done():
+                    reply.set_result(result)
+            except asyncio.TimeoutError:
+                pass # the caller times out on the same deadline
+            except (EOFError, OSError) as error: # the worker died, and has been restarted
+                if not reply.done():
+                    reply.set_exception(error)
+            finally:
+                self.queue.task_done()
+
+    def record(self, status: str, seconds: float) -> None:
+        self.counters[status] = self.counters.get(status, 0) + 1
+        self.histograms.setdefault(status, LatencyHistogram()).observe(seconds)
+
+    async def submit(self, request: dict) -> tuple[int, dict]:
+        """
+        Queues a solve request and waits for its result.
+        Returns an (HTTP status code, JSON body) pair.
+        """
+        start = time.monotonic()
+        deadline = start + float(request.get("deadline", self.default_deadline))
+        job = {"type": request["type"], "puzzle": request["puzzle"],
+               "max_sols": int(request.get("max_sols", 1))}
+        reply = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((job, deadline, reply))
+        except asyncio.QueueFull:
+            return 503, {"status": "busy", "message": "the request queue is full"}
+        try:
+            result = await asyncio.wait_for(asyncio.shield(reply),
+                                            max(deadline - time.monotonic(), 0) + DEADLINE_GRACE)
+        except asyncio.TimeoutError:
+            reply.cancel()
+            return 504, {"status": "timeout", "elapsed": time.monotonic() - start}
+        except (EOFError, OSError):
+            return 500, {"status": "error", "message": "the worker process died"}
+        result["elapsed"] = time.monotonic() - start
+        return {"error": 400, "timeout": 504}.get(result["status"], 200), result
+
+    def stats(self) -> dict:
+        return {"counters": self.counters,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue_size,
+                "workers": self.num_workers,
+                "latency": {status: hist.snapshot() for status, hist in self.histograms.items()}}
+
+    async def handle_connection(self, reader, writer) -> None:
+        try:
+            code, body = await self.handle_request(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, UnicodeDecodeError) as error:
+            code, body = 400, {"status": "error", "message": f"malformed request: {error}"}
+        payload = json.dumps(body).encode()
+        reason = HTTP_REASONS.get(code, "Internal Server Error")
+        writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def handle_request(self, reader) -> tuple[int, dict]:
+        request_line = (await reader.readline()).decode().split()
+        if len(request_line) != 3:
+            raise ValueError("bad request line")
+        method, path, _ = request_line
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        if path == "/stats":
+            if method != "GET":
+                return 405, {"status": "error", "message": "use GET for /stats"}
+            return 200, self.stats()
+        if path not in ("/solve", "/verify"):
+            return 404, {"status": "error", "message": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"status": "error", "message": f"use POST for {path}"}
+        if path == "/verify":
+            start = time.monotonic()
+            try:
+                request = json.loads(body)
+                code, result = 200, verify_request(request["type"], request["puzzle"],
+                                                   request["solution"])
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                code, result = 400, {"status": "error", "message": f"bad verify request: {error}"}
+            result["elapsed"] = time.monotonic() - start
+            self.record(result["status"], result["elapsed"])
+            return code, result
+        start = time.monotonic()
+        try:
+            request = json.loads(body)
+            code, result = await self.submit(request)
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            code, result = 400, {"status": "error", "message": f"bad solve request: {error}"}
+        self.record(result["status"], time.monotonic() - start)
+        return code, result
+
+
+async def http_request(host, port, method, path, body=None) -> tuple[int, dict]:
+    """
+    Minimal HTTP/JSON client, for tests and scripts. Returns (status code, JSON body).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    code = int(head.split(b" ", 2)[1])
+    return code, json.loads(content)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve puzzle solving over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--deadline", type=float, default=30.0,
+                        help="default per-request deadline in seconds")
+    parser.add_argument("--cache", default=None,
+                        help="SQLite file caching solutions of repeated and symmetric puzzles")
+    args = parser.parse_args(argv)
+    service = SolveService(args.host, args.port, args.workers, args.queue_size, args.deadline,
+                           args.cache)
+    asyncio.run(service.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Runs the solving service on localhost and checks solving, verification,
+deadlines, backpressure and the statistics endpoint.
+"""
+import asyncio
+from service import SolveService, http_request
+
+easy_sudoku = "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61"
+empty_16x16 = "." * 256
+nurikabe = "...2\n....\n....\n3.2.\n"
+
+async def run_checks():
+    service = SolveService(workers=2, queue_size=2)
+    await service.start()
+    host, port = service.host, service.port
+    try:
+        code, body = await http_request(host, port, "POST", "/solve",
+                                        {"type": "sudoku", "puzzle": easy_sudoku})
+        assert code == 200 and body["status"] == "solved", body
+        assert body["solutions"][0].startswith("918745632")
+        code, body = await http_request(host, port, "POST", "/solve",
+                                        {"type": "nurikabe", "puzzle": nurikabe, "max_sols": 2})
+        assert code == 200 and body["count"] == 1 and body["solutions"][0] == "xx.2\n.xxx\n.x.x\n3x2x"
+        code, body = await http_request(host, port, "POST", "/verify",
+                                        {"type": "nurikabe", "puzzle": nurikabe,
+                                         "solution": "xx.2\n.xxx\n.x.x\n3x2x"})
+        assert code == 200 and body["status"] == "valid", body
+        code, body = await http_request(host, port, "POST", "/verify",
+                                        {"type": "nurikabe", "puzzle": nurikabe,
+                                         "solution": "xx.2\n.xxx\n.xxx\n3x2x"})
+        assert code == 200 and body["status"] == "invalid" and body["cells"] == [[3, 2]], body
+        code, body = await http_request(host, port, "POST", "/solve",
+                                        {"type": "sudoku", "puzzle": "123"})
+        assert code == 400 and body["status"] == "error"
+        # a search past its deadline is cancelled, and its worker replaced
+        code, body = await http_request(host, port, "POST", "/solve",
+                                        {"type": "sudoku", "puzzle": empty_16x16,
+                                         "max_sols": 10**6, "deadline": 0.5})
+        assert code == 504 and body["status"] == "timeout"
+        # more slow requests than workers plus queue slots are turned away
+        slow = {"type": "sudoku", "puzzle": empty_16x16, "max_sols": 10**6, "deadline": 2}
+        results = await asyncio.gather(*[http_request(host, port, "POST", "/solve", slow)
+                                         for _ in range(6)])
+        codes = sorted(code for code, _ in results)
+        assert codes.count(503) >= 2 and codes.count(504) >= 2, codes
+        # the pool still works afterwards
+        code, body = await http_request(host, port, "POST", "/solve",
+                                        {"type": "sudoku", "puzzle": easy_sudoku})
+        assert code == 200 and body["status"] == "solved"
+        # a worker that died while idle is replaced before it gets the request
+        for worker in service.workers:
+            worker.process.kill()
+            worker.process.join()
+        codes = []
+        for _ in range(4):
+            code, body = await http_request(host, port, "POST", "/solve",
+                                            {"type": "sudoku", "puzzle": easy_sudoku, "deadline": 5})
+            codes.append(code)
+        assert codes == [200, 200, 200, 200], codes
+        code, stats = await http_request(host, port, "GET", "/stats")
+        assert stats["counters"]["solved"] == 7 and stats["latency"]["timeout"]["count"] >= 3
+    finally:
+        await service.close()
+
+def test_service():
+    asyncio.run(run_checks())
+
+if __name__ == "__main__":
+    test_service()
+    print("All service tests passed")
@@ -0,0 +1,234 @@
+# Caches puzzle solutions under a canonical form of the puzzle, so that
+# repeated puzzles and their symmetric variants are only solved once.
+#
+# A puzzle is mapped to every variant in its symmetry group: the rotations,
+# reflections and transpositions of the grid that keep it a puzzle of the
+# same kind and, for Sudoku, any relabelling of the digits. The canonical
+# form is the smallest variant, found with one candidate per geometric
+# transform: relabelling the digits in order of first appearance (row by
+# row) gives the smallest variant among all relabellings at once. At most
+# eight candidates are compared, whatever the number of digits.
+#
+# Solutions are stored in the frame of the canonical form and mapped back
+# through the inverse transform on lookup. Entries live in an in-memory LRU
+# tier and, if a path is given, in a SQLite database shared by every
+# process that opens it.
+
+from collections import OrderedDict
+import copy
+import json
+import sqlite3
+
+import numpy as np
+
+from exact_cover import make_solver
+from search import Unknown
+from puzzle_formats import sudoku_box_shape
+
+# the eight symmetries of a rectangle, as (transform, inverse) pairs
+TRANSFORMS = [
+    (lambda grid: grid, lambda grid: grid),
+    (lambda grid: np.rot90(grid, 1), lambda grid: np.rot90(grid, -1)),
+    (lambda grid: np.rot90(grid, 2), lambda grid: np.rot90(grid, 2)),
+    (lambda grid: np.rot90(grid, 3), lambda grid: np.rot90(grid, -3)),
+    (lambda grid: grid[::-1, :], lambda grid: grid[::-1, :]),
+    (lambda grid: grid[:, ::-1], lambda grid: grid[:, ::-1]),
+    (lambda grid: grid.T, lambda grid: grid.T),
+    (lambda grid: grid[::-1, ::-1].T, lambda grid: grid[::-1, ::-1].T),
+]
+KEEP_SHAPE = [0, 2, 4, 5] # the transforms that never swap rows and columns
+
+
+def symmetries(puzzle_type: str, board) -> tuple[list[int], bool]:
+    """
+    Returns the symmetry group of a puzzle as (indices into TRANSFORMS,
+    whether the states can be relabelled).
+    """
+    if puzzle_type == "sudoku":
+        box_height, box_width = sudoku_box_shape(board.height)
+        # a quarter turn or transposition turns the boxes sideways
+        return (list(range(8)) if box_height == box_width else KEEP_SHAPE), True
+    if puzzle_type == "nurikabe":
+        return list(range(8)), False
+    raise ValueError(f"unknown puzzle type {puzzle_type!r}")
+
+
+def state_grid(board) -> np.ndarray:
+    """
+    Returns the cells of a board as codes: 0 for an empty cell, and one plus
+    the index of the state in `board.visible_states` otherwise.
+    """
+    lookup = np.array([board.visible_states.index(state)+1 if state in board.visible_states else 0
+                       for state in board.symbols] + [0]) # grid code -1 maps to 0
+    return lookup[board.grid]
+
+
+def number_grid(board) -> np.ndarray:
+    """
+    Returns the clue numbers of a board (constraints["numbers"]) as a grid, 0 without a clue.
+    """
+    grid = np.zeros((board.height, board.width), dtype=np.int64)
+    for (row, col), num in board.constraints.get("numbers", {}).items():
+        grid[row, col] = num
+    return grid
+
+
+def first_appearance(codes: np.ndarray, num_states: int) -> np.ndarray:
+    """
+    Returns the relabelling (a lookup table indexed by code) that numbers the
+    states of `codes` in order of first appearance, with the states that do
+    not appear after them in their original order. Code 0 stays 0.
+    """
+    flat = codes.ravel()
+    present = flat[flat > 0]
+    labels, first = np.unique(present, return_index=True)
+    order = labels[np.argsort(first)].tolist()
+    order += [code for code in range(1, num_states+1) if code not in set(order)]
+    mapping = np.zeros(num_states+1, dtype=np.int64)
+    mapping[order] = np.arange(1, num_states+1)
+    return mapping
+
+
+class CanonicalForm():
+    """
+    The canonical form of one puzzle, and the transform leading to it.
+    """
+
+    def __init__(self, puzzle_type: str, board) -> None:
+        self.puzzle_type = puzzle_type
+        self.board = board
+        transforms, relabel = symmetries(puzzle_type, board)
+        num_states = len(board.visible_states)
+        givens, numbers = state_grid(board), number_grid(board)
+        best = None
+        for idx in transforms:
+            forward = TRANSFORMS[idx][0]
+            moved = forward(givens)
+            mapping = first_appearance(moved, num_states) if relabel else np.arange(num_states+1)
+            candidate = (moved.shape, mapping[moved].astype(np.uint8).tobytes(),
+                         forward(numbers).astype(np.int32).tobytes())
+            if best is None or candidate < best[0]:
+                best = (candidate, idx, mapping)
+        (shape, cells, clues), self.transform, self.mapping = best
+        self.shape = shape
+        self.key = f"{puzzle_type}:{shape[0]}x{shape[1]}:{cells.hex()}:{clues.hex()}"
+
+    def to_canonical(self, solved) -> list[int]:
+        """
+        Returns a solved board of the puzzle in the canonical frame, as a flat list of codes.
+        """
+        return self.mapping[TRANSFORMS[self.transform][0](state_grid(solved))].ravel().tolist()
+
+    def from_canonical(self, codes: list[int]):
+        """
+        Returns the solved board of the puzzle given in the canonical frame by `codes`.
+        """
+        inverse = np.argsort(self.mapping) # mapping is a permutation fixing 0
+        grid = TRANSFORMS[self.transform][1](inverse[np.array(codes).reshape(self.shape)])
+        lookup = [None] + list(self.board.visible_states)
+        solved = copy.copy(self.board)
+        solved.data = [[lookup[code] for code in row] for row in grid.tolist()]
+        return solved
+
+
+class SolutionCache():
+    """
+    Solutions of puzzles by canonical form, in an LRU tier and an optional SQLite tier.
+    """
+
+    def __init__(self, path=None, capacity=1024) -> None:
+        """
+        Args:
+            path: SQLite database file for the persistent tier, or None to
+                only keep entries in memory
+            capacity: number of entries kept in the in-memory tier
+        """
+        self.capacity = capacity
+        self.memory = OrderedDict() # key: (solutions in the canonical frame, complete)
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions "
+                            "(key TEXT PRIMARY KEY, solutions TEXT, complete INTEGER)")
+            self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def remember(self, key, entry) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def entry(self, key):
+        """
+        Returns the (solutions, complete) entry of a canonical key, or None.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT solutions, complete FROM solutions WHERE key = ?",
+                              (key,)).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), bool(row[1]))
+        self.remember(key, entry)
+        return entry
+
+    def lookup(self, puzzle_type, board, max_sols=1):
+        """
+        Returns up to `max_sols` solved boards of a puzzle from the cache, as
+        many as solving it would find (an empty list if it has no solution),
+        or None if the cache cannot tell.
+        """
+        form = CanonicalForm(puzzle_type, board)
+        entry = self.entry(form.key)
+        if entry is None or (not entry[1] and len(entry[0]) < max_sols):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [form.from_canonical(codes) for codes in entry[0][:max_sols]]
+
+    def store(self, puzzle_type, board, solutions, max_sols) -> None:
+        """
+        Stores the solved boards found when solving a puzzle for at most `max_sols` solutions.
+        """
+        form = CanonicalForm(puzzle_type, board)
+        complete = len(solutions) < max_sols # every solution was found
+        old = self.entry(form.key)
+        if old is not None and (old[1] or len(old[0]) >= len(solutions)):
+            return
+        entry = ([form.to_canonical(solved) for solved in solutions], complete)
+        self.remember(form.key, entry)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+                            (form.key, json.dumps(entry[0]), int(complete)))
+            self.db.commit()
+
+    def solve(self, puzzle_type, board, rule, max_sols=1, **solve_args):
+        """
+        Returns up to `max_sols` solved boards of a puzzle, from the cache if
+        possible and otherwise from the solver `make_solver` picks, whose
+        results are cached. If the search stops early (see `CNFSolver.solve`),
+        the solutions found so far are returned followed by the `Unknown`
+        result, and nothing is cached.
+        """
+        cached = self.lookup(puzzle_type, board, max_sols)
+        if cached is not None:
+            return cached
+        solver = make_solver(board, [rule])
+        results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True, **solve_args)
+                   if sol is not None]
+        solutions = [solver.layout.to_board(sol, board) for sol in results
+                     if not isinstance(sol, Unknown)]
+        if len(solutions) < len(results):
+            return solutions + [results[-1]]
+        self.store(puzzle_type, board, solutions, max_sols)
+        return solutions
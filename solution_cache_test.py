@@ -0,0 +1,89 @@
+"""
+Checks that the solution cache recognizes repeated and symmetric puzzles,
+maps their solutions back correctly, and keeps entries on disk.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from solution_cache import SolutionCache, CanonicalForm
+from verify import verify
+
+easy_sudoku = "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61"
+
+def sudoku_variant(line, transpose, relabel):
+    size = int(len(line) ** 0.5)
+    grid = np.array(list(line)).reshape(size, size)
+    grid = grid.T if transpose else grid[::-1, ::-1]
+    return "".join(relabel.get(char, char) for char in grid.ravel())
+
+def test_sudoku_variants():
+    cache = SolutionCache()
+    board, rule = parse_sudoku_line(easy_sudoku)
+    first = cache.solve("sudoku", board, rule)
+    assert len(first) == 1 and cache.misses == 1
+    relabel = {str(digit): str(10-digit) for digit in range(1, 10)}
+    for transpose in (False, True):
+        variant, variant_rule = parse_sudoku_line(sudoku_variant(easy_sudoku, transpose, relabel))
+        assert CanonicalForm("sudoku", variant).key == CanonicalForm("sudoku", board).key
+        solutions = cache.solve("sudoku", variant, variant_rule)
+        assert len(solutions) == 1 and verify(solutions[0], variant_rule) is None
+    assert cache.hits == 2 and cache.misses == 1
+
+def test_non_square_boxes():
+    # transposing a 6x6 Sudoku turns its 2x3 boxes into 3x2 boxes
+    line = ".1" + "."*34
+    board, _ = parse_sudoku_line(line)
+    turned, _ = parse_sudoku_line(sudoku_variant(line, True, {}))
+    flipped, _ = parse_sudoku_line(sudoku_variant(line, False, {}))
+    assert CanonicalForm("sudoku", board).key != CanonicalForm("sudoku", turned).key
+    assert CanonicalForm("sudoku", board).key == CanonicalForm("sudoku", flipped).key
+
+def test_nurikabe_and_counts():
+    cache = SolutionCache(capacity=1)
+    rows = ["2..", "...", "..2"]
+    board, rule = parse_nurikabe_block(rows)
+    assert len(cache.solve("nurikabe", board, rule, max_sols=1)) == 1
+    # one solution found does not tell how many there are
+    assert cache.lookup("nurikabe", board, max_sols=5) is None
+    assert len(cache.solve("nurikabe", board, rule, max_sols=5)) == 2
+    turned_rows = ["".join(row) for row in np.rot90(np.array([list(row) for row in rows]))]
+    turned, turned_rule = parse_nurikabe_block(turned_rows)
+    solutions = cache.lookup("nurikabe", turned, max_sols=5)
+    assert len(solutions) == 2
+    assert all(verify(solved, turned_rule) is None for solved in solutions)
+    # the in-memory tier only keeps the most recent entry
+    other, other_rule = parse_nurikabe_block(["1..", "...", "..1"])
+    assert cache.solve("nurikabe", other, other_rule) == [] # 2x2 pools everywhere
+    assert cache.lookup("nurikabe", other) == []
+    assert cache.lookup("nurikabe", board, max_sols=5) is None
+
+def test_persistent_tier():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "solutions.db")
+        cache = SolutionCache(path)
+        board, rule = parse_sudoku_line(easy_sudoku)
+        cache.solve("sudoku", board, rule)
+        cache.close()
+        reopened = SolutionCache(path)
+        solutions = reopened.lookup("sudoku", board)
+        assert len(solutions) == 1 and verify(solutions[0], rule) is None
+        reopened.close()
+
+def test_service_requests():
+    from service import solve_request
+    cache = SolutionCache()
+    first = solve_request("sudoku", easy_sudoku, cache=cache)
+    again = solve_request("sudoku", easy_sudoku, cache=cache)
+    assert "cached" not in first and again["cached"]
+    assert again["solutions"] == first["solutions"]
+
+if __name__ == "__main__":
+    test_sudoku_variants()
+    test_non_square_boxes()
+    test_nurikabe_and_counts()
+    test_persistent_tier()
+    test_service_requests()
+    print("All solution cache tests passed")
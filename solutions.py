@@ -0,0 +1,175 @@
+# Compact storage for the solutions found by the solver.
+# A solution is kept as a packed bitset of the variables that are
+# True, optionally restricted to the variables of visible states,
+# and only turned back into a grid when somebody asks for one.
+
+import copy
+import numpy as np
+
+
+class PackedSolution():
+    """
+    A single solution stored as a packed bitset. Bit i is set if the
+    i-th tracked variable of `layout` is True. Use the layout to decode it.
+    """
+    __slots__ = ("bits", "layout")
+
+    def __init__(self, bits: bytes, layout: "SolutionLayout") -> None:
+        self.bits = bits
+        self.layout = layout
+
+    def __getitem__(self, var: int) -> bool:
+        bit = self.layout.bit_of_var(var)
+        if bit is None:
+            raise KeyError(var)
+        return bool(self.bits[bit >> 3] & (0x80 >> (bit & 7)))
+
+    def __contains__(self, var: int) -> bool:
+        return self.layout.bit_of_var(var) is not None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PackedSolution) and self.bits == other.bits
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def __repr__(self) -> str:
+        return f"PackedSolution({len(self.bits)} bytes, {len(self.true_vars())} true vars)"
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def true_vars(self) -> np.ndarray:
+        """
+        Returns a sorted array of all tracked variables that are True.
+        """
+        return self.layout.true_vars(self)
+
+    def to_dict(self) -> dict[int, bool]:
+        """
+        Returns the {var: literal} dictionary representation of the
+        solution over every tracked variable.
+        """
+        bits = self.layout.unpack(self)
+        return dict(zip(self.layout.tracked_vars().tolist(), bits.tolist()))
+
+
+class SolutionLayout():
+    """
+    Describes how variables of a solver map onto bits of a `PackedSolution`
+    and onto cells of the board. Variables follow the solver numbering,
+    (width*row + col)*numstates + state.
+    """
+
+    def __init__(self, height, width, states, visible_states=None, visible_only=False):
+        """
+        Args:
+            height, width: dimensions of the board
+            states: list of state names, indices are the internal state numbers
+            visible_states: names of the states that are drawn on the board
+            visible_only: if True, only variables of visible states are stored
+        """
+        if visible_states is None:
+            visible_states = []
+        self.height, self.width = height, width
+        self.states = list(states)
+        self.numstates = len(self.states)
+        self.num_vars = height*width*self.numstates
+        self.visible_only = visible_only
+        self.is_visible_state = np.array([state in visible_states for state in self.states], dtype=bool)
+        self.state_names = np.array(self.states, dtype=object)
+        if visible_only:
+            mask = np.tile(self.is_visible_state, height*width)
+            self._tracked = np.flatnonzero(mask)
+        else:
+            self._tracked = None
+        self.num_bits = self.num_vars if self._tracked is None else len(self._tracked)
+
+    def tracked_vars(self) -> np.ndarray:
+        """
+        Returns the variables stored in each bit, in bit order.
+        """
+        if self._tracked is None:
+            return np.arange(self.num_vars)
+        return self._tracked
+
+    def bit_of_var(self, var: int) -> int | None:
+        """
+        Returns the bit index a variable is stored in, or None if the
+        variable is not tracked by this layout.
+        """
+        if not 0 <= var < self.num_vars:
+            return None
+        if self._tracked is None:
+            return var
+        if not self.is_visible_state[var % self.numstates]:
+            return None
+        return int(np.searchsorted(self._tracked, var))
+
+    def pack(self, true_vars) -> PackedSolution:
+        """
+        Packs an iterable of variables that are True into a solution.
+        Variables that are not tracked are ignored.
+        """
+        true_vars = np.fromiter(true_vars, dtype=np.int64)
+        bits = np.zeros(self.num_bits, dtype=bool)
+        if self._tracked is None:
+            bits[true_vars] = True
+        else:
+            true_vars = true_vars[self.is_visible_state[true_vars % self.numstates]]
+            bits[np.searchsorted(self._tracked, true_vars)] = True
+        return PackedSolution(np.packbits(bits).tobytes(), self)
+
+    def pack_assignment(self, assignment: dict[int, bool]) -> PackedSolution:
+        """
+        Packs a {var: literal} dictionary into a solution.
+        """
+        return self.pack(var for var, literal in assignment.items() if literal)
+
+    def unpack(self, solution: PackedSolution) -> np.ndarray:
+        """
+        Returns a boolean array with one entry per tracked variable.
+        """
+        packed = np.frombuffer(solution.bits, dtype=np.uint8)
+        return np.unpackbits(packed, count=self.num_bits).astype(bool)
+
+    def true_vars(self, solution: PackedSolution) -> np.ndarray:
+        return self.tracked_vars()[self.unpack(solution)]
+
+    def to_grids(self, solutions: list[PackedSolution]) -> np.ndarray:
+        """
+        Decodes a list of solutions at once. Returns an object array of shape
+        (len(solutions), height, width) holding the visible state of each cell,
+        or None where no visible state is True.
+        """
+        num_cells = self.height*self.width
+        out = np.full((len(solutions), num_cells), None, dtype=object)
+        if solutions:
+            packed = np.frombuffer(b"".join(sol.bits for sol in solutions), dtype=np.uint8)
+            packed = packed.reshape(len(solutions), -1)
+            bits = np.unpackbits(packed, axis=1, count=self.num_bits).astype(bool)
+            sol_idxs, bit_idxs = np.nonzero(bits)
+            true_vars = self.tracked_vars()[bit_idxs]
+            states = true_vars % self.numstates
+            keep = self.is_visible_state[states]
+            out[sol_idxs[keep], true_vars[keep] // self.numstates] = self.state_names[states[keep]]
+        return out.reshape(len(solutions), self.height, self.width)
+
+    def to_grid(self, solution: PackedSolution) -> np.ndarray:
+        """
+        Decodes a single solution into a (height, width) object array.
+        """
+        return self.to_grids([solution])[0]
+
+    def to_board(self, solution: PackedSolution, board):
+        """
+        Returns a copy of `board` with the visible states of the solution
+        filled in. Cells without a visible state keep their original value.
+        """
+        grid = self.to_grid(solution)
+        new_board = copy.copy(board)
+        new_board.data = [[new if new is not None else old
+                           for new, old in zip(grid_row, data_row)]
+                          for grid_row, data_row in zip(grid.tolist(), board.data)]
+        return new_board
@@ -0,0 +1,76 @@
+"""
+Checks that solutions packed into bitsets read back the variables they
+were packed from, with or without the variables of hidden states, and
+that decoding many solutions at once matches decoding them one by one.
+"""
+import random
+import numpy as np
+
+from solutions import SolutionLayout
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block
+from sat_solver import CNFSolver
+
+def test_pack_and_unpack():
+    rng = random.Random(0)
+    # 2x3 board with a hidden auxiliary state
+    layout = SolutionLayout(2, 3, ["a", "b", "aux"], ["a", "b"])
+    visible = SolutionLayout(2, 3, ["a", "b", "aux"], ["a", "b"], visible_only=True)
+    assert layout.num_bits == 18 and visible.num_bits == 12
+    for _ in range(20):
+        true_vars = sorted(rng.sample(range(18), rng.randint(0, 18)))
+        solution = layout.pack(true_vars)
+        assert solution.nbytes == 3 and solution.true_vars().tolist() == true_vars
+        assert all(solution[var] == (var in true_vars) for var in range(18))
+        assert solution.to_dict() == {var: var in true_vars for var in range(18)}
+        assert layout.pack_assignment(solution.to_dict()) == solution
+        kept = [var for var in true_vars if var % 3 != 2]
+        packed = visible.pack(true_vars)
+        assert packed.true_vars().tolist() == kept and packed.nbytes == 2
+        assert 2 not in packed and 0 in packed and 18 not in packed
+        assert all(packed[var] == (var in kept) for var in range(18) if var % 3 != 2)
+        try:
+            packed[2]
+            assert False
+        except KeyError:
+            pass
+
+def test_grids():
+    layout = SolutionLayout(2, 2, ["a", "b", "aux"], ["a", "b"])
+    solutions = [layout.pack([0, 4, 2]), layout.pack([1, 3, 6, 11]), layout.pack([])]
+    grids = layout.to_grids(solutions)
+    assert grids.shape == (3, 2, 2)
+    assert grids.tolist() == [[["a", "b"], [None, None]],
+                              [["b", "a"], ["a", None]],
+                              [[None, None], [None, None]]]
+    assert all((layout.to_grid(sol) == grid).all() for sol, grid in zip(solutions, grids))
+    assert layout.to_grids([]).shape == (0, 2, 2)
+
+def test_solver_solutions():
+    board, rule = parse_sudoku_line("1..." + "."*12)
+    for visible_only in (False, True):
+        solver = CNFSolver(board, [rule])
+        found = [sol for sol in solver.solve(max_sols=100, visible_only=visible_only, quiet=True)
+                 if sol is not None]
+        grids = solver.generate_solved_grids()
+        assert len(found) == len(grids) == 72 and len(set(found)) == 72
+        for sol, grid in zip(found, grids):
+            assert sol.layout.to_board(sol, board).data == grid.tolist()
+            assert grid[0, 0] == "1" and all(sorted(row) == ["1", "2", "3", "4"] for row in grid.tolist())
+        assert solver.generate_solved_board().data == grids[-1].tolist()
+    # Nurikabe solutions keep the hidden states of the connectivity rules unless
+    # asked not to, which shrinks them without changing the boards they decode to
+    board, rule = parse_nurikabe_block(["1...", "..3.", "....", "2..."])
+    sizes, boards = [], []
+    for visible_only in (False, True):
+        solver = CNFSolver(board, [rule])
+        found = [sol for sol in solver.solve(max_sols=100, visible_only=visible_only, quiet=True)
+                 if sol is not None]
+        sizes.append(found[0].nbytes)
+        boards.append(np.array(solver.generate_solved_grids()).tolist())
+    assert sizes[1] < sizes[0] and boards[0] == boards[1]
+
+if __name__ == "__main__":
+    test_pack_and_unpack()
+    test_grids()
+    test_solver_solutions()
+    print("All solution storage tests passed")
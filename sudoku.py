@@ -2,10 +2,13 @@
 # as well as the solver creator itself
 
 from rules import Rule, SuperRule
+from clause_store import to_literals
 from sat_solver import CNFSolver
 from boards import Board
+import numpy as np
 
 class InitialConditions(Rule):
+    instance_specific = True
 
     def __init__(self, board, states):
         super().__init__(board, states)
@@ -33,11 +36,11 @@ class AtMostOneInRegion(Rule):
         super().__init__(board, states)
 
     def add_formulas(self):
-        for state in self.states:
-            vars = [self.gen_state_int(*coords, state) for coords in self.region_coords]
-            for var_1, var_2 in Rule.construct_subsets(vars, 2):
-                clause = {var_1: False, var_2: False}
-                self.add_clause(clause)
+        cells = self.board.coords_to_ids(self.region_coords)
+        firsts, seconds = np.triu_indices(len(cells), k=1) # every pair of cells
+        vars = np.stack([self.gen_state_ints(cells, state) for state in self.states])
+        pairs = np.stack([vars[:, firsts], vars[:, seconds]], axis=2)
+        self.add_clauses_bulk(to_literals(pairs.reshape(-1, 2), False))
 
 class AtLeastOneInRegion(Rule):
 
@@ -78,15 +81,9 @@ class ExactlyOneInRepeatingRect(SuperRule):
         is a rectangle with height `self.reg_height` and width `self.reg_width`,
         and the regions cover the board.
         """
-        height, width = self.board.height, self.board.width
-        num_regs_vert = height // self.reg_height
-        num_regs_hori = width // self.reg_width
-        out = [[] for _ in range(num_regs_vert*num_regs_hori)]
-        for r in range(height):
-            for c in range(width):
-                out_idx = (r // self.reg_height) * num_regs_hori + (c // self.reg_width)
-                out[out_idx].append((r, c))
-        return out
+        regions = self.board.rect_regions(self.reg_height, self.reg_width)
+        coords = self.board.cell_coords.tolist()
+        return [[tuple(coords[cell]) for cell in region] for region in regions.tolist()]
          
 class Sudoku(SuperRule):
 
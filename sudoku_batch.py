@@ -0,0 +1,153 @@
+# Constraint propagation over many Sudokus of the same shape at once.
+# The puzzles are loaded into one (puzzles, cells) array of candidate
+# bitmasks: the (puzzles, cells, digits) tensor of candidates, with the
+# digits packed into the bits of a uint64. Every step works on the whole
+# array with NumPy: a solved cell removes its digit from the other cells
+# of its row, column and box (naked singles), and a digit with a single
+# place left in a region goes there (hidden singles). The regions are the
+# index arrays of the ExactlyOneInRepeatingRect rules of the puzzle, one
+# array per rule, each of which splits the board into disjoint regions.
+#
+# Propagation alone solves most published puzzles. The others come back
+# with the digits it deduced filled in, ready for per-puzzle search.
+
+import numpy as np
+
+from boards import Board
+from sudoku import Sudoku, ExactlyOneInRepeatingRect
+
+SOLVED, UNSAT, OPEN = "solved", "unsat", "open"
+
+
+def region_groups(rule: Sudoku) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Returns, for every ExactlyOneInRepeatingRect rule of a Sudoku, the
+    (regions, region_of_cell) pair: a (regions, cells per region) array of
+    cell ids and the region index of every cell.
+    """
+    board = rule.board
+    out = []
+    for rect in rule.rules:
+        if not isinstance(rect, ExactlyOneInRepeatingRect):
+            continue
+        regions = np.stack([board.coords_to_ids(region) for region in rect.regions])
+        region_of_cell = np.empty(board.num_cells, dtype=np.int64)
+        region_of_cell[regions] = np.arange(len(regions))[:, None]
+        out.append((regions, region_of_cell))
+    return out
+
+
+def box_shape(rule: Sudoku) -> tuple[int, int]:
+    """
+    Returns the (height, width) of the boxes of a Sudoku: the shape of the
+    ExactlyOneInRepeatingRect rule left once the rows and columns are set aside.
+    """
+    shapes = [(rect.reg_height, rect.reg_width) for rect in rule.rules
+              if isinstance(rect, ExactlyOneInRepeatingRect)]
+    for line in ((1, rule.width), (rule.height, 1)):
+        if line in shapes:
+            shapes.remove(line)
+    if len(shapes) != 1:
+        raise ValueError(f"expected rows, columns and one box shape, got regions {shapes}")
+    return shapes[0]
+
+
+def candidate_masks(boards, states) -> np.ndarray:
+    """
+    Returns the (puzzles, cells) array of candidate bitmasks of boards of the
+    same shape, bit d standing for states[d]: a given cell has the bit of its
+    digit set, an empty cell every bit.
+    """
+    lookup = {state: idx for idx, state in enumerate(states)}
+    codes = np.array([[lookup[state] if state is not None else -1 for row in board.data for state in row]
+                      for board in boards], dtype=np.int64).reshape(len(boards), -1)
+    full = np.uint64((1 << len(states)) - 1)
+    return np.where(codes >= 0, np.left_shift(np.uint64(1), np.maximum(codes, 0).astype(np.uint64)), full)
+
+
+def is_single(masks) -> np.ndarray:
+    """
+    Marks the masks with exactly one bit set.
+    """
+    return (masks != 0) & (masks & (masks - np.uint64(1)) == 0)
+
+
+def propagate(masks, groups, num_states) -> np.ndarray:
+    """
+    Applies naked and hidden singles to every puzzle of an array of candidate
+    masks, in place, until none of them changes. Returns the status of every
+    puzzle: SOLVED, UNSAT (a contradiction was found) or OPEN.
+    """
+    full = np.uint64((1 << num_states) - 1)
+    zero = np.uint64(0)
+    status = np.full(len(masks), OPEN, dtype=object)
+    active = np.arange(len(masks))
+    while len(active):
+        cand = masks[active]
+        before = cand.copy()
+        bad = np.zeros(len(active), dtype=bool)
+        for regions, region_of_cell in groups:
+            placed_cells = np.where(is_single(cand), cand, zero)
+            gathered = placed_cells[:, regions] # (puzzles, regions, cells per region)
+            placed = np.bitwise_or.reduce(gathered, axis=2)
+            # the masks of placed digits are single bits, so they add up to
+            # their union unless a digit is placed twice
+            bad |= (gathered.sum(axis=2, dtype=np.uint64) != placed).any(axis=1)
+            cand &= ~placed[:, region_of_cell] | placed_cells
+        for regions, region_of_cell in groups:
+            gathered = cand[:, regions]
+            once = np.zeros(gathered.shape[:2], dtype=np.uint64)
+            twice = np.zeros(gathered.shape[:2], dtype=np.uint64)
+            for pos in range(gathered.shape[2]):
+                twice |= once & gathered[:, :, pos]
+                once |= gathered[:, :, pos]
+            bad |= (once != full).any(axis=1) # a digit has no place left in a region
+            unique = cand & (once & ~twice)[:, region_of_cell]
+            bad |= ((unique != 0) & ~is_single(unique)).any(axis=1)
+            cand = np.where(unique != 0, unique, cand)
+        bad |= (cand == 0).any(axis=1)
+        masks[active] = cand
+        changed = (cand != before).any(axis=1)
+        status[active[bad]] = UNSAT
+        done = active[~bad & ~changed]
+        status[done[is_single(masks[done]).all(axis=1)]] = SOLVED
+        active = active[~bad & changed]
+    return status
+
+
+def deduced_board(board, states, masks) -> Board:
+    """
+    Returns a copy of a board with the cells whose mask has a single candidate left filled in.
+    """
+    lookup = {1 << idx: state for idx, state in enumerate(states)}
+    cells = [lookup.get(mask) for mask in masks.tolist()] # None unless a single bit is set
+    data = [cells[row*board.width:(row+1)*board.width] for row in range(board.height)]
+    return Board(data, list(board.visible_states))
+
+
+def propagate_puzzles(puzzles) -> list[tuple[str, Board, Sudoku]]:
+    """
+    Propagates a list of (board, Sudoku rule) puzzles of the same shape at once.
+    Returns a (status, board, rule) triple for every puzzle: the solved board
+    for SOLVED puzzles (whose solution is unique, as every step is forced),
+    the original puzzle for UNSAT ones, and for OPEN ones the puzzle with
+    the deduced cells filled in and its rule, which has the same solutions.
+    """
+    if not puzzles:
+        return []
+    boards = [board for board, _ in puzzles]
+    first_board, first_rule = puzzles[0]
+    assert all((board.height, board.width) == (first_board.height, first_board.width)
+               for board in boards)
+    masks = candidate_masks(boards, first_rule.states)
+    status = propagate(masks, region_groups(first_rule), len(first_rule.states))
+    out = []
+    for (board, rule), state, cand in zip(puzzles, status.tolist(), masks):
+        if state == SOLVED:
+            out.append((state, deduced_board(board, rule.states, cand), rule))
+        elif state == OPEN:
+            deduced = deduced_board(board, rule.states, cand)
+            out.append((state, deduced, Sudoku(deduced, rule.states, *box_shape(rule))))
+        else:
+            out.append((state, board, rule))
+    return out
@@ -0,0 +1,59 @@
+"""
+Checks that batched propagation solves, rejects or simplifies each puzzle
+of a batch exactly as per-puzzle search would.
+"""
+from puzzle_formats import parse_sudoku_line, format_sudoku
+from sudoku_batch import propagate_puzzles, box_shape, SOLVED, UNSAT, OPEN
+from sudoku import Sudoku
+from boards import Board
+from exact_cover import make_solver
+from cli import solve_stream
+
+easy_sudoku = "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61"
+hard_sudoku = "8......5..1..4.6.87....3.......9..2..5.....4.1..7..9.5......2....64......8..6.1.9"
+clash = "11" + "."*79
+
+def solutions(board, rule, max_sols=2):
+    solver = make_solver(board, [rule])
+    results = [sol for sol in solver.solve(max_sols=max_sols, quiet=True) if sol is not None]
+    return sorted(format_sudoku(solver.layout.to_board(sol, board)) for sol in results)
+
+def test_statuses():
+    lines = [easy_sudoku, hard_sudoku, clash, "."*81]
+    propagated = propagate_puzzles([parse_sudoku_line(line) for line in lines])
+    assert [status for status, _, _ in propagated] == [SOLVED, OPEN, UNSAT, OPEN]
+    assert [format_sudoku(propagated[0][1])] == solutions(*parse_sudoku_line(easy_sudoku))
+    # the deduced cells keep the solutions of the open puzzle
+    _, board, rule = propagated[1]
+    assert format_sudoku(board).count(".") < hard_sudoku.count(".")
+    assert solutions(board, rule) == solutions(*parse_sudoku_line(hard_sudoku))
+    assert propagate_puzzles([]) == []
+
+def test_box_shape():
+    # the box rule is found by its shape, whatever the order of the rules
+    board, rule = parse_sudoku_line("1" + "."*35)
+    assert box_shape(rule) == (2, 3)
+    rule.rules.reverse()
+    status, deduced, simplified = propagate_puzzles([(board, rule)])[0]
+    assert status == OPEN and box_shape(simplified) == (2, 3)
+    assert solutions(deduced, simplified, 5) == solutions(*parse_sudoku_line("1" + "."*35), 5)
+    # boxes as wide as the board are one more set of rows
+    states = ["1", "2", "3", "4"]
+    assert box_shape(Sudoku(Board(Board.gen_empty_board(4, 4), states), states, 1, 4)) == (1, 4)
+
+def test_batched_stream():
+    lines = [easy_sudoku, hard_sudoku, clash, "123", "1...", "."*16, easy_sudoku]
+    single = list(solve_stream("sudoku", iter(lines), max_sols=2))
+    batched = list(solve_stream("sudoku", iter(lines), max_sols=2, batch=3))
+    assert [idx for idx, *_ in batched] == list(range(len(lines)))
+    for one, other in zip(single, batched):
+        assert one[3] == other[3] and str(one[4]) == str(other[4])
+        assert (one[2] is None) == (other[2] is None)
+        if one[2] is not None and one[3] == 1:
+            assert format_sudoku(one[2]) == format_sudoku(other[2])
+
+if __name__ == "__main__":
+    test_statuses()
+    test_box_shape()
+    test_batched_stream()
+    print("All batched Sudoku tests passed")
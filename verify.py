@@ -0,0 +1,257 @@
+# Checks filled boards against a rule tree directly on the grid, without
+# building a CNFSolver or any auxiliary variables. Sudoku regions are
+# checked with vectorized state counts, Nurikabe islands and the shaded
+# wall with breadth first searches and pools with the 2x2 windows.
+#
+# Every rule class that can be checked this way has a checker in CHECKERS.
+# A SuperRule without a checker of its own is checked one rule at a time,
+# in order, so the reported violation is the first one in the rule tree.
+
+from collections import deque
+
+import numpy as np
+
+from rules import Rule, SuperRule
+from sudoku import (Sudoku, InitialConditions, AtMostOneInRegion, AtLeastOneInRegion,
+                    ExactlyOneInRegion, ExactlyOneInRepeatingRect)
+from nurikabe import (Nurikabe, NoTwoByTwoSquare, LinkAuxiliaryWithMainState,
+                      NoAdjacenciesBetweenStates, AtLeastOneOfStateInCell)
+
+
+class Violation():
+    """
+    A rule that a filled board breaks, with a description and the cells involved.
+    """
+
+    def __init__(self, rule, message: str, cells=()) -> None:
+        self.rule = rule
+        self.message = message
+        self.cells = [tuple(coords) for coords in cells] # (row, col) tuples
+
+    def __repr__(self) -> str:
+        return f"Violation(rule={self.rule.__class__.__name__}, message={self.message!r})"
+
+
+def state_codes(board, states, cache=None) -> np.ndarray:
+    """
+    Returns the state of every cell of `board`, in cell id order, as its index
+    in `states` (-1 for an empty cell or a state not in `states`). Results are
+    memoized in the `cache` dictionary if one is given.
+    """
+    key = (id(board), tuple(states))
+    if cache is not None and key in cache:
+        return cache[key]
+    index = {state: idx for idx, state in enumerate(states)}
+    lookup = np.array([index.get(state, -1) for state in board.symbols] + [-1]) # code -1 maps to -1
+    codes = lookup[board.grid.ravel()]
+    if cache is not None:
+        cache[key] = codes
+    return codes
+
+
+def cell_list(board, cells) -> list[tuple[int, int]]:
+    return [tuple(coords) for coords in board.cell_coords[np.asarray(cells, dtype=np.int64)].tolist()]
+
+
+def not_permutations(values, num_states) -> np.ndarray:
+    """
+    Marks the rows of `values` (state indices, -1 for none) that do not hold
+    every one of `num_states` states exactly once.
+    """
+    if values.shape[1] != num_states:
+        return np.ones(len(values), dtype=bool)
+    bits = np.left_shift(1, np.arange(num_states+1, dtype=np.int64)) # -1 gets a bit of its own
+    return np.bitwise_or.reduce(bits[values], axis=1) != (1 << num_states) - 1
+
+
+def check_regions(board, codes, states, regions, leaf_rules):
+    """
+    Checks that every state appears exactly once in every region (a row of
+    the `regions` array of cell ids). `leaf_rules(idx)` returns the pair of
+    (at most one, at least one) rules of region idx, either of them None if
+    it is not required. Returns the first Violation or None.
+    """
+    values = codes[regions]
+    for region_idx in np.flatnonzero(not_permutations(values, len(states))).tolist():
+        counts = (values[region_idx][:, None] == np.arange(len(states))).sum(axis=0)
+        at_most, at_least = leaf_rules(region_idx)
+        for rule, wrong in ((at_most, counts > 1), (at_least, counts < 1)):
+            if rule is not None and wrong.any():
+                state_idx = int(np.argmax(wrong))
+                return Violation(rule, f"state {states[state_idx]!r} appears "
+                                       f"{int(counts[state_idx])} time(s) in a region",
+                                 cell_list(board, regions[region_idx]))
+    return None
+
+
+def check_repeating_rect(rule, board, cache):
+    states = rule.rules[0].rules[0].states
+    regions = rule.board.rect_regions(rule.reg_height, rule.reg_width)
+    return check_regions(board, state_codes(board, states, cache), states, regions,
+                         lambda idx: (rule.rules[idx].rules[0], rule.rules[idx].rules[1]))
+
+
+def check_sudoku(rule, board, cache):
+    """
+    Checks the rows, columns and boxes of a Sudoku in one pass, and only goes
+    through them one rule at a time to find the first violation if there is one.
+    """
+    rects = [sub_rule for sub_rule in rule.rules if isinstance(sub_rule, ExactlyOneInRepeatingRect)]
+    others = [sub_rule for sub_rule in rule.rules if sub_rule not in rects]
+    states = rule.states
+    regions = np.concatenate([rect.board.rect_regions(rect.reg_height, rect.reg_width)
+                              for rect in rects])
+    if not_permutations(state_codes(board, states, cache)[regions], len(states)).any():
+        return verify(board, rule.rules, cache)
+    return verify(board, others, cache)
+
+
+def check_region(rule, board, cache):
+    leaf = rule.rules[0] if isinstance(rule, ExactlyOneInRegion) else rule
+    regions = rule.board.coords_to_ids(leaf.region_coords)[None, :]
+    if isinstance(rule, ExactlyOneInRegion):
+        pair = (rule.rules[0], rule.rules[1])
+    elif isinstance(rule, AtMostOneInRegion):
+        pair = (rule, None)
+    else:
+        pair = (None, rule)
+    return check_regions(board, state_codes(board, leaf.states, cache), leaf.states, regions,
+                         lambda idx: pair)
+
+
+def check_initial_conditions(rule, board, cache):
+    given = state_codes(rule.board, rule.states, cache)
+    codes = state_codes(board, rule.states, cache)
+    changed = (given >= 0) & (codes != given)
+    if changed.any():
+        return Violation(rule, "a given cell was changed", cell_list(board, [np.argmax(changed)]))
+    return None
+
+
+def connected_component(start, member, indptr, indices) -> list[int]:
+    """
+    Returns the cells connected to `start` through cells with `member[cell]` True.
+    """
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        for other in indices[indptr[cell]:indptr[cell+1]]:
+            if member[other] and other not in seen:
+                seen.add(other)
+                queue.append(other)
+    return sorted(seen)
+
+
+def check_nurikabe(rule, board, cache):
+    """
+    Checks the islands, the shaded wall, pools and cell states of a Nurikabe
+    board, reporting the first violated sub-rule of `rule`.
+    """
+    puzzle = rule.board
+    codes = state_codes(board, [rule.empty_state, rule.filled_state], cache)
+    unshaded = (codes == 0).tolist()
+    shaded = codes == 1
+    indptr, indices = puzzle.neighbours
+    indptr, indices = indptr.tolist(), indices.tolist()
+    clues = list(puzzle.constraints["numbers"].items())
+    clue_cells = puzzle.coords_to_ids([coords for coords, _ in clues]).tolist()
+    islands = [connected_component(cell, unshaded, indptr, indices) if unshaded[cell] else []
+               for cell in clue_cells]
+    checks = {}
+    for idx, ((coords, num), island) in enumerate(zip(clues, islands)):
+        if not island:
+            checks[id(rule.rules[idx])] = (f"the clue at {coords} is shaded", [coords])
+        elif len(island) != num:
+            checks[id(rule.rules[idx])] = (f"the island of clue {num} at {coords} has "
+                                          f"{len(island)} cells", cell_list(board, island))
+    shaded_cells = np.flatnonzero(shaded).tolist()
+    if shaded_cells:
+        wall = connected_component(shaded_cells[0], shaded.tolist(), indptr, indices)
+        if len(wall) != len(shaded_cells):
+            cut_off = sorted(set(shaded_cells) - set(wall))
+            checks[id(rule.rules[len(clues)])] = ("the shaded cells are not connected",
+                                                  cell_list(board, cut_off))
+    for sub_rule in rule.rules:
+        if isinstance(sub_rule, NoTwoByTwoSquare):
+            pools = np.flatnonzero(shaded[puzzle.windows_2x2].all(axis=1))
+            if len(pools):
+                checks[id(sub_rule)] = ("a 2x2 square is shaded",
+                                        cell_list(board, puzzle.windows_2x2[pools[0]]))
+        elif isinstance(sub_rule, LinkAuxiliaryWithMainState):
+            in_island = {cell for island in islands for cell in island}
+            orphans = [cell for cell, value in enumerate(unshaded) if value and cell not in in_island]
+            if orphans:
+                checks[id(sub_rule)] = ("unshaded cells belong to no island", cell_list(board, orphans))
+        elif isinstance(sub_rule, NoAdjacenciesBetweenStates):
+            for island in islands:
+                joined = [coords for coords, cell in zip(clues, clue_cells) if cell in island]
+                if len(joined) > 1:
+                    checks[id(sub_rule)] = ("an island holds more than one clue",
+                                            [coords for coords, _ in joined])
+                    break
+        elif isinstance(sub_rule, AtLeastOneOfStateInCell):
+            stateless = np.flatnonzero(codes < 0)
+            if len(stateless):
+                checks[id(sub_rule)] = ("cells are neither shaded nor unshaded",
+                                        cell_list(board, stateless))
+    for sub_rule in rule.rules:
+        if id(sub_rule) in checks:
+            return Violation(sub_rule, *checks[id(sub_rule)])
+    # shaded givens are not a rule of their own
+    given = state_codes(puzzle, [rule.empty_state, rule.filled_state], cache)
+    changed = np.flatnonzero((given >= 0) & (codes != given))
+    if len(changed):
+        return Violation(rule, "a given cell was changed", cell_list(board, changed[:1]))
+    return None
+
+
+CHECKERS = {
+    Sudoku: check_sudoku,
+    ExactlyOneInRepeatingRect: check_repeating_rect,
+    ExactlyOneInRegion: check_region,
+    AtMostOneInRegion: check_region,
+    AtLeastOneInRegion: check_region,
+    InitialConditions: check_initial_conditions,
+    Nurikabe: check_nurikabe,
+}
+
+
+def find_checker(rule):
+    for cls in type(rule).__mro__:
+        if cls in CHECKERS:
+            return CHECKERS[cls]
+    return None
+
+
+def verify(board, rules, cache=None) -> Violation | None:
+    """
+    Checks a filled board against a rule or a list of rules (such as the
+    rule returned by the puzzle parsers). Returns None if the board follows
+    every rule, and otherwise a Violation for the first violated rule.
+    Raises ValueError for rules that can only be checked by search.
+
+    Args:
+        board: the filled board, with the same shape as the boards of the rules
+        rules: a Rule or SuperRule, or a list of them
+        cache: dictionary memoizing the state codes of boards, shared between
+            the rules of one call
+    """
+    if cache is None:
+        cache = {}
+    for rule in rules if isinstance(rules, list) else [rules]:
+        if (board.height, board.width) != (rule.board.height, rule.board.width):
+            raise ValueError(f"a {board.height}x{board.width} board cannot follow the "
+                             f"rules of a {rule.board.height}x{rule.board.width} puzzle")
+        checker = find_checker(rule)
+        if checker is not None:
+            violation = checker(rule, board, cache)
+        elif isinstance(rule, SuperRule):
+            violation = verify(board, rule.rules, cache)
+        elif type(rule) is Rule: # only groups states, without clauses
+            violation = None
+        else:
+            raise ValueError(f"{rule.__class__.__name__} rules cannot be verified without search")
+        if violation is not None:
+            return violation
+    return None
@@ -0,0 +1,62 @@
+"""
+Checks the direct verifier against boards solved by the CNF solver, and
+that broken boards report the first violated rule.
+"""
+from puzzle_formats import parse_sudoku_line, parse_nurikabe_block, parse_solution
+from sat_solver import CNFSolver
+from sudoku import AtMostOneInRegion, AtLeastOneInRegion, InitialConditions
+from nurikabe import NoTwoByTwoSquare, ConnectedRegionOfSizeAtMostN
+from verify import verify
+
+easy_sudoku = "91.7......326.9.8...7.8.9...86.3.17.3.......6.51.2.84...9.5.3...2.3.149......2.61"
+
+def solved_board(board, rule):
+    solver = CNFSolver(board, [rule])
+    next(solver.solve(quiet=True))
+    return solver.generate_solved_board()
+
+def test_sudoku():
+    board, rule = parse_sudoku_line(easy_sudoku)
+    solved = solved_board(board, rule)
+    assert verify(solved, rule) is None
+    data = solved.data
+    data[0][2], data[0][3] = data[0][3], data[0][2] # rows stay valid, columns do not
+    solved.data = data
+    violation = verify(solved, rule)
+    assert isinstance(violation.rule, AtMostOneInRegion)
+    assert violation.cells == [(row, 2) for row in range(9)]
+    data[0][2] = None
+    solved.data = data
+    assert isinstance(verify(solved, rule).rule, AtLeastOneInRegion)
+    # a valid grid that does not keep the givens
+    other = solved_board(*parse_sudoku_line("2" + "."*80))
+    violation = verify(other, rule)
+    assert isinstance(violation.rule, InitialConditions) and violation.cells == [(0, 0)]
+
+def test_nurikabe():
+    rows = ["1-----2", "--2----", "-----3-", "-----x-", "-----7-", "--2----", "------3"]
+    board, rule = parse_nurikabe_block(rows)
+    solved = solved_board(board, rule)
+    assert verify(solved, rule) is None
+    small, small_rule = parse_nurikabe_block(["...2", "....", "....", "3.2."])
+    assert verify(parse_solution("nurikabe", "xx.2\n.xxx\n.x.x\n3x2x", small), small_rule) is None
+    violation = verify(parse_solution("nurikabe", "xx.2\n.xxx\n...x\n3x2x", small), small_rule)
+    assert violation.message == "the island of clue 3 at (3, 0) has 6 cells"
+    violation = verify(parse_solution("nurikabe", "x..2\n.xxx\n.x.x\n3x2x", small), small_rule)
+    assert violation.message == "the island of clue 2 at (0, 3) has 3 cells"
+    assert isinstance(violation.rule, ConnectedRegionOfSizeAtMostN)
+
+def test_walls_and_pools():
+    board, rule = parse_nurikabe_block(["2..", "...", "..2"])
+    assert verify(parse_solution("nurikabe", ".xx\n.x.\nxx.", board), rule) is None
+    violation = verify(parse_solution("nurikabe", "..x\nxx.\nxx.", board), rule)
+    assert violation.message == "the shaded cells are not connected" and violation.cells == [(1, 0), (1, 1), (2, 0), (2, 1)]
+    board, rule = parse_nurikabe_block(["1..", "...", "..."])
+    violation = verify(parse_solution("nurikabe", ".xx\nxxx\nxxx", board), rule)
+    assert isinstance(violation.rule, NoTwoByTwoSquare) and violation.cells == [(0, 1), (1, 1), (0, 2), (1, 2)]
+
+if __name__ == "__main__":
+    test_sudoku()
+    test_nurikabe()
+    test_walls_and_pools()
+    print("All verify tests passed")